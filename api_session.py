@@ -0,0 +1,62 @@
+"""Долгоживущая HTTP-сессия с пулом соединений к API Практикума."""
+import os
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import homework
+
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", 10))
+HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", 2))
+HTTP_BACKOFF_FACTOR = float(os.getenv("HTTP_BACKOFF_FACTOR", 0.5))
+HTTP_KEEP_ALIVE = os.getenv("HTTP_KEEP_ALIVE", "1") != "0"
+
+logger = homework.logger.getChild("api_session")
+
+WARM_UP_OK_MESSAGE = "Соединение с %(url)s установлено заранее"
+WARM_UP_FAILED_MESSAGE = "Не удалось заранее соединиться с %(url)s: %(error)s"
+
+
+def make_session(
+    pool_size=HTTP_POOL_SIZE,
+    max_retries=HTTP_MAX_RETRIES,
+    backoff_factor=HTTP_BACKOFF_FACTOR,
+    keep_alive=HTTP_KEEP_ALIVE,
+):
+    """Сессия с пулом соединений и повтором сетевых ошибок.
+
+    Повторяются только ошибки соединения и чтения: ответы с кодом,
+    отличным от 200, разбирает request_api.
+    """
+    retry = Retry(
+        total=max_retries,
+        connect=max_retries,
+        read=max_retries,
+        status=0,
+        backoff_factor=backoff_factor,
+        allowed_methods=frozenset(("GET", "HEAD")),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=1, pool_maxsize=pool_size, max_retries=retry
+    )
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers["Accept-Encoding"] = "gzip, deflate"
+    if not keep_alive:
+        session.headers["Connection"] = "close"
+    return session
+
+
+def warm_up(session, url=None):
+    """Открываем соединение до первого опроса, чтобы не ждать TLS."""
+    url = homework.ENDPOINT if url is None else url
+    try:
+        session.head(url, timeout=homework.REQUEST_TIMEOUT)
+    except requests.exceptions.RequestException as error:
+        logger.warning(WARM_UP_FAILED_MESSAGE, {"url": url, "error": error})
+        return False
+    logger.debug(WARM_UP_OK_MESSAGE, {"url": url})
+    return True
@@ -0,0 +1,380 @@
+"""Асинхронный опрос тенантов с ограничением числа запросов в полёте."""
+import asyncio
+import json
+import os
+import time
+
+import aiohttp
+
+import circuit_breaker
+import delivery_lag
+import error_notifier
+import homework
+import metrics
+import poll_policy
+import poller
+import response_cache
+import retry_policy
+import send_queue
+import single_flight
+import status_index
+import subscriptions
+import timing_wheel
+
+ASYNC_CONCURRENCY = int(os.getenv("ASYNC_CONCURRENCY", 100))
+TELEGRAM_API_URL = homework.TELEGRAM_API_BASE + "/bot{token}/{method}"
+
+logger = homework.logger.getChild("async_poller")
+
+TELEGRAM_ERROR_MESSAGE = "Telegram ответил {status}: {description}"
+# Описание ошибки, когда вместо JSON пришла, например, HTML-страница 502.
+NOT_JSON_DESCRIPTION = "ответ не является объектом JSON"
+
+
+class AsyncClient:
+    """HTTP-клиент для API Практикума и Telegram на общей сессии."""
+
+    def __init__(
+        self, session, telegram_token, concurrency=ASYNC_CONCURRENCY,
+        limiter=None,
+    ):
+        """Семафор общий для запросов к Практикуму и Telegram."""
+        self.session = session
+        self.telegram_token = telegram_token
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.limiter = (
+            send_queue.RateLimiter() if limiter is None else limiter
+        )
+
+    async def request_api(self, current_timestamp, headers, cache=None):
+        """Асинхронный аналог homework.request_api."""
+        key = response_cache.cache_key(headers)
+        if cache is not None:
+            headers = {
+                **headers,
+                **cache.conditional_headers(key, current_timestamp),
+            }
+        request_data = dict(
+            url=homework.ENDPOINT,
+            headers=headers,
+            params={"from_date": current_timestamp},
+        )
+        try:
+            async with self.semaphore:
+                with metrics.API_LATENCY.time():
+                    async with self.session.get(
+                        **request_data
+                    ) as response:
+                        status_code = response.status
+                        body = await response.read()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as error:
+            raise ConnectionError(
+                homework.REQUESTS_PROBLEMS_MESSAGE.format(
+                    error=error, **request_data
+                )
+            )
+        if cache is not None and cache.check(
+            key, current_timestamp, status_code, body, response.headers
+        ):
+            return response_cache.NOT_MODIFIED
+        homework.check_status_code(
+            status_code,
+            body.decode(errors="replace"),
+            request_data,
+            response.headers,
+        )
+        return homework.check_api_errors(json.loads(body), request_data)
+
+    async def _wait_for_limits(self, chat_id):
+        """Ждём сначала лимита чата, затем общего лимита бота."""
+        now = time.monotonic()
+        allowed_at = self.limiter.reserve_chat(chat_id, now)
+        await asyncio.sleep(max(0, allowed_at - now))
+        now = time.monotonic()
+        allowed_at = self.limiter.reserve_global(now)
+        await asyncio.sleep(max(0, allowed_at - now))
+
+    async def _post_message(self, url, chat_id, message):
+        """Вызываем sendMessage и разбираем ответ Bot API."""
+        async with self.session.post(
+            url, json={"chat_id": chat_id, "text": message}
+        ) as response:
+            try:
+                answer = await response.json(content_type=None)
+            except ValueError:
+                answer = None
+        if not isinstance(answer, dict):
+            raise ConnectionError(TELEGRAM_ERROR_MESSAGE.format(
+                status=response.status, description=NOT_JSON_DESCRIPTION
+            ))
+        retry_after = answer.get("parameters", {}).get("retry_after")
+        if retry_after:
+            self.limiter.pause(retry_after, time.monotonic())
+        if not answer.get("ok"):
+            raise ConnectionError(TELEGRAM_ERROR_MESSAGE.format(
+                status=response.status,
+                description=answer.get("description"),
+            ))
+
+    async def send_message_to(self, chat_id, message):
+        """Асинхронный аналог homework.send_message_to."""
+        url = TELEGRAM_API_URL.format(
+            token=self.telegram_token, method="sendMessage"
+        )
+        await self._wait_for_limits(chat_id)
+        try:
+            async with self.semaphore:
+                with metrics.SEND_LATENCY.time():
+                    await self._post_message(url, chat_id, message)
+        except (
+            aiohttp.ClientError, asyncio.TimeoutError, ConnectionError,
+            ValueError,
+        ) as error:
+            metrics.count_error(error)
+            logger.error(homework.SENDING_ERROR_MESSAGE, {
+                "message": message, "error": error
+            })
+            return False
+        logger.debug(
+            homework.SUCCESSFUL_SENDING_MESSAGE, {"message": message}
+        )
+        return True
+
+
+class AsyncPoller:
+    """Асинхронный аналог poller.Poller: по задаче на тенанта."""
+
+    def __init__(
+        self, client, store, policy=None, notifier=None, breaker=None,
+        shard=None,
+    ):
+        """Индекс статусов и автомат защиты общие для всех задач."""
+        if policy is None:
+            policy = poll_policy.PollPolicy(
+                homework.RETRY_PERIOD, retry=retry_policy.RetryPolicy()
+            )
+        if notifier is None:
+            notifier = error_notifier.ErrorNotifier(
+                homework.ERROR_MESSAGE_IN_MAIN
+            )
+        if breaker is None:
+            breaker = circuit_breaker.CircuitBreaker()
+            breaker.add_listener(poller.log_breaker_transition)
+            breaker.export()
+        self.client = client
+        self.breaker = breaker
+        self.store = store
+        self.policy = policy
+        self.notifier = notifier
+        self.lag = delivery_lag.LagTracker()
+        self.shard = shard
+        self.index = status_index.StatusIndex(store)
+        self.cache = response_cache.ResponseCache()
+        self.flights = single_flight.SingleFlight()
+        self.shared = set()
+        # Ключ работы -> (сообщение, чаты, которые его ещё не получили).
+        self.pending = {}
+
+    async def poll_tenant(self, tenant, current_timestamp):
+        """Асинхронный аналог Poller.poll_tenant."""
+        headers = tenant.headers
+        response, homeworks = await self.request(headers, current_timestamp)
+        if response is response_cache.NOT_MODIFIED:
+            return current_timestamp
+        delivered = True
+        for changed in self.index.diff(homeworks, tenant.tenant_id):
+            if await self.broadcast(tenant, changed):
+                self.index.commit(changed, tenant.tenant_id)
+                on_delivered = self.lag.on_delivered(
+                    tenant.tenant_id, changed
+                )
+                if on_delivered is not None:
+                    on_delivered()
+            else:
+                delivered = False
+        if not delivered:
+            return current_timestamp
+        self.cache.commit(response_cache.cache_key(headers))
+        if not homeworks:
+            return current_timestamp
+        return response.get("current_date", current_timestamp)
+
+    async def broadcast(self, tenant, changed):
+        """Пишем о работе во все подписанные чаты разом; True, если всем.
+
+        Как и subscriptions.Broadcaster, повтор уходит только чатам,
+        которые сообщение не получили, — пока о работе не придёт
+        другое сообщение.
+        """
+        key = (tenant.tenant_id, status_index.homework_key(changed))
+        message = homework.parse_status(changed)
+        retry = self.pending.pop(key, None)
+        if retry is not None and retry[0] == message:
+            chats = retry[1]
+        else:
+            chats = subscriptions.recipients(
+                tenant.routes, changed.get("status")
+            )
+        results = await asyncio.gather(*(
+            self.client.send_message_to(chat_id, message)
+            for chat_id in chats
+        ))
+        failed = [chat for chat, sent in zip(chats, results) if not sent]
+        if failed:
+            self.pending[key] = (message, failed)
+        return not failed
+
+    async def request(self, headers, current_timestamp):
+        """Асинхронный аналог Poller.request."""
+        key = response_cache.cache_key(headers)
+        if key in self.shared:
+            return await self.flights.do_async(
+                (key, current_timestamp), self.fetch,
+                headers, current_timestamp,
+            )
+        response = await self.request_api(
+            headers, current_timestamp, self.cache
+        )
+        if response is response_cache.NOT_MODIFIED:
+            return response, None
+        return response, homework.check_response(response)
+
+    async def fetch(self, headers, current_timestamp):
+        """Запрос без кеша: его результат делят тенанты."""
+        response = await self.request_api(headers, current_timestamp)
+        return response, homework.check_response(response)
+
+    async def request_api(self, headers, current_timestamp, cache=None):
+        """Запрос к API под защитой автомата."""
+        self.breaker.before_call()
+        outcome = circuit_breaker.CANCELLED
+        try:
+            response = await self.client.request_api(
+                current_timestamp, headers, cache
+            )
+            outcome = None
+        except Exception as error:
+            outcome = error
+            raise
+        finally:
+            # Отменённая задача тоже должна отпустить пробу автомата.
+            self.breaker.record(outcome)
+        return response
+
+    async def poll_and_save(self, tenant, now):
+        """Асинхронный аналог Poller.poll_and_save."""
+        current_timestamp = self.store.load(tenant.tenant_id, now)
+        try:
+            with metrics.LOOP_DURATION.time():
+                self.store.save(
+                    tenant.tenant_id,
+                    await self.poll_tenant(tenant, current_timestamp),
+                )
+        except Exception as error:
+            metrics.count_error(error)
+            logger.error(poller.TENANT_ERROR_MESSAGE, {
+                "tenant_id": tenant.tenant_id, "error": error
+            })
+            await self.notify(tenant, self.notifier.on_error(
+                error, tenant.tenant_id
+            ))
+            return error
+        await self.notify(tenant, self.notifier.on_success(tenant.tenant_id))
+        return None
+
+    async def notify(self, tenant, message):
+        """Отправляем служебное сообщение тенанту, если оно есть.
+
+        Зовётся и при обработке ошибки опроса, поэтому сама не падает:
+        иначе исключение остановило бы опрос всех тенантов.
+        """
+        if not message:
+            return
+        try:
+            await self.client.send_message_to(tenant.chat_id, message)
+        except Exception as error:
+            metrics.count_error(error)
+            logger.error(homework.SENDING_ERROR_MESSAGE, {
+                "message": message, "error": error
+            })
+
+    def owns(self, tenant):
+        """Опрашивает ли тенанта этот воркер."""
+        return self.shard is None or self.shard.owns(tenant.tenant_id)
+
+    async def shard_loop(self, registry):
+        """Продлеваем аренды воркера, пока идёт опрос.
+
+        Запросы к SQLite блокируют, поэтому идут в пуле потоков,
+        а не в цикле событий.
+        """
+        tenant_ids = [tenant.tenant_id for tenant in registry]
+        while True:
+            moved = await asyncio.get_running_loop().run_in_executor(
+                None, self.shard.refresh, tenant_ids
+            )
+            poller.hand_over(
+                self.shard, self.store, registry, moved, self.index
+            )
+            await asyncio.sleep(self.shard.heartbeat)
+
+    async def tenant_loop(self, tenant, now):
+        """Бесконечный цикл опроса одного тенанта в его момент периода."""
+        offset = timing_wheel.stable_offset(
+            single_flight.phase_key(tenant, self.shared), self.policy.period
+        )
+        deadline = timing_wheel.phase_deadline(
+            time.time(), offset, self.policy.period
+        )
+        failures = 0
+        while True:
+            await asyncio.sleep(max(0, deadline - time.time()))
+            if not self.owns(tenant):
+                deadline = timing_wheel.phase_deadline(
+                    time.time(), offset, self.policy.period
+                )
+                continue
+            error = await self.poll_and_save(tenant, now)
+            failures = poll_policy.count_failures(failures, error)
+            deadline = self.policy.next_deadline(
+                time.time(),
+                failures,
+                self.index.in_review(tenant.tenant_id),
+                offset,
+                error,
+                tenant.tenant_id,
+            )
+
+
+async def run(
+    registry, telegram_token, store, concurrency=ASYNC_CONCURRENCY,
+    shard=None,
+):
+    """Опрашиваем всех тенантов в одном цикле событий.
+
+    С shard опрашиваются только тенанты этого воркера.
+    """
+    timeout = aiohttp.ClientTimeout(
+        sock_connect=homework.CONNECT_TIMEOUT,
+        sock_read=homework.READ_TIMEOUT,
+    )
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(
+        timeout=timeout, connector=connector
+    ) as session:
+        client = AsyncClient(session, telegram_token, concurrency)
+        async_poller = AsyncPoller(client, store, shard=shard)
+        async_poller.lag.export()
+        async_poller.shared = single_flight.shared_keys(registry)
+        now = int(time.time())
+        loops = [
+            async_poller.tenant_loop(tenant, now) for tenant in registry
+        ]
+        if shard is not None:
+            loops.append(async_poller.shard_loop(registry))
+        try:
+            await asyncio.gather(*loops)
+        finally:
+            if shard is not None:
+                shard.close()
+            store.close()
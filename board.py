@@ -0,0 +1,359 @@
+"""Доска статусов: одно закреплённое сообщение на чат вместо потока.
+
+В режиме доски бот не пишет новое сообщение о каждой смене статуса,
+а правит своё закреплённое сообщение со списком всех работ чата.
+Изменения, пришедшие за BOARD_INTERVAL секунд, попадают в одну правку.
+Правки отправляет отдельный поток с общими лимитами send_queue.RateLimiter,
+так что медленный Telegram не задерживает опрос.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import telegram
+
+import cursor_store
+import homework
+import metrics
+import send_queue
+import status_index
+
+BOARD_MODE = os.getenv("BOARD_MODE") == "1"
+# Сообщение одного чата правится не чаще раза в столько секунд.
+BOARD_INTERVAL = float(os.getenv("BOARD_INTERVAL", 5))
+# Доски хранятся в SQLite рядом с метками опроса, чтобы после перезапуска
+# бот правил прежнее сообщение со всеми работами, а не публиковал новое
+# только с изменившимися.
+BOARD_DB = os.getenv("BOARD_DB", cursor_store.CURSOR_DB)
+# Предел длины сообщения в Telegram.
+MAX_MESSAGE_LENGTH = 4096
+
+BOARD_TITLE = "Статусы домашних работ:"
+BOARD_LINE = "{homework_name}: {verdict}"
+BOARD_MORE = "…и ещё {count}"
+# Так Telegram описывает правку без изменений и удалённое сообщение.
+NOT_MODIFIED = "message is not modified"
+NOT_FOUND = "message to edit not found"
+
+CREATE_TABLES = (
+    "CREATE TABLE IF NOT EXISTS boards ("
+    "chat_id TEXT PRIMARY KEY, message_id INTEGER)",
+    "CREATE TABLE IF NOT EXISTS board_lines ("
+    "chat_id TEXT NOT NULL, homework_key TEXT NOT NULL, "
+    "homework_name TEXT NOT NULL, status TEXT NOT NULL, "
+    "PRIMARY KEY (chat_id, homework_key))",
+)
+SELECT_BOARDS = "SELECT chat_id, message_id FROM boards"
+SELECT_LINES = (
+    "SELECT chat_id, homework_key, homework_name, status FROM board_lines"
+)
+UPSERT_BOARD = (
+    "INSERT INTO boards (chat_id, message_id) VALUES (?, ?) "
+    "ON CONFLICT(chat_id) DO UPDATE SET message_id = excluded.message_id"
+)
+UPSERT_LINE = (
+    "INSERT INTO board_lines (chat_id, homework_key, homework_name, status) "
+    "VALUES (?, ?, ?, ?) ON CONFLICT(chat_id, homework_key) "
+    "DO UPDATE SET homework_name = excluded.homework_name, "
+    "status = excluded.status"
+)
+
+logger = homework.logger.getChild("board")
+
+BOARD_ERROR_MESSAGE = "Доска чата %(chat_id)s не обновлена: %(error)s"
+PIN_ERROR_MESSAGE = "Доску чата %(chat_id)s не удалось закрепить: %(error)s"
+
+
+class Board:
+    """Работы одного чата и его сообщение-доска."""
+
+    __slots__ = ("lines", "message_id", "text", "ready_at", "callbacks")
+
+    def __init__(self):
+        """Доска ещё не опубликована."""
+        self.lines = {}
+        self.message_id = None
+        self.text = None
+        self.ready_at = 0.0
+        self.callbacks = []
+
+
+class BoardStore:
+    """Строки досок и id их сообщений в SQLite.
+
+    Ключ работы хранится в JSON, чтобы целый id остался целым.
+    """
+
+    def __init__(self, path):
+        """Открываем базу и создаём таблицы при первом запуске."""
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.lock = threading.Lock()
+        with self.connection:
+            for statement in CREATE_TABLES:
+                self.connection.execute(statement)
+
+    def load(self):
+        """Все сохранённые доски: {чат: Board}."""
+        boards = {}
+        with self.lock:
+            for chat_id, message_id in self.connection.execute(
+                SELECT_BOARDS
+            ):
+                boards.setdefault(chat_id, Board()).message_id = message_id
+            for chat_id, key, name, status in self.connection.execute(
+                SELECT_LINES
+            ):
+                board = boards.setdefault(chat_id, Board())
+                board.lines[json.loads(key)] = (name, status)
+        return boards
+
+    def save_line(self, chat_id, key, name, status):
+        """Запоминаем строку работы key на доске чата."""
+        with self.lock, self.connection:
+            self.connection.execute(
+                UPSERT_LINE, (chat_id, json.dumps(key), name, status)
+            )
+
+    def save_message(self, chat_id, message_id):
+        """Запоминаем сообщение-доску чата; None — доски нет."""
+        with self.lock, self.connection:
+            self.connection.execute(UPSERT_BOARD, (chat_id, message_id))
+
+    def close(self):
+        """Закрываем базу."""
+        with self.lock:
+            self.connection.close()
+
+
+def render(board):
+    """Текст доски; не влезающие в сообщение работы только считаются."""
+    lines = [
+        BOARD_LINE.format(
+            homework_name=name, verdict=homework.HOMEWORK_VERDICTS[status]
+        )
+        for name, status in sorted(board.lines.values())
+    ]
+    text = BOARD_TITLE
+    for shown, line in enumerate(lines):
+        more = BOARD_MORE.format(count=len(lines) - shown)
+        if len(text) + len(line) + len(more) + 2 > MAX_MESSAGE_LENGTH:
+            return "\n".join((text, more))
+        text = "\n".join((text, line))
+    return text
+
+
+class StatusBoard:
+    """Доски всех чатов бота.
+
+    post заменяет homework.send_new_statuses: статус сразу попадает
+    в индекс, а правку доски поток из start отправляет, когда чату можно.
+    Неудавшаяся правка остаётся в очереди и повторяется при
+    следующем flush. С store доски переживают перезапуск: бот правит
+    прежнее сообщение, и на нём остаются все работы. Без store доски
+    живут в памяти. Доски правит только один поток: запущенный start
+    или тот, что сам зовёт flush.
+    """
+
+    def __init__(
+        self, bot, interval=BOARD_INTERVAL, clock=time.monotonic, limiter=None,
+        store=None,
+    ):
+        """Доски из store; limiter лучше делить с очередью отправки."""
+        self.bot = bot
+        self.interval = interval
+        self.clock = clock
+        self.limiter = (
+            send_queue.RateLimiter() if limiter is None else limiter
+        )
+        self.store = store
+        self.boards = {} if store is None else store.load()
+        self.dirty = set()
+        self.condition = threading.Condition()
+        self.thread = None
+        self.stopped = False
+
+    def update(self, chat_id, work, on_delivered=None):
+        """Заносим работу на доску чата; правка уйдёт при flush."""
+        homework.parse_status(work)
+        chat_id = str(chat_id)
+        key = status_index.homework_key(work)
+        line = (work["homework_name"], work["status"])
+        with self.condition:
+            board = self.boards.get(chat_id)
+            if board is None:
+                board = self.boards[chat_id] = Board()
+            board.lines[key] = line
+            if self.store is not None:
+                self.store.save_line(chat_id, key, *line)
+            if on_delivered is not None:
+                board.callbacks.append(on_delivered)
+            self.dirty.add(chat_id)
+            self.condition.notify()
+
+    def post(self, chat_id, index, homeworks, scope=None, lag=None):
+        """Заносим изменившиеся статусы на доску.
+
+        Возвращаем True: изменения уже не потеряются, даже если
+        Telegram сейчас недоступен.
+        """
+        for work in index.diff(homeworks, scope):
+            self.update(
+                chat_id,
+                work,
+                None if lag is None else lag.on_delivered(scope, work),
+            )
+            index.commit(work, scope)
+        return True
+
+    def flush(self, now=None):
+        """Правим доски, которым уже можно; True, если правок не осталось.
+
+        Telegram ждём без блокировки: опрос тем временем пополняет доски.
+        """
+        now = self.clock() if now is None else now
+        with self.condition:
+            due = []
+            for chat_id in list(self.dirty):
+                board = self.boards[chat_id]
+                if board.ready_at <= now:
+                    self.dirty.discard(chat_id)
+                    board.ready_at = now + self.interval
+                    due.append(
+                        (chat_id, board, render(board), board.callbacks)
+                    )
+                    board.callbacks = []
+        for chat_id, board, text, callbacks in due:
+            if self.publish(chat_id, board, text, now):
+                for on_delivered in callbacks:
+                    on_delivered()
+                continue
+            with self.condition:
+                board.callbacks[:0] = callbacks
+                self.dirty.add(chat_id)
+        with self.condition:
+            return not self.dirty
+
+    def start(self):
+        """Запускаем поток, который правит доски."""
+        self.thread = threading.Thread(
+            target=self._work, name="board", daemon=True
+        )
+        self.thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        """Останавливаем поток; несделанные правки уйдут после запуска.
+
+        Строки досок уже в store, так что первая же правка после
+        перезапуска покажет и их.
+        """
+        with self.condition:
+            self.stopped = True
+            self.condition.notify_all()
+        if self.thread is not None:
+            self.thread.join(timeout)
+            if self.thread.is_alive():
+                return
+        if self.store is not None:
+            self.store.close()
+
+    def _wait_for_due(self):
+        """Ждём доску, которую пора править; False после stop."""
+        with self.condition:
+            while not self.stopped:
+                if self.dirty:
+                    delay = min(
+                        self.boards[chat_id].ready_at
+                        for chat_id in self.dirty
+                    ) - self.clock()
+                    if delay <= 0:
+                        return True
+                else:
+                    delay = None
+                self.condition.wait(delay)
+        return False
+
+    def _work(self):
+        """Цикл потока правок."""
+        while self._wait_for_due():
+            self.flush()
+
+    def publish(self, chat_id, board, text, now):
+        """Публикуем или правим доску чата; True при успехе."""
+        if text == board.text:
+            return True
+        try:
+            if board.message_id is None:
+                self.create(chat_id, board, text)
+            else:
+                self.limiter.wait(chat_id)
+                with metrics.SEND_LATENCY.time():
+                    self.bot.edit_message_text(
+                        text, chat_id=chat_id, message_id=board.message_id
+                    )
+        except telegram.error.RetryAfter as error:
+            metrics.count_error(error)
+            logger.warning(
+                send_queue.RETRY_AFTER_MESSAGE, {"seconds": error.retry_after}
+            )
+            self.limiter.pause(error.retry_after, time.monotonic())
+            board.ready_at = now + error.retry_after
+            return False
+        except telegram.TelegramError as error:
+            return self.failed(chat_id, board, text, error)
+        board.text = text
+        return True
+
+    def create(self, chat_id, board, text):
+        """Публикуем новую доску и закрепляем её без уведомления."""
+        self.limiter.wait(chat_id)
+        with metrics.SEND_LATENCY.time():
+            message = self.bot.send_message(chat_id, text)
+        board.message_id = message.message_id
+        self._save_message(chat_id, board)
+        self.limiter.wait(chat_id)
+        try:
+            self.bot.pin_chat_message(
+                chat_id, board.message_id, disable_notification=True
+            )
+        except telegram.TelegramError as error:
+            metrics.count_error(error)
+            logger.warning(PIN_ERROR_MESSAGE, {
+                "chat_id": chat_id, "error": error
+            })
+
+    def failed(self, chat_id, board, text, error):
+        """Разбираем ошибку правки; True, если доска всё же актуальна."""
+        description = str(error).lower()
+        if NOT_MODIFIED in description:
+            board.text = text
+            return True
+        metrics.count_error(error)
+        logger.error(BOARD_ERROR_MESSAGE, {"chat_id": chat_id, "error": error})
+        if NOT_FOUND in description:
+            # Доску удалили: при следующем flush опубликуем новую.
+            board.message_id = None
+            board.text = None
+            board.ready_at = 0.0
+            self._save_message(chat_id, board)
+        return False
+
+    def _save_message(self, chat_id, board):
+        """Запоминаем сообщение-доску чата в store."""
+        if self.store is not None:
+            self.store.save_message(chat_id, board.message_id)
+
+
+def open_board(bot, limiter=None, enabled=BOARD_MODE, path=BOARD_DB):
+    """Запущенные доски статусов, если включён BOARD_MODE, иначе None.
+
+    С path доски хранятся в SQLite.
+    """
+    if enabled:
+        return StatusBoard(
+            bot, limiter=limiter, store=BoardStore(path) if path else None
+        ).start()
+    return None
@@ -0,0 +1,151 @@
+"""Автомат защиты для запросов к API Практикума."""
+import os
+import threading
+import time
+
+import exceptions
+import metrics
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+STATES = (CLOSED, OPEN, HALF_OPEN)
+# Исход запроса, прерванного BaseException (например, отменённой задачи):
+# он ничего не говорит о доступности API.
+CANCELLED = object()
+
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", 5))
+BREAKER_RESET_TIMEOUT = float(os.getenv("BREAKER_RESET_TIMEOUT", 60))
+
+CIRCUIT_OPEN_MESSAGE = (
+    "API недоступно, запрос не отправлялся. "
+    "Повторная проверка через {delay} с"
+)
+
+
+def is_outage(error):
+    """Ошибка говорит о недоступности API, а не о проблеме тенанта.
+
+    Отказ в доступе или ошибка в теле ответа значат, что сервер жив.
+    """
+    if isinstance(error, exceptions.ResponseIsnt200Error):
+        status_code = error.status_code
+        return status_code is None or status_code >= 500 or status_code == 429
+    return isinstance(error, ConnectionError)
+
+
+class CircuitBreaker:
+    """Общий для всех тенантов автомат: закрыт, открыт, полуоткрыт.
+
+    После failure_threshold сбоев подряд автомат открывается, и запросы
+    сразу падают с CircuitOpenError без обращения к сети. Через
+    reset_timeout секунд пропускается один пробный запрос: успех
+    закрывает автомат, сбой снова открывает.
+    """
+
+    def __init__(
+        self,
+        failure_threshold=BREAKER_FAILURE_THRESHOLD,
+        reset_timeout=BREAKER_RESET_TIMEOUT,
+        clock=time.monotonic,
+    ):
+        """Автомат закрыт, сбоев нет."""
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        self.listeners = []
+        self.lock = threading.Lock()
+
+    def add_listener(self, listener):
+        """Подписываем listener(old_state, new_state) на смену состояния.
+
+        Подписчик вызывается под блокировкой автомата и не должен
+        обращаться к нему.
+        """
+        self.listeners.append(listener)
+
+    def before_call(self):
+        """Разрешаем запрос или сразу бросаем CircuitOpenError."""
+        with self.lock:
+            if self.state == CLOSED:
+                return
+            delay = self.opened_at + self.reset_timeout - self.clock()
+            if self.state == OPEN and delay <= 0:
+                self._switch(HALF_OPEN)
+            if self.state == HALF_OPEN and not self.probe_in_flight:
+                self.probe_in_flight = True
+                return
+        raise exceptions.CircuitOpenError(
+            CIRCUIT_OPEN_MESSAGE.format(delay=max(int(delay), 0))
+        )
+
+    def on_success(self):
+        """Запрос дошёл до сервера."""
+        with self.lock:
+            self.failures = 0
+            self.probe_in_flight = False
+            if self.state != CLOSED:
+                self._switch(CLOSED)
+
+    def on_failure(self):
+        """Запрос не дошёл до сервера или сервер сбоит."""
+        with self.lock:
+            self.failures += 1
+            self.probe_in_flight = False
+            if self.state == HALF_OPEN or (
+                self.state == CLOSED
+                and self.failures >= self.failure_threshold
+            ):
+                self.opened_at = self.clock()
+                self._switch(OPEN)
+
+    def release(self):
+        """Запрос прерван до ответа: отпускаем пробу, сбоев не считаем."""
+        with self.lock:
+            self.probe_in_flight = False
+
+    def record(self, error):
+        """Учитываем исход запроса: error — исключение, None или CANCELLED."""
+        if error is CANCELLED:
+            self.release()
+        elif error is not None and is_outage(error):
+            self.on_failure()
+        else:
+            self.on_success()
+
+    def call(self, func, *args, **kwargs):
+        """Вызываем func под защитой автомата.
+
+        Исход учитывается в finally: прерванный запрос не должен
+        навсегда занять пробу полуоткрытого автомата.
+        """
+        self.before_call()
+        outcome = CANCELLED
+        try:
+            result = func(*args, **kwargs)
+            outcome = None
+        except Exception as error:
+            outcome = error
+            raise
+        finally:
+            self.record(outcome)
+        return result
+
+    def export(self):
+        """Отдаём состояние автомата на страницу метрик."""
+        metrics.BREAKER_STATE.set_function(self.state_samples)
+
+    def state_samples(self):
+        """Значения датчика: 1 у текущего состояния, 0 у остальных."""
+        state = self.state
+        return {(known,): int(known == state) for known in STATES}
+
+    def _switch(self, state):
+        """Меняем состояние и оповещаем подписчиков."""
+        old_state, self.state = self.state, state
+        for listener in self.listeners:
+            listener(old_state, state)
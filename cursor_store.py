@@ -0,0 +1,180 @@
+"""Хранилище меток current_date по тенантам, переживающее перезапуск.
+
+Рядом с метками лежат последние отправленные статусы работ: метка при
+старте откатывается на CURSOR_OVERLAP, и по ним status_index.StatusIndex
+не отправляет повторно то, что уже ушло до перезапуска.
+"""
+import json
+import os
+import sqlite3
+import time
+
+CURSOR_DB = os.getenv("CURSOR_DB")
+# На столько секунд откатываемся назад при старте, чтобы не потерять
+# изменения, пришедшие между последним опросом и падением.
+CURSOR_OVERLAP = int(os.getenv("CURSOR_OVERLAP", 60))
+CURSOR_BATCH_SIZE = int(os.getenv("CURSOR_BATCH_SIZE", 500))
+CURSOR_FLUSH_INTERVAL = float(os.getenv("CURSOR_FLUSH_INTERVAL", 5))
+
+CREATE_TABLE = (
+    "CREATE TABLE IF NOT EXISTS cursors ("
+    "tenant_id TEXT PRIMARY KEY, from_date INTEGER NOT NULL)"
+)
+CREATE_STATUSES_TABLE = (
+    "CREATE TABLE IF NOT EXISTS statuses ("
+    "tenant_id TEXT NOT NULL, homework_key TEXT NOT NULL, "
+    "status TEXT NOT NULL, PRIMARY KEY (tenant_id, homework_key))"
+)
+SELECT_STATUSES = (
+    "SELECT homework_key, status FROM statuses WHERE tenant_id = ?"
+)
+UPSERT_STATUS = (
+    "INSERT INTO statuses (tenant_id, homework_key, status) VALUES (?, ?, ?) "
+    "ON CONFLICT(tenant_id, homework_key) "
+    "DO UPDATE SET status = excluded.status"
+)
+SELECT_CURSOR = "SELECT from_date FROM cursors WHERE tenant_id = ?"
+UPSERT_CURSOR = (
+    "INSERT INTO cursors (tenant_id, from_date) VALUES (?, ?) "
+    "ON CONFLICT(tenant_id) DO UPDATE SET from_date = excluded.from_date"
+)
+
+
+class MemoryCursorStore:
+    """Метки только в памяти: поведение бота до появления хранилища."""
+
+    def __init__(self):
+        """Пустое хранилище."""
+        self.cursors = {}
+
+    def load(self, tenant_id, default):
+        """Метка тенанта или default, если её ещё нет."""
+        return self.cursors.get(tenant_id, default)
+
+    def save(self, tenant_id, from_date):
+        """Запоминаем новую метку тенанта."""
+        self.cursors[tenant_id] = from_date
+
+    def load_statuses(self, tenant_id):
+        """Статусы переживают перезапуск только в SQLite."""
+        return ()
+
+    def save_status(self, tenant_id, key, status):
+        """Статусы хранит сам индекс."""
+
+    def evict(self, tenant_ids):
+        """Память процесса другим воркерам не видна: метки остаются."""
+
+    def flush(self):
+        """Сбрасывать нечего."""
+
+    def close(self):
+        """Закрывать нечего."""
+
+
+class CursorStore(MemoryCursorStore):
+    """Метки в SQLite в режиме WAL с пакетной фиксацией.
+
+    Все метки держатся в памяти, а save лишь помечает метку изменённой:
+    на диск изменения уходят одной транзакцией раз в batch_size записей
+    или flush_interval секунд.
+    При падении теряется лишь хвост меток, и бот повторно опросит
+    уже виденный интервал, но не пропустит изменения.
+    """
+
+    def __init__(
+        self,
+        path,
+        overlap=CURSOR_OVERLAP,
+        batch_size=CURSOR_BATCH_SIZE,
+        flush_interval=CURSOR_FLUSH_INTERVAL,
+    ):
+        """Открываем базу и создаём таблицу при первом запуске."""
+        super().__init__()
+        self.overlap = overlap
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(CREATE_TABLE)
+        self.connection.execute(CREATE_STATUSES_TABLE)
+        self.connection.commit()
+        self.dirty = {}
+        # (тенант, ключ работы в JSON) -> статус; пишутся вместе с метками.
+        self.dirty_statuses = {}
+        self.flushed_at = time.monotonic()
+
+    def load(self, tenant_id, default):
+        """Метка тенанта; прочитанная с диска — за вычетом перекрытия."""
+        if tenant_id not in self.cursors:
+            row = self.connection.execute(
+                SELECT_CURSOR, (tenant_id,)
+            ).fetchone()
+            if row is None:
+                return default
+            self.cursors[tenant_id] = max(row[0] - self.overlap, 0)
+        return self.cursors[tenant_id]
+
+    def save(self, tenant_id, from_date):
+        """Запоминаем метку и при необходимости сбрасываем пакет."""
+        self.cursors[tenant_id] = from_date
+        self.dirty[tenant_id] = from_date
+        if (
+            len(self.dirty) >= self.batch_size
+            or time.monotonic() - self.flushed_at >= self.flush_interval
+        ):
+            self.flush()
+
+    def load_statuses(self, tenant_id):
+        """Последние отправленные статусы тенанта: пары (ключ, статус)."""
+        return [
+            (json.loads(key), status)
+            for key, status in self.connection.execute(
+                SELECT_STATUSES, (tenant_id,)
+            )
+        ]
+
+    def save_status(self, tenant_id, key, status):
+        """Запоминаем статус; на диск он уйдёт вместе с метками."""
+        self.dirty_statuses[(tenant_id, json.dumps(key))] = status
+
+    def flush(self):
+        """Записываем накопленные метки и статусы одной транзакцией."""
+        if self.dirty or self.dirty_statuses:
+            with self.connection:
+                self.connection.executemany(
+                    UPSERT_STATUS,
+                    (
+                        (tenant_id, key, status) for (tenant_id, key), status
+                        in self.dirty_statuses.items()
+                    ),
+                )
+                self.connection.executemany(
+                    UPSERT_CURSOR, self.dirty.items()
+                )
+            self.dirty.clear()
+            self.dirty_statuses.clear()
+        self.flushed_at = time.monotonic()
+
+    def evict(self, tenant_ids):
+        """Сбрасываем метки на диск и забываем их копии в памяти.
+
+        Так воркер отдаёт метки тенантов, ушедших к другому воркеру,
+        и перечитывает метки пришедших.
+        """
+        self.flush()
+        for tenant_id in tenant_ids:
+            self.cursors.pop(tenant_id, None)
+
+    def close(self):
+        """Сбрасываем остаток и закрываем базу."""
+        self.flush()
+        self.connection.close()
+
+
+def open_store(path=CURSOR_DB):
+    """Хранилище в SQLite, если задан путь, иначе в памяти."""
+    if path:
+        return CursorStore(path)
+    return MemoryCursorStore()
@@ -0,0 +1,157 @@
+"""Задержка от смены статуса работы до доставки сообщения в Telegram."""
+import datetime
+import functools
+import heapq
+import math
+import os
+import threading
+import time
+from collections import deque
+
+import metrics
+
+# Сколько последних задержек хранить на тенанта; общих — в десять раз больше.
+LAG_WINDOW = int(os.getenv("LAG_WINDOW", 1000))
+# Задержка дольше этого числа секунд считается нарушением SLA.
+NOTIFICATION_LAG_SLA = float(os.getenv("NOTIFICATION_LAG_SLA", 1800))
+LAG_QUANTILES = (0.5, 0.9, 0.99)
+# Сколько худших тенантов отдавать в метриках: по каждому тенанту
+# серий было бы втрое больше, чем тенантов.
+LAG_WORST_TENANTS = int(os.getenv("LAG_WORST_TENANTS", 10))
+
+
+def parse_date_updated(value):
+    """Время date_updated из ответа API в секундах или None."""
+    if not isinstance(value, str):
+        return None
+    try:
+        moment = datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=datetime.timezone.utc)
+    return moment.timestamp()
+
+
+def percentile(ordered, quantile):
+    """Перцентиль по ближайшему рангу из отсортированного списка."""
+    if not ordered:
+        return None
+    rank = max(math.ceil(quantile * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def tail_percentile(samples, quantile):
+    """Тот же перцентиль без полной сортировки — для высоких квантилей."""
+    if not samples:
+        return None
+    rank = max(math.ceil(quantile * len(samples)), 1)
+    return heapq.nlargest(len(samples) - rank + 1, samples)[-1]
+
+
+class LagTracker:
+    """Скользящие окна задержек по тенантам и по всем сразу.
+
+    Задержка считается от date_updated работы до момента, когда
+    Telegram принял сообщение. Каждая задержка также попадает
+    в гистограмму metrics.NOTIFICATION_LAG, а перцентили окон
+    отдаются датчиками metrics.NOTIFICATION_LAG_QUANTILES
+    и metrics.WORST_TENANT_LAG_QUANTILES; второй показывает только
+    worst тенантов с самым большим старшим квантилем задержки.
+    """
+
+    def __init__(
+        self, window=LAG_WINDOW, sla=NOTIFICATION_LAG_SLA, clock=time.time,
+        worst=LAG_WORST_TENANTS,
+    ):
+        """Окно в window задержек на тенанта."""
+        self.window = window
+        self.sla = sla
+        self.worst = worst
+        self.clock = clock
+        self.scopes = {}
+        self.overall = deque(maxlen=window * 10)
+        self.lock = threading.Lock()
+
+    def export(self):
+        """Отдаём перцентили этого трекера на страницу метрик."""
+        metrics.NOTIFICATION_LAG_QUANTILES.set_function(
+            self.overall_samples
+        )
+        metrics.WORST_TENANT_LAG_QUANTILES.set_function(
+            self.worst_tenant_samples
+        )
+
+    def on_delivered(self, scope, homework):
+        """Функция без аргументов, которую зовут при доставке.
+
+        None, если в работе нет понятного date_updated.
+        """
+        updated_at = parse_date_updated(homework.get("date_updated"))
+        if updated_at is None:
+            return None
+        return functools.partial(self.record, scope, updated_at)
+
+    def record(self, scope, updated_at, delivered_at=None):
+        """Учитываем доставку и возвращаем задержку в секундах."""
+        if delivered_at is None:
+            delivered_at = self.clock()
+        # Часы сервера и бота могут расходиться: отрицательной задержки нет.
+        lag = max(delivered_at - updated_at, 0.0)
+        with self.lock:
+            samples = self.scopes.get(scope)
+            if samples is None:
+                samples = self.scopes[scope] = deque(maxlen=self.window)
+            samples.append(lag)
+            self.overall.append(lag)
+        metrics.NOTIFICATION_LAG.observe(lag)
+        if lag > self.sla:
+            metrics.NOTIFICATION_LAG_SLA_MISSES.inc()
+        return lag
+
+    def percentiles(self, scope, quantiles=LAG_QUANTILES):
+        """Перцентили задержки тенанта: {квантиль: секунды}."""
+        with self.lock:
+            ordered = sorted(self.scopes.get(scope, ()))
+        return {
+            quantile: percentile(ordered, quantile) for quantile in quantiles
+        }
+
+    def overall_percentiles(self, quantiles=LAG_QUANTILES):
+        """Перцентили задержки по всем тенантам."""
+        with self.lock:
+            ordered = sorted(self.overall)
+        return {
+            quantile: percentile(ordered, quantile) for quantile in quantiles
+        }
+
+    def overall_samples(self):
+        """Общие перцентили для датчика: {(квантиль,): секунды}."""
+        return {
+            (quantile,): value
+            for quantile, value in self.overall_percentiles().items()
+            if value is not None
+        }
+
+    def worst_tenants(self, quantiles=LAG_QUANTILES):
+        """Тенанты с самой большой задержкой по старшему квантилю."""
+        top = max(quantiles)
+        with self.lock:
+            windows = list(self.scopes.items())
+        ranked = []
+        for scope, samples in windows:
+            with self.lock:
+                ranked.append((tail_percentile(samples, top), scope))
+        return [
+            scope for _, scope in heapq.nlargest(
+                self.worst, ranked, key=lambda pair: pair[0]
+            )
+        ]
+
+    def worst_tenant_samples(self):
+        """Перцентили худших тенантов: {(тенант, квантиль): секунды}."""
+        return {
+            (scope, quantile): value
+            for scope in self.worst_tenants()
+            for quantile, value in self.percentiles(scope).items()
+        }
@@ -0,0 +1,75 @@
+"""Склейка повторяющихся сообщений об ошибках."""
+import os
+import re
+import time
+
+# Раз в столько секунд напоминаем о не прекращающейся ошибке.
+ERROR_SUMMARY_INTERVAL = int(os.getenv("ERROR_SUMMARY_INTERVAL", 3600))
+
+STILL_FAILING_MESSAGE = "Сбой продолжается ({count} раз подряд): {error}"
+RECOVERED_MESSAGE = "Работа бота восстановлена после {count} сбоев подряд"
+
+# Числа в тексте ошибки (метки времени, порты, коды) и адреса объектов
+# вроде «object at 0x7f3a…» из ошибок urllib3 не делают её новой.
+NUMBERS = re.compile(r"0x[0-9a-fA-F]+|\d+")
+
+
+def fingerprint(error):
+    """Отпечаток ошибки: тип и текст без чисел и адресов."""
+    return type(error).__name__, NUMBERS.sub("#", str(error))
+
+
+class Failure:
+    """Текущий сбой тенанта."""
+
+    __slots__ = ("mark", "count", "notified_at")
+
+    def __init__(self, mark, count, notified_at):
+        """Сбой с отпечатком mark, count раз подряд."""
+        self.mark = mark
+        self.count = count
+        self.notified_at = notified_at
+
+
+class ErrorNotifier:
+    """Решает, о каких ошибках и когда сообщать в Telegram.
+
+    Первая ошибка отправляется сразу. Такая же ошибка подряд
+    не отправляется, но раз в summary_interval секунд уходит сводка
+    с числом повторов. Первый успешный опрос после сбоя даёт сообщение
+    о восстановлении. Состояние хранится только для тенантов со сбоем.
+    """
+
+    def __init__(
+        self,
+        error_message,
+        summary_interval=ERROR_SUMMARY_INTERVAL,
+        clock=time.monotonic,
+    ):
+        """Шаблон error_message с полем {error} — для первой ошибки."""
+        self.error_message = error_message
+        self.summary_interval = summary_interval
+        self.clock = clock
+        self.failing = {}
+
+    def on_error(self, error, scope=None):
+        """Текст для отправки или None, если ошибку стоит промолчать."""
+        now = self.clock()
+        mark = fingerprint(error)
+        failure = self.failing.get(scope)
+        if failure is None or failure.mark != mark:
+            count = 1 if failure is None else failure.count + 1
+            self.failing[scope] = Failure(mark, count, now)
+            return self.error_message.format(error=error)
+        failure.count += 1
+        if now - failure.notified_at < self.summary_interval:
+            return None
+        failure.notified_at = now
+        return STILL_FAILING_MESSAGE.format(count=failure.count, error=error)
+
+    def on_success(self, scope=None):
+        """Сообщение о восстановлении или None, если сбоя не было."""
+        failure = self.failing.pop(scope, None)
+        if failure is None:
+            return None
+        return RECOVERED_MESSAGE.format(count=failure.count)
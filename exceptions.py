@@ -1,7 +1,29 @@
 class ResponseIsnt200Error(Exception):
     """Сервер не возвращает 200 в ответ на запрос."""
 
+    def __init__(self, message="", status_code=None, retry_after=None):
+        """Сохраняем код ответа, чтобы отличать сбой сервера от отказа.
+
+        retry_after — через сколько секунд сервер просит повторить.
+        """
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class TenantRegistryError(Exception):
+    """Не удалось загрузить реестр тенантов."""
+
     pass
 
 
+class CircuitOpenError(ConnectionError):
+    """API считается недоступным, запрос не отправлялся."""
 
+    pass
+
+
+class SubscriptionError(ValueError):
+    """Подписки чатов на статусы заданы неверно."""
+
+    pass
@@ -0,0 +1,250 @@
+"""Локальные заглушки API Практикума и Bot API для нагрузочных тестов.
+
+Оба сервиса живут в одном приложении aiohttp:
+
+    PRACTICUM_ENDPOINT=http://127.0.0.1:8080/api/user_api/homework_statuses/
+    TELEGRAM_API_BASE=http://127.0.0.1:8080
+
+Задержку, долю ошибок, долю ответов 429 и частоту смены статусов
+задают переменные окружения FAKE_*.
+"""
+import asyncio
+import datetime
+import json
+import os
+import random
+import threading
+import time
+
+from aiohttp import web
+
+import status_index
+
+FAKE_HOST = os.getenv("FAKE_HOST", "127.0.0.1")
+FAKE_PORT = int(os.getenv("FAKE_PORT", 8080))
+# Задержка ответа в секундах и её случайный разброс.
+FAKE_LATENCY = float(os.getenv("FAKE_LATENCY", 0.05))
+FAKE_JITTER = float(os.getenv("FAKE_JITTER", 0.02))
+# Доли ответов 500 и 429; Retry-After для 429 в секундах.
+FAKE_ERROR_RATE = float(os.getenv("FAKE_ERROR_RATE", 0.01))
+FAKE_THROTTLE_RATE = float(os.getenv("FAKE_THROTTLE_RATE", 0.01))
+FAKE_RETRY_AFTER = int(os.getenv("FAKE_RETRY_AFTER", 1))
+# Вероятность, что при опросе у студента сменится статус одной работы.
+FAKE_CHURN = float(os.getenv("FAKE_CHURN", 0.05))
+FAKE_HOMEWORKS = int(os.getenv("FAKE_HOMEWORKS", 5))
+
+# Токен в формате, который принимает telegram.Bot.
+FAKE_BOT_TOKEN = "123456:fake-token"
+PRACTICUM_PATH = "/api/user_api/homework_statuses/"
+TELEGRAM_PATH = "/bot{token}/sendMessage"
+STATUSES = status_index.HOMEWORK_STATUSES
+
+
+def iso_date(moment):
+    """Время в формате поля date_updated."""
+    return datetime.datetime.fromtimestamp(
+        moment, datetime.timezone.utc
+    ).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+class Chaos:
+    """Задержки и сбои, общие для обеих заглушек."""
+
+    def __init__(
+        self,
+        latency=FAKE_LATENCY,
+        jitter=FAKE_JITTER,
+        error_rate=FAKE_ERROR_RATE,
+        throttle_rate=FAKE_THROTTLE_RATE,
+        retry_after=FAKE_RETRY_AFTER,
+        rng=None,
+    ):
+        """Параметры по умолчанию берутся из FAKE_*."""
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.rng = random.Random() if rng is None else rng
+
+    async def delay(self):
+        """Ждём, как ждал бы настоящий сервер."""
+        delay = self.latency + self.rng.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def outcome(self):
+        """Исход запроса: 500, 429 или 200."""
+        draw = self.rng.random()
+        if draw < self.error_rate:
+            return 500
+        if draw < self.error_rate + self.throttle_rate:
+            return 429
+        return 200
+
+
+class FakePracticum:
+    """API статусов: у каждого токена свой набор работ."""
+
+    def __init__(self, chaos, churn=FAKE_CHURN, homeworks=FAKE_HOMEWORKS):
+        """Работы создаются при первом запросе токена."""
+        self.chaos = chaos
+        self.churn = churn
+        self.homeworks = homeworks
+        self.students = {}
+        self.stats = {"requests": 0, "errors": 0, "throttled": 0}
+
+    def student(self, token):
+        """Работы студента, при необходимости со сменой статуса."""
+        works = self.students.get(token)
+        now = int(time.time())
+        if works is None:
+            works = self.students[token] = [
+                {
+                    "id": number,
+                    "homework_name": f"{token}__hw{number}.zip",
+                    "status": status_index.REVIEWING,
+                    "date_updated": iso_date(now),
+                    "updated": now,
+                }
+                for number in range(self.homeworks)
+            ]
+        elif works and self.chaos.rng.random() < self.churn:
+            work = self.chaos.rng.choice(works)
+            work["status"] = self.chaos.rng.choice(STATUSES)
+            work["date_updated"] = iso_date(now)
+            work["updated"] = now
+        return works
+
+    async def statuses(self, request):
+        """GET homework_statuses/?from_date=..."""
+        self.stats["requests"] += 1
+        await self.chaos.delay()
+        authorization = request.headers.get("Authorization", "")
+        if not authorization.startswith("OAuth "):
+            return web.json_response(
+                {"code": "not_authenticated"}, status=401
+            )
+        outcome = self.chaos.outcome()
+        if outcome == 500:
+            self.stats["errors"] += 1
+            return web.json_response({"error": "internal"}, status=500)
+        if outcome == 429:
+            self.stats["throttled"] += 1
+            return web.json_response(
+                {"error": "throttled"},
+                status=429,
+                headers={"Retry-After": str(self.chaos.retry_after)},
+            )
+        try:
+            from_date = int(request.query.get("from_date", 0))
+        except ValueError:
+            return web.json_response({"error": "from_date"}, status=400)
+        works = self.student(authorization[len("OAuth "):])
+        return web.json_response({
+            "homeworks": [
+                {key: value for key, value in work.items() if key != "updated"}
+                for work in works
+                if work["updated"] >= from_date
+            ],
+            "current_date": int(time.time()),
+        })
+
+
+class FakeTelegram:
+    """Метод sendMessage Bot API."""
+
+    def __init__(self, chaos):
+        """Счётчики доставленных сообщений по чатам."""
+        self.chaos = chaos
+        self.delivered = {}
+        self.stats = {"requests": 0, "errors": 0, "throttled": 0}
+        self.message_id = 0
+
+    async def send_message(self, request):
+        """POST /bot<token>/sendMessage с JSON или формой."""
+        self.stats["requests"] += 1
+        await self.chaos.delay()
+        outcome = self.chaos.outcome()
+        if outcome == 500:
+            self.stats["errors"] += 1
+            return web.json_response({
+                "ok": False, "error_code": 500, "description": "Internal"
+            }, status=500)
+        if outcome == 429:
+            self.stats["throttled"] += 1
+            retry_after = self.chaos.retry_after
+            return web.json_response({
+                "ok": False,
+                "error_code": 429,
+                "description": f"Too Many Requests: retry after "
+                               f"{retry_after}",
+                "parameters": {"retry_after": retry_after},
+            }, status=429)
+        try:
+            payload = await request.json()
+        except json.JSONDecodeError:
+            payload = dict(await request.post())
+        chat_id = payload.get("chat_id")
+        self.delivered[str(chat_id)] = self.delivered.get(str(chat_id), 0) + 1
+        self.message_id += 1
+        return web.json_response({"ok": True, "result": {
+            "message_id": self.message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "text": payload.get("text"),
+        }})
+
+
+def make_app(chaos=None, practicum=None, telegram=None):
+    """Приложение с обеими заглушками и страницей /stats."""
+    chaos = Chaos() if chaos is None else chaos
+    practicum = FakePracticum(chaos) if practicum is None else practicum
+    telegram = FakeTelegram(chaos) if telegram is None else telegram
+
+    async def stats(request):
+        return web.json_response({
+            "practicum": practicum.stats,
+            "telegram": dict(
+                telegram.stats, delivered=sum(telegram.delivered.values())
+            ),
+        })
+
+    app = web.Application()
+    app["practicum"] = practicum
+    app["telegram"] = telegram
+    app.add_routes([
+        web.get(PRACTICUM_PATH, practicum.statuses),
+        web.post(TELEGRAM_PATH.format(token="{token}"), telegram.send_message),
+        web.get("/stats", stats),
+    ])
+    return app
+
+
+def serve_in_thread(app, host=FAKE_HOST, port=0):
+    """Запускаем приложение в фоновом потоке.
+
+    Возвращаем базовый URL и функцию остановки.
+    """
+    loop = asyncio.new_event_loop()
+    runner = web.AppRunner(app, access_log=None)
+    loop.run_until_complete(runner.setup())
+    site = web.TCPSite(runner, host, port)
+    loop.run_until_complete(site.start())
+    port = site._server.sockets[0].getsockname()[1]
+    thread = threading.Thread(
+        target=loop.run_forever, name="fake-services", daemon=True
+    )
+    thread.start()
+
+    def stop():
+        asyncio.run_coroutine_threadsafe(runner.cleanup(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+
+    return f"http://{host}:{port}", stop
+
+
+if __name__ == "__main__":
+    web.run_app(make_app(), host=FAKE_HOST, port=FAKE_PORT, access_log=None)
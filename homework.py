@@ -1,4 +1,5 @@
 """Бот-ассистент Практикум."""
+import functools
 import logging
 import os
 import sys
@@ -8,7 +9,18 @@ from dotenv import load_dotenv
 import telegram
 import requests
 
+import cursor_store
+import delivery_lag
+import error_notifier
 import exceptions
+import metrics
+import poll_policy
+import response_cache
+import status_index
+import stream_parser
+import retry_policy
+import structured_logging
+import subscriptions
 
 load_dotenv()
 
@@ -17,32 +29,52 @@ TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
 TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
 
 RETRY_PERIOD = 600
-ENDPOINT = "https://practicum.yandex.ru/api/user_api/homework_statuses/"
+# Адреса API переопределяются для работы с локальными заглушками.
+ENDPOINT = os.getenv(
+    "PRACTICUM_ENDPOINT",
+    "https://practicum.yandex.ru/api/user_api/homework_statuses/",
+)
+TELEGRAM_API_BASE = os.getenv("TELEGRAM_API_BASE", "https://api.telegram.org")
 HEADERS = {"Authorization": f"OAuth {PRACTICUM_TOKEN}"}
+# Таймауты (соединение, чтение) в секундах: без них зависшее соединение
+# навсегда останавливает цикл опроса.
+CONNECT_TIMEOUT = 5
+READ_TIMEOUT = 30
+REQUEST_TIMEOUT = (CONNECT_TIMEOUT, READ_TIMEOUT)
 
 # Pytest просит назвать именно HOMEWORK_VERDICTS
 HOMEWORK_VERDICTS = {
-    "approved": "Работа проверена: ревьюеру всё понравилось. Ура!",
-    "reviewing": "Работа взята на проверку ревьюером.",
-    "rejected": "Работа проверена: у ревьюера есть замечания.",
+    status_index.APPROVED: "Работа проверена: ревьюеру всё понравилось. Ура!",
+    status_index.REVIEWING: "Работа взята на проверку ревьюером.",
+    status_index.REJECTED: "Работа проверена: у ревьюера есть замечания.",
 }
 
+# Под этим именем метка единственного пользователя лежит в хранилище.
+DEFAULT_TENANT_ID = "default"
+
 TOKENS = ("PRACTICUM_TOKEN", "TELEGRAM_CHAT_ID", "TELEGRAM_TOKEN")
 
 STATUS_CHANGED_MESSAGE = (
     'Изменился статус проверки работы "{homework_name}". {verdict}'
 )
-SUCCESSFUL_SENDING_MESSAGE = "Сообщение в Telegram отправлено: {message}"
+# Сообщения для лога: аргументы подставляет логгер и только для записей,
+# которые действительно будут выведены.
+SUCCESSFUL_SENDING_MESSAGE = "Сообщение в Telegram отправлено: %(message)s"
 SENDING_ERROR_MESSAGE = (
-    "Сообщение {message} в Телеграм не отправлено. Произошла ошибка {error}"
+    "Сообщение %(message)s в Телеграм не отправлено. "
+    "Произошла ошибка %(error)s"
 )
+TOKEN_CHECK_FAILED_MESSAGE = "Проверка токена %(token)s не пройдена"
+BOT_STARTED_MESSAGE = "Токены получены, бот запущен"
+MAIN_ERROR_LOG_MESSAGE = "Сбой в работе программы: %(error)s"
+# Заголовки запроса в текст ошибок не попадают: в них токен.
 REQUESTS_PROBLEMS_MESSAGE = (
-    "Ошибка запроса {error}. Параметры запроса: {url}, {headers}, {params}."
+    "Ошибка запроса {error}. Параметры запроса: {url}, {params}."
 )
 RESPONSE_ISNT_200_MESSAGE = (
     "Ответ сервера не 200."
     "Получен ответ {status_code}. Параметры запроса:"
-    "{url}, {headers}, {params}. Сообщение сервера:"
+    "{url}, {params}. Сообщение сервера:"
     "{message}."
 )
 HOMEWORK_KEY_ERROR_MESSAGE = 'Нет ключа "homework_name"'
@@ -51,7 +83,7 @@ UNKNOWN_STATUS = "Проучен неихвестный статус: {status}"
 ERROR_MESSAGE_IN_MAIN = "Сбой в работе программы: {error}"
 ERRORS_IN_API_RESPONSE = (
     "В ответе API обнаружились ошибка: {error}. Параметры запроса: {url},"
-    "{headers}, {params}. Ключ: {key}."
+    "{params}. Ключ: {key}."
 )
 RESPONSE_ISNT_DICTIOANARY_MESSAGE = (
     "В ответе API вместо словаря получен {type}"
@@ -62,23 +94,26 @@ VALUE_ISNT_LIST_MESSAGE = 'Значение по ключу "homework" не сп
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
-handler = logging.StreamHandler(stream=sys.stdout)
-logger.addHandler(handler)
-formatter = logging.Formatter(
-    "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
-)
-handler.setFormatter(formatter)
+log_listener = structured_logging.setup(logger, stream=sys.stdout)
 
 
 def send_message(bot, message):
     """Отправка сообщения c обновленным стуатусом в чат."""
+    return send_message_to(bot, TELEGRAM_CHAT_ID, message)
+
+
+def send_message_to(bot, chat_id, message):
+    """Отправка сообщения в произвольный чат."""
     try:
-        bot.send_message(TELEGRAM_CHAT_ID, message)
-        logger.debug(SUCCESSFUL_SENDING_MESSAGE.format(message=message))
+        with metrics.SEND_LATENCY.time():
+            bot.send_message(chat_id, message)
+        logger.debug(SUCCESSFUL_SENDING_MESSAGE, {"message": message})
         return True
     except telegram.TelegramError as error:
+        metrics.count_error(error)
         logger.error(
-            SENDING_ERROR_MESSAGE.format(message=message, error=error),
+            SENDING_ERROR_MESSAGE,
+            {"message": message, "error": error},
             exc_info=True,
         )
         return False
@@ -86,30 +121,99 @@ def send_message(bot, message):
 
 def get_api_answer(current_timestamp):
     """Делаем запрос к API."""
+    return request_api(current_timestamp, HEADERS)
+
+
+def request_api(
+    current_timestamp, headers, session=None, cache=None, stream=False
+):
+    """Делаем запрос к API с заголовками конкретного пользователя.
+
+    Если передана сессия requests.Session, запрос идёт через её пул
+    соединений, иначе — через requests.get. С кешем ResponseCache запрос
+    условный, а вместо неизменившегося ответа возвращается NOT_MODIFIED.
+    С stream=True большой ответ не читается целиком: возвращается
+    HomeworkStream, который отдаёт работы по одной.
+    """
+    key = response_cache.cache_key(headers)
+    if cache is not None:
+        headers = {
+            **headers, **cache.conditional_headers(key, current_timestamp)
+        }
     request_data = dict(
         url=ENDPOINT,
-        headers=HEADERS,
+        headers=headers,
         params={"from_date": current_timestamp},
     )
 
+    http = requests if session is None else session
+    options = {"stream": True} if stream else {}
+    try:
+        with metrics.API_LATENCY.time():
+            response = http.get(
+                **request_data, timeout=REQUEST_TIMEOUT, **options
+            )
+    except requests.exceptions.RequestException as error:
+        raise ConnectionError(
+            REQUESTS_PROBLEMS_MESSAGE.format(error=error, **request_data)
+        )
+
+    if (
+        stream
+        and response.status_code == 200
+        and stream_parser.is_large(response.headers)
+    ):
+        return stream_parser.HomeworkStream(
+            read_chunks(response, request_data), response.close
+        )
+
+    if cache is not None and cache.check(
+        key,
+        current_timestamp,
+        response.status_code,
+        response.content,
+        response.headers,
+    ):
+        return response_cache.NOT_MODIFIED
+    # У заглушек ответа в тестах заголовков может не быть.
+    check_status_code(
+        response.status_code,
+        response.text,
+        request_data,
+        getattr(response, "headers", None),
+    )
+    return check_api_errors(response.json(), request_data)
+
+
+def read_chunks(response, request_data):
+    """Куски тела ответа; обрыв соединения — ConnectionError."""
     try:
-        response = requests.get(**request_data)
+        yield from response.iter_content(stream_parser.STREAM_CHUNK_SIZE)
     except requests.exceptions.RequestException as error:
         raise ConnectionError(
             REQUESTS_PROBLEMS_MESSAGE.format(error=error, **request_data)
         )
 
-    if response.status_code != 200:
+
+def check_status_code(status_code, text, request_data, headers=None):
+    """Проверяем код ответа API; Retry-After из headers попадает в ошибку."""
+    if status_code != 200:
         raise exceptions.ResponseIsnt200Error(
             RESPONSE_ISNT_200_MESSAGE.format(
-                status_code=response.status_code,
-                message=response.get("message"),
+                status_code=status_code,
+                message=text,
                 **request_data,
-            )
+            ),
+            status_code,
+            retry_policy.parse_retry_after(
+                None if headers is None else headers.get("Retry-After")
+            ),
         )
-    api_response = response.json()
-    keys = ("code", "error")
-    for key in keys:
+
+
+def check_api_errors(api_response, request_data):
+    """Проверяем, что API не вернул ошибку в теле ответа."""
+    for key in ("code", "error"):
         if key in api_response:
             raise Exception(
                 ERRORS_IN_API_RESPONSE.format(
@@ -118,7 +222,7 @@ def get_api_answer(current_timestamp):
                     **request_data,
                 )
             )
-        return api_response
+    return api_response
 
 
 def check_response(response):
@@ -152,41 +256,168 @@ def parse_status(homework):
     )
 
 
+def send_and_confirm(send, message, on_delivered=None):
+    """Отправляем через send(message) и при успехе зовём on_delivered."""
+    if not send(message):
+        return False
+    if on_delivered is not None:
+        on_delivered()
+    return True
+
+
+def send_new_statuses(
+    send, index, homeworks, scope=None, lag=None, routed=False
+):
+    """Отправляем сообщения только о работах с изменившимся статусом.
+
+    Статус попадает в индекс лишь после успешной отправки, так что
+    неотправленное изменение будет найдено снова при следующем опросе.
+    С трекером lag функция send получает ещё on_delivered — её нужно
+    вызвать, когда Telegram примет сообщение. С routed=True send получает
+    именованные key — ключ работы, по которому очередь может заменить
+    ещё не отправленное сообщение о ней, — и status для фильтров подписок.
+    Возвращаем True, если доставлены все сообщения.
+    """
+    delivered = True
+    for homework in index.diff(homeworks, scope):
+        args = [parse_status(homework)]
+        if lag is not None:
+            args.append(lag.on_delivered(scope, homework))
+        if routed:
+            sent = send(
+                *args,
+                key=(scope, status_index.homework_key(homework)),
+                status=homework.get("status"),
+            )
+        else:
+            sent = send(*args)
+        if sent:
+            index.commit(homework, scope)
+        else:
+            delivered = False
+    return delivered
+
+
 def check_tokens():
     """Проверка доступности переменных окружения."""
     token_flag = True
     for token in TOKENS:
         if globals()[token] is None:
-            logging.critical(f"Проверка токена {token} не пройдена")
+            logger.critical(TOKEN_CHECK_FAILED_MESSAGE, {"token": token})
             token_flag = False
     return token_flag
 
 
+def open_outbox(bot):
+    """Очередь сообщений в SQLite, если задан OUTBOX_DB, иначе None.
+
+    С ней метка сдвигается, как только сообщения записаны в базу,
+    а доставку повторяет отдельный поток.
+    """
+    # outbox, board и send_queue сами импортируют homework,
+    # поэтому импорт здесь.
+    import outbox
+
+    return outbox.open_outbox(bot)
+
+
+def open_board(bot):
+    """Доска статусов, если задан BOARD_MODE=1, иначе None."""
+    import board
+
+    return board.open_board(bot)
+
+
+def open_broadcaster(bot, outbox):
+    """Рассылка по TELEGRAM_SUBSCRIPTIONS, если он задан, иначе None."""
+    import send_queue
+
+    return subscriptions.open_broadcaster(
+        send_queue.DirectSender(bot) if outbox is None else outbox
+    )
+
+
+def make_delivery(bot):
+    """Доставка новых статусов: правкой доски, через очередь или сразу.
+
+    Возвращаем функцию с аргументами send_new_statuses, кроме send.
+    """
+    board = open_board(bot)
+    if board is not None:
+        return functools.partial(board.post, TELEGRAM_CHAT_ID)
+    outbox = open_outbox(bot)
+    broadcaster = open_broadcaster(bot, outbox)
+    if broadcaster is not None:
+        return functools.partial(
+            send_new_statuses, broadcaster.send, routed=True
+        )
+    if outbox is None:
+        send = functools.partial(
+            send_and_confirm, functools.partial(send_message, bot)
+        )
+    else:
+        send = functools.partial(outbox.send, TELEGRAM_CHAT_ID)
+    return functools.partial(send_new_statuses, send)
+
+
 def main():
     """Основная логика работы бота."""
     if not check_tokens():
         return
-    logger.info("Токены получены, бот запущен")
+    logger.info(BOT_STARTED_MESSAGE)
     bot = telegram.Bot(token=TELEGRAM_TOKEN)
-    current_timestamp = int(time.time())
-
-    while True:
-        try:
-            response = get_api_answer(current_timestamp)
-            homeworks = check_response(response)
-            status = parse_status(homeworks[0])
-            if send_message(bot, status):
-                current_timestamp = response.get(
-                    "current_date", current_timestamp
-                )
+    store = cursor_store.open_store()
+    current_timestamp = store.load(DEFAULT_TENANT_ID, int(time.time()))
+    index = status_index.StatusIndex(store)
+    # Одному пользователю не с кем расходиться во времени, jitter не нужен.
+    policy = poll_policy.PollPolicy(
+        RETRY_PERIOD, jitter=0, retry=retry_policy.RetryPolicy()
+    )
+    notifier = error_notifier.ErrorNotifier(ERROR_MESSAGE_IN_MAIN)
+    lag = delivery_lag.LagTracker()
+    lag.export()
+    failures = 0
+    metrics.serve()
+    deliver = make_delivery(bot)
 
-        except Exception as error:
-            message = ERROR_MESSAGE_IN_MAIN.format(error=error)
-            send_message(bot, message)
-            logger.error(message)
+    try:
+        while True:
+            started = time.monotonic()
+            last_error = None
+            try:
+                response = get_api_answer(current_timestamp)
+                failures = 0
+                homeworks = check_response(response)
+                if deliver(index, homeworks, lag=lag):
+                    current_timestamp = response.get(
+                        "current_date", current_timestamp
+                    )
+                    store.save(DEFAULT_TENANT_ID, current_timestamp)
+                    # Метка одна, копить её в пакет незачем: SIGTERM
+                    # не даст дойти до finally и store.close().
+                    store.flush()
+                recovered = notifier.on_success()
+                if recovered:
+                    send_message(bot, recovered)
+
+            except Exception as error:
+                last_error = error
+                failures = poll_policy.count_failures(failures, error)
+                metrics.count_error(error)
+                logger.error(MAIN_ERROR_LOG_MESSAGE, {"error": error})
+                notice = notifier.on_error(error)
+                if notice:
+                    send_message(bot, notice)
 
-        finally:
-            time.sleep(RETRY_PERIOD)
+            finally:
+                metrics.LOOP_DURATION.observe(time.monotonic() - started)
+                delay = policy.next_delay(
+                    failures, index.in_review(), last_error,
+                    DEFAULT_TENANT_ID,
+                )
+                time.sleep(delay)
+    finally:
+        store.close()
 
 
 if __name__ == "__main__":
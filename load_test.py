@@ -0,0 +1,149 @@
+"""Нагрузочный прогон опроса против локальных заглушек.
+
+    python load_test.py --tenants 10000 --duration 60 --period 30
+
+Заглушки из fake_services поднимаются в фоновом потоке, так что сеть
+не нужна. В конце печатается пропускная способность и задержки.
+"""
+import argparse
+import asyncio
+import threading
+import time
+
+import aiohttp
+import telegram
+
+import async_poller
+import cursor_store
+import fake_services
+import homework
+import metrics
+import poll_policy
+import poller
+import retry_policy
+import send_queue
+import tenants
+
+REPORT = """Режим: {mode}, тенантов: {tenants}, период: {period} с
+Опросов за {duration:.0f} с: {polls} ({poll_rate:.1f} в секунду)
+Запросов к API: {api_requests}, из них 500: {api_errors}, 429: {api_throttled}
+Сообщений доставлено: {delivered}, в очереди: {queued}
+API: среднее {api_mean:.3f} с, p99 до {api_p99} с
+Telegram: среднее {send_mean:.3f} с, p99 до {send_p99} с
+Ошибки: {errors}"""
+
+
+def make_registry(count):
+    """Тенанты с уникальными токенами и чатами."""
+    return [
+        tenants.Tenant(f"tenant-{number}", f"token-{number}", str(number))
+        for number in range(count)
+    ]
+
+
+def point_at(base_url):
+    """Направляем клиентов бота на заглушки."""
+    homework.ENDPOINT = base_url + fake_services.PRACTICUM_PATH
+    homework.TELEGRAM_API_BASE = base_url
+    async_poller.TELEGRAM_API_URL = base_url + "/bot{token}/{method}"
+
+
+async def run_async(registry, policy, duration, concurrency):
+    """Асинхронный опрос в течение duration секунд."""
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        client = async_poller.AsyncClient(
+            session, fake_services.FAKE_BOT_TOKEN, concurrency
+        )
+        instance = async_poller.AsyncPoller(
+            client, cursor_store.MemoryCursorStore(), policy
+        )
+        now = int(time.time())
+        try:
+            await asyncio.wait_for(asyncio.gather(*(
+                instance.tenant_loop(tenant, now) for tenant in registry
+            )), duration)
+        except asyncio.TimeoutError:
+            pass
+    return 0
+
+
+def run_sync(registry, policy, duration, base_url):
+    """Опрос в одном потоке с очередью отправки в течение duration секунд.
+
+    Цикл опроса бесконечный, поэтому он живёт в фоновом потоке.
+    """
+    bot = telegram.Bot(
+        token=fake_services.FAKE_BOT_TOKEN, base_url=base_url + "/bot"
+    )
+    sender = send_queue.SendQueue(bot).start()
+    instance = poller.Poller(sender, policy=policy)
+    threading.Thread(
+        target=instance.run, args=(registry,), daemon=True
+    ).start()
+    time.sleep(duration)
+    sender.stop(timeout=1)
+    return len(sender)
+
+
+def main():
+    """Разбираем аргументы, прогоняем нагрузку и печатаем отчёт."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tenants", type=int, default=1000)
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--period", type=int, default=10)
+    parser.add_argument("--mode", choices=("async", "sync"), default="async")
+    parser.add_argument(
+        "--concurrency", type=int, default=async_poller.ASYNC_CONCURRENCY
+    )
+    args = parser.parse_args()
+
+    app = fake_services.make_app()
+    base_url, stop = fake_services.serve_in_thread(app)
+    point_at(base_url)
+    registry = make_registry(args.tenants)
+    policy = poll_policy.PollPolicy(
+        args.period,
+        reviewing_period=args.period,
+        jitter=0,
+        retry=retry_policy.RetryPolicy(),
+    )
+    started = time.monotonic()
+    try:
+        if args.mode == "async":
+            queued = asyncio.run(run_async(
+                registry, policy, args.duration, args.concurrency
+            ))
+        else:
+            queued = run_sync(registry, policy, args.duration, base_url)
+    finally:
+        stop()
+    elapsed = time.monotonic() - started
+    practicum = app["practicum"].stats
+    polls = metrics.LOOP_DURATION.count
+    print(REPORT.format(
+        mode=args.mode,
+        tenants=args.tenants,
+        period=args.period,
+        duration=elapsed,
+        polls=polls,
+        poll_rate=polls / elapsed,
+        api_requests=practicum["requests"],
+        api_errors=practicum["errors"],
+        api_throttled=practicum["throttled"],
+        delivered=sum(app["telegram"].delivered.values()),
+        queued=queued,
+        api_mean=metrics.API_LATENCY.sum / max(metrics.API_LATENCY.count, 1),
+        api_p99=metrics.API_LATENCY.quantile(0.99),
+        send_mean=(
+            metrics.SEND_LATENCY.sum / max(metrics.SEND_LATENCY.count, 1)
+        ),
+        send_p99=metrics.SEND_LATENCY.quantile(0.99),
+        errors={
+            kind: count for (kind,), count in metrics.ERRORS.values.items()
+        },
+    ))
+
+
+if __name__ == "__main__":
+    main()
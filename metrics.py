@@ -0,0 +1,307 @@
+"""Метрики бота в текстовом формате Prometheus."""
+import bisect
+import contextlib
+import http.server
+import os
+import threading
+import time
+
+# Порт HTTP-сервера метрик; 0 — сервер не запускается.
+METRICS_PORT = int(os.getenv("METRICS_PORT", 0))
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+
+# Границы корзин гистограмм задержек в секундах.
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30
+)
+# Корзины задержки доставки: от секунд до нескольких часов.
+LAG_BUCKETS = (
+    10, 30, 60, 120, 300, 600, 900, 1200, 1800, 3600, 7200, 21600
+)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def escape_label(value):
+    """Экранируем значение метки: обратная косая, перевод строки, кавычка."""
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\n", "\\n")
+        .replace('"', '\\"')
+    )
+
+
+def format_labels(names, values):
+    """Метки в виде {name="value",...} или пустая строка."""
+    if not names:
+        return ""
+    pairs = ",".join(
+        '{}="{}"'.format(name, escape_label(value))
+        for name, value in zip(names, values)
+    )
+    return "{" + pairs + "}"
+
+
+class Counter:
+    """Монотонный счётчик с необязательными метками."""
+
+    kind = "counter"
+
+    def __init__(self, name, documentation, labels=()):
+        """Счётчик name, описание documentation."""
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        """Увеличиваем счётчик для набора меток."""
+        with self.lock:
+            self.values[label_values] = (
+                self.values.get(label_values, 0) + amount
+            )
+
+    def get(self, *label_values):
+        """Текущее значение для набора меток."""
+        return self.values.get(label_values, 0)
+
+    def samples(self):
+        """Строки значений для экспозиции."""
+        with self.lock:
+            values = sorted(self.values.items())
+        for label_values, value in values:
+            yield "{}{} {}".format(
+                self.name, format_labels(self.labels, label_values), value
+            )
+
+
+class Gauge:
+    """Текущее значение, которое считает функция в момент опроса.
+
+    С метками функция возвращает словарь {значения меток: значение}.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labels=()):
+        """Датчик name; пока функция не задана, значение 0."""
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.function = None
+
+    def set_function(self, function):
+        """Значение будет браться из function()."""
+        self.function = function
+
+    def get(self):
+        """Текущее значение."""
+        if self.function is None:
+            return {} if self.labels else 0
+        return self.function()
+
+    def samples(self):
+        """Строки значений для экспозиции."""
+        if not self.labels:
+            yield "{} {}".format(self.name, self.get())
+            return
+        for label_values, value in sorted(self.get().items()):
+            yield "{}{} {}".format(
+                self.name, format_labels(self.labels, label_values), value
+            )
+
+
+class Histogram:
+    """Распределение длительностей по корзинам buckets."""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, buckets=LATENCY_BUCKETS):
+        """Гистограмма name с верхними границами корзин buckets."""
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.lock = threading.Lock()
+
+    @property
+    def count(self):
+        """Число наблюдений."""
+        return sum(self.counts)
+
+    def quantile(self, quantile):
+        """Верхняя граница корзины, в которую попал квантиль, или None."""
+        with self.lock:
+            counts = list(self.counts)
+        rank = quantile * sum(counts)
+        cumulative = 0
+        for bound, count in zip(self.buckets, counts):
+            cumulative += count
+            if count and cumulative >= rank:
+                return bound
+        return float("inf") if counts[-1] else None
+
+    def observe(self, value):
+        """Учитываем одно наблюдение."""
+        position = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[position] += 1
+            self.sum += value
+
+    @contextlib.contextmanager
+    def time(self, clock=time.perf_counter):
+        """Замеряем длительность блока with, даже если он упал."""
+        started = clock()
+        try:
+            yield
+        finally:
+            self.observe(clock() - started)
+
+    def samples(self):
+        """Строки корзин, суммы и числа наблюдений."""
+        with self.lock:
+            counts = list(self.counts)
+            total = self.sum
+        cumulative = 0
+        for bound, count in zip(self.buckets, counts):
+            cumulative += count
+            yield '{}_bucket{{le="{}"}} {}'.format(
+                self.name, bound, cumulative
+            )
+        cumulative += counts[-1]
+        yield '{}_bucket{{le="+Inf"}} {}'.format(self.name, cumulative)
+        yield "{}_sum {}".format(self.name, total)
+        yield "{}_count {}".format(self.name, cumulative)
+
+
+class Registry:
+    """Набор метрик, которые отдаются одной страницей."""
+
+    def __init__(self):
+        """Пустой реестр."""
+        self.metrics = []
+
+    def register(self, metric):
+        """Добавляем метрику и возвращаем её."""
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        """Все метрики в текстовом формате Prometheus."""
+        lines = []
+        for metric in self.metrics:
+            lines.append("# HELP {} {}".format(
+                metric.name, metric.documentation
+            ))
+            lines.append("# TYPE {} {}".format(metric.name, metric.kind))
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+API_LATENCY = REGISTRY.register(Histogram(
+    "practicum_request_seconds", "Длительность запроса к API Практикума"
+))
+SEND_LATENCY = REGISTRY.register(Histogram(
+    "telegram_send_seconds", "Длительность отправки сообщения в Telegram"
+))
+LOOP_DURATION = REGISTRY.register(Histogram(
+    "poll_iteration_seconds", "Длительность одного цикла опроса"
+))
+NOTIFICATION_LAG = REGISTRY.register(Histogram(
+    "notification_lag_seconds",
+    "Задержка от смены статуса работы до доставки сообщения",
+    buckets=LAG_BUCKETS,
+))
+NOTIFICATION_LAG_QUANTILES = REGISTRY.register(Gauge(
+    "notification_lag_quantile_seconds",
+    "Перцентили задержки доставки по последним сообщениям всех тенантов",
+    labels=("quantile",),
+))
+WORST_TENANT_LAG_QUANTILES = REGISTRY.register(Gauge(
+    "worst_tenant_notification_lag_quantile_seconds",
+    "Перцентили задержки доставки у LAG_WORST_TENANTS худших тенантов",
+    labels=("tenant", "quantile"),
+))
+NOTIFICATION_LAG_SLA_MISSES = REGISTRY.register(Counter(
+    "notification_lag_sla_misses_total",
+    "Сообщения, доставленные позже NOTIFICATION_LAG_SLA",
+))
+ERRORS = REGISTRY.register(Counter(
+    "errors_total", "Ошибки по типу исключения", labels=("type",)
+))
+BREAKER_STATE = REGISTRY.register(Gauge(
+    "circuit_breaker_state",
+    "Состояние автомата защиты API: 1 у текущего",
+    labels=("state",),
+))
+SEND_QUEUE_DEPTH = REGISTRY.register(Gauge(
+    "send_queue_depth", "Сообщения в очереди на отправку"
+))
+POLL_QUEUE_DEPTH = REGISTRY.register(Gauge(
+    "poll_queue_depth", "Тенанты, ожидающие опроса"
+))
+SEND_QUEUE_SHED = REGISTRY.register(Counter(
+    "send_queue_shed_total",
+    "Сообщения, заменённые в очереди отправки более новыми о той же работе",
+    labels=("reason",),
+))
+POLLS_DEFERRED = REGISTRY.register(Counter(
+    "polls_deferred_total",
+    "Опросы, отложенные из-за переполненной очереди отправки",
+))
+SINGLE_FLIGHT_SHARED = REGISTRY.register(Counter(
+    "single_flight_shared_total",
+    "Опросы, получившие ответ общего с другими тенантами запроса",
+))
+API_RETRIES = REGISTRY.register(Counter(
+    "api_retries_total",
+    "Решения о быстром повторе опроса по классу ошибки",
+    labels=("kind", "outcome"),
+))
+
+
+def count_error(error):
+    """Учитываем ошибку по имени её типа."""
+    ERRORS.inc(type(error).__name__)
+
+
+class MetricsHandler(http.server.BaseHTTPRequestHandler):
+    """Отдаёт страницу метрик на любой GET."""
+
+    registry = REGISTRY
+
+    def do_GET(self):
+        """Текст всех метрик реестра."""
+        body = self.registry.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        """Запросы Prometheus в лог не пишем."""
+
+
+def start_server(port, host=METRICS_HOST, registry=REGISTRY):
+    """Запускаем сервер метрик в фоновом потоке и возвращаем его."""
+    handler = type(
+        "RegistryHandler", (MetricsHandler,), {"registry": registry}
+    )
+    server = http.server.ThreadingHTTPServer((host, port), handler)
+    threading.Thread(
+        target=server.serve_forever, name="metrics", daemon=True
+    ).start()
+    return server
+
+
+def serve(port=METRICS_PORT, host=METRICS_HOST, registry=REGISTRY):
+    """Сервер метрик на METRICS_PORT или None, если порт не задан."""
+    if not port:
+        return None
+    return start_server(port, host, registry)
@@ -0,0 +1,299 @@
+"""Надёжная очередь исходящих сообщений в SQLite.
+
+Сообщение считается отправленным, как только оно записано в базу:
+цикл опроса сразу сдвигает метку и не ходит в API повторно, если
+Telegram недоступен. Доставкой занимается отдельный поток, который
+повторяет неудачные отправки с растущей паузой, в том числе после
+перезапуска бота.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import telegram
+
+import homework
+import metrics
+import send_queue
+
+OUTBOX_DB = os.getenv("OUTBOX_DB")
+# Пауза перед повтором удваивается с каждой попыткой до OUTBOX_MAX_BACKOFF.
+OUTBOX_BACKOFF = float(os.getenv("OUTBOX_BACKOFF", 1))
+OUTBOX_MAX_BACKOFF = float(os.getenv("OUTBOX_MAX_BACKOFF", 600))
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", 100))
+
+# Повторный опрос после перезапуска не должен плодить копии: сообщение
+# не записывается, если последнее недоставленное о той же работе в тот же
+# чат (message_key — ключ работы) совпадает с ним. Совпадение текста
+# с более старым сообщением не мешает: reviewing -> rejected -> reviewing
+# дойдёт до чата целиком.
+CREATE_TABLE = (
+    "CREATE TABLE IF NOT EXISTS outbox ("
+    "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+    "chat_id TEXT NOT NULL, text TEXT NOT NULL, message_key TEXT, "
+    "attempts INTEGER NOT NULL DEFAULT 0, ready_at REAL NOT NULL)"
+)
+CREATE_KEY_INDEX = (
+    "CREATE INDEX IF NOT EXISTS outbox_key ON outbox (chat_id, message_key)"
+)
+# Прежняя схема отсекала повторы по UNIQUE (chat_id, text).
+SELECT_SCHEMA = "SELECT sql FROM sqlite_master WHERE name = 'outbox'"
+MIGRATE_TABLE = (
+    "ALTER TABLE outbox RENAME TO outbox_unique",
+    CREATE_TABLE,
+    "INSERT INTO outbox (id, chat_id, text, attempts, ready_at) "
+    "SELECT id, chat_id, text, attempts, ready_at FROM outbox_unique",
+    "DROP TABLE outbox_unique",
+)
+SELECT_LAST_TEXT = (
+    "SELECT text FROM outbox WHERE chat_id = ? AND message_key IS ? "
+    "ORDER BY id DESC LIMIT 1"
+)
+INSERT_MESSAGE = (
+    "INSERT INTO outbox (chat_id, text, message_key, ready_at) "
+    "VALUES (?, ?, ?, ?)"
+)
+SELECT_DUE = (
+    "SELECT id, chat_id, text, attempts FROM outbox "
+    "WHERE ready_at <= ? ORDER BY ready_at, id LIMIT ?"
+)
+SELECT_NEXT_READY = "SELECT MIN(ready_at) FROM outbox"
+SELECT_COUNT = "SELECT COUNT(*) FROM outbox"
+DELETE_MESSAGE = "DELETE FROM outbox WHERE id = ?"
+RESCHEDULE_MESSAGE = (
+    "UPDATE outbox SET attempts = ?, ready_at = ? WHERE id = ?"
+)
+POSTPONE_MESSAGE = "UPDATE outbox SET ready_at = ? WHERE id = ?"
+MIGRATE_CHAT = "UPDATE outbox SET chat_id = ? WHERE chat_id = ?"
+
+logger = homework.logger.getChild("outbox")
+
+RETRY_MESSAGE = (
+    "Сообщение в чат %(chat_id)s не доставлено, попытка %(attempt)s, "
+    "следующая через %(delay)s с"
+)
+DROP_MESSAGE = "Сообщение в чат %(chat_id)s отброшено: %(error)s"
+
+
+class Outbox:
+    """Исходящие сообщения, которые хранятся в базе до доставки.
+
+    Интерфейс тот же, что у send_queue.SendQueue. Поток доставки
+    соблюдает лимиты RateLimiter и паузу RetryAfter: сообщение в чат,
+    лимит которого ещё не восстановился, откладывается, и поток берёт
+    следующее. Сообщение, которое Telegram не примет никогда
+    (send_queue.PERMANENT_ERRORS), отбрасывается.
+    Доставка — «хотя бы один раз»: если бот упадёт между отправкой
+    и удалением записи, сообщение уйдёт повторно.
+    """
+
+    def __init__(
+        self,
+        path,
+        bot,
+        limiter=None,
+        backoff=OUTBOX_BACKOFF,
+        max_backoff=OUTBOX_MAX_BACKOFF,
+        batch_size=OUTBOX_BATCH_SIZE,
+    ):
+        """Открываем базу; поток доставки запускается методом start."""
+        self.bot = bot
+        self.limiter = (
+            send_queue.RateLimiter() if limiter is None else limiter
+        )
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.batch_size = batch_size
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        # Запись должна пережить сбой питания: метка уже сдвинута.
+        self.connection.execute("PRAGMA synchronous=FULL")
+        self._create_table()
+        self.condition = threading.Condition()
+        # on_delivered живут только в памяти: после перезапуска
+        # сообщение доставится, но без замера задержки.
+        self.callbacks = {}
+        self.thread = None
+        self.stopped = False
+
+    def _create_table(self):
+        """Создаём таблицу, переводя базу со старой схемой на новую."""
+        schema = self.connection.execute(SELECT_SCHEMA).fetchone()
+        with self.connection:
+            if schema is not None and "UNIQUE" in schema[0]:
+                for statement in MIGRATE_TABLE:
+                    self.connection.execute(statement)
+            self.connection.execute(CREATE_TABLE)
+            self.connection.execute(CREATE_KEY_INDEX)
+
+    def __len__(self):
+        """Сколько сообщений ждёт доставки."""
+        with self.condition:
+            return self.connection.execute(SELECT_COUNT).fetchone()[0]
+
+    def send(self, chat_id, message, on_delivered=None, key=None):
+        """Записываем сообщение в базу; доставка произойдёт в фоне.
+
+        Повтор последнего недоставленного сообщения о работе key
+        в этот чат не записывается.
+        """
+        chat_id = str(chat_id)
+        message_key = None if key is None else json.dumps(key, default=str)
+        with self.condition:
+            with self.connection:
+                last = self.connection.execute(
+                    SELECT_LAST_TEXT, (chat_id, message_key)
+                ).fetchone()
+                if last is not None and last[0] == message:
+                    return True
+                cursor = self.connection.execute(
+                    INSERT_MESSAGE,
+                    (chat_id, message, message_key, time.time()),
+                )
+            if on_delivered is not None:
+                self.callbacks[cursor.lastrowid] = on_delivered
+            self.condition.notify()
+        return True
+
+    def saturated(self):
+        """Сообщения лежат на диске, а не в памяти: опрос не тормозим."""
+        return False
+
+    def start(self):
+        """Запускаем поток доставки."""
+        self.thread = threading.Thread(
+            target=self._work, name="outbox", daemon=True
+        )
+        self.thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        """Останавливаем доставку; недоставленное остаётся в базе."""
+        with self.condition:
+            self.stopped = True
+            self.condition.notify_all()
+        if self.thread is not None:
+            self.thread.join(timeout)
+            if self.thread.is_alive():
+                return
+        with self.condition:
+            self.connection.close()
+
+    def delay(self, attempt):
+        """Пауза перед попыткой номер attempt + 1."""
+        return min(self.max_backoff, self.backoff * 2 ** (attempt - 1))
+
+    def _due(self):
+        """Ждём сообщения, которым пора уходить; None после stop."""
+        with self.condition:
+            while not self.stopped:
+                now = time.time()
+                rows = self.connection.execute(
+                    SELECT_DUE, (now, self.batch_size)
+                ).fetchall()
+                if rows:
+                    return rows
+                ready_at = self.connection.execute(
+                    SELECT_NEXT_READY
+                ).fetchone()[0]
+                self.condition.wait(
+                    None if ready_at is None else max(0, ready_at - now)
+                )
+        return None
+
+    def _work(self):
+        """Цикл потока доставки."""
+        while True:
+            rows = self._due()
+            if rows is None:
+                return
+            for row in rows:
+                self._deliver(*row)
+
+    def _deliver(self, message_id, chat_id, text, attempts):
+        """Отправляем одно сообщение и обновляем его запись.
+
+        Если лимит чата ещё не восстановился, сообщение откладывается
+        до этого момента, чтобы не задерживать сообщения в другие чаты.
+        """
+        now = time.monotonic()
+        ready_at = self.limiter.chat_ready_at(chat_id, now)
+        if ready_at > now:
+            self._postpone(message_id, ready_at - now)
+            return
+        self.limiter.wait(chat_id)
+        try:
+            with metrics.SEND_LATENCY.time():
+                self.bot.send_message(chat_id, text)
+        except telegram.error.RetryAfter as error:
+            metrics.count_error(error)
+            logger.warning(
+                send_queue.RETRY_AFTER_MESSAGE, {"seconds": error.retry_after}
+            )
+            self.limiter.pause(error.retry_after, time.monotonic())
+            self._reschedule(message_id, attempts, error.retry_after)
+        except telegram.error.ChatMigrated as error:
+            metrics.count_error(error)
+            logger.warning(send_queue.CHAT_MIGRATED_MESSAGE, {
+                "chat_id": chat_id, "new_chat_id": error.new_chat_id
+            })
+            self._migrate(chat_id, error.new_chat_id)
+        except send_queue.PERMANENT_ERRORS as error:
+            metrics.count_error(error)
+            logger.error(DROP_MESSAGE, {"chat_id": chat_id, "error": error})
+            self._forget(message_id)
+        except telegram.TelegramError as error:
+            metrics.count_error(error)
+            logger.error(homework.SENDING_ERROR_MESSAGE, {
+                "message": text, "error": error
+            })
+            delay = self.delay(attempts + 1)
+            logger.warning(RETRY_MESSAGE, {
+                "chat_id": chat_id, "attempt": attempts + 1, "delay": delay
+            })
+            self._reschedule(message_id, attempts + 1, delay)
+        else:
+            logger.debug(
+                homework.SUCCESSFUL_SENDING_MESSAGE, {"message": text}
+            )
+            on_delivered = self._forget(message_id)
+            if on_delivered is not None:
+                on_delivered()
+
+    def _reschedule(self, message_id, attempts, delay):
+        """Откладываем сообщение на delay секунд."""
+        with self.condition, self.connection:
+            self.connection.execute(
+                RESCHEDULE_MESSAGE,
+                (attempts, time.time() + delay, message_id),
+            )
+
+    def _postpone(self, message_id, delay):
+        """Откладываем сообщение на delay секунд, не считая попыткой."""
+        with self.condition, self.connection:
+            self.connection.execute(
+                POSTPONE_MESSAGE, (time.time() + delay, message_id)
+            )
+
+    def _migrate(self, chat_id, new_chat_id):
+        """Группа стала супергруппой: все её сообщения идут по новому id."""
+        with self.condition, self.connection:
+            self.connection.execute(
+                MIGRATE_CHAT, (str(new_chat_id), chat_id)
+            )
+
+    def _forget(self, message_id):
+        """Удаляем сообщение из базы и возвращаем его on_delivered."""
+        with self.condition:
+            with self.connection:
+                self.connection.execute(DELETE_MESSAGE, (message_id,))
+            return self.callbacks.pop(message_id, None)
+
+
+def open_outbox(bot, path=OUTBOX_DB):
+    """Запущенная очередь в SQLite, если задан путь, иначе None."""
+    if path:
+        return Outbox(path, bot).start()
+    return None
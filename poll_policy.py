@@ -0,0 +1,100 @@
+"""Интервал до следующего опроса: отступ при сбоях, спешка на ревью."""
+import os
+import random
+
+import exceptions
+import timing_wheel
+
+# Пока работа на ревью, опрашиваем чаще, чтобы вердикт пришёл быстрее.
+REVIEWING_PERIOD = int(os.getenv("REVIEWING_PERIOD", 120))
+MAX_BACKOFF_PERIOD = int(os.getenv("MAX_BACKOFF_PERIOD", 3600))
+# Доля интервала, на которую он случайно сдвигается, чтобы тенанты
+# не ходили в API одновременно.
+POLL_JITTER = float(os.getenv("POLL_JITTER", 0.1))
+# На столько откладывается опрос, пока очередь отправки переполнена.
+BACKPRESSURE_DELAY = float(os.getenv("BACKPRESSURE_DELAY", 30))
+
+MAX_BACKOFF_EXPONENT = 16
+
+# Ошибки недоступности API: после них частые запросы только мешают.
+BACKOFF_ERRORS = (ConnectionError, exceptions.ResponseIsnt200Error)
+
+
+class PollPolicy:
+    """Правило выбора паузы между опросами одного тенанта."""
+
+    def __init__(
+        self,
+        period,
+        reviewing_period=REVIEWING_PERIOD,
+        max_period=MAX_BACKOFF_PERIOD,
+        jitter=POLL_JITTER,
+        uniform=random.uniform,
+        backpressure_delay=BACKPRESSURE_DELAY,
+        retry=None,
+    ):
+        """Обычная пауза — period; без jitter пауза детерминирована.
+
+        retry — retry_policy.RetryPolicy для быстрых повторов после
+        временных сбоев; без него после сбоя ждём отступа от period.
+        """
+        self.period = period
+        self.reviewing_period = reviewing_period
+        self.max_period = max_period
+        self.jitter = jitter
+        self.uniform = uniform
+        self.backpressure_delay = backpressure_delay
+        self.retry = retry
+
+    def next_delay(
+        self, failures=0, reviewing=False, error=None, tenant_id=None
+    ):
+        """Пауза после опроса.
+
+        failures — сколько опросов подряд API был недоступен,
+        reviewing — есть ли у тенанта работа на ревью,
+        error — ошибка последнего опроса тенанта tenant_id.
+        """
+        if failures:
+            exponent = min(failures - 1, MAX_BACKOFF_EXPONENT)
+            delay = min(self.period * 2 ** exponent, self.max_period)
+        elif reviewing:
+            delay = min(self.reviewing_period, self.period)
+        else:
+            delay = self.period
+        if self.jitter:
+            delay *= 1 + self.uniform(-self.jitter, self.jitter)
+        if failures and error is not None and self.retry is not None:
+            delay = self.retry.next_delay(tenant_id, error, failures, delay)
+        return delay
+
+    def next_deadline(
+        self, now, failures, reviewing, offset, error=None, tenant_id=None
+    ):
+        """Момент следующего опроса тенанта со сдвигом offset.
+
+        Обычный опрос идёт в постоянный момент тенанта внутри периода,
+        чтобы нагрузка на API была ровной. Колесо таймеров срабатывает
+        с точностью до тика, поэтому свой момент ищем не раньше чем
+        через полпериода.
+        """
+        if failures or reviewing:
+            return now + self.next_delay(
+                failures, reviewing, error, tenant_id
+            )
+        return timing_wheel.phase_deadline(
+            now + self.period / 2, offset, self.period
+        )
+
+
+def count_failures(failures, error):
+    """Новое число сбоев подряд после опроса с ошибкой error или без.
+
+    Отказ открытого автомата — не сбой: запроса не было, и отступ
+    тенанта не должен расти, пока автомат ждёт reset_timeout.
+    """
+    if isinstance(error, exceptions.CircuitOpenError):
+        return failures
+    if isinstance(error, BACKOFF_ERRORS):
+        return failures + 1
+    return 0
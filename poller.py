@@ -0,0 +1,365 @@
+"""Опрос API Практикума для всех тенантов из одного процесса."""
+import asyncio
+import functools
+import os
+import time
+from array import array
+
+import telegram
+
+import api_session
+import board
+import circuit_breaker
+import cursor_store
+import delivery_lag
+import error_notifier
+import exceptions
+import homework
+import metrics
+import outbox
+import poll_policy
+import response_cache
+import retry_policy
+import send_queue
+import sharding
+import single_flight
+import status_index
+import stream_parser
+import subscriptions
+import tenants
+import timing_wheel
+
+TENANTS_FILE = os.getenv("TENANTS_FILE", "tenants.json")
+# sync — опрос в одном потоке, async — цикл событий asyncio и aiohttp.
+POLLER_MODE = os.getenv("POLLER_MODE", "sync")
+
+logger = homework.logger.getChild("poller")
+
+NO_TELEGRAM_TOKEN_MESSAGE = "Проверка токена TELEGRAM_TOKEN не пройдена"
+NO_TENANTS_MESSAGE = "Реестр тенантов %(path)s пуст"
+POLLER_STARTED_MESSAGE = "Опрос запущен, тенантов: %(count)s"
+TENANT_ERROR_MESSAGE = (
+    "Тенант %(tenant_id)s: сбой в работе программы: %(error)s"
+)
+SHARD_MESSAGE = (
+    "Воркер %(worker_id)s: тенантов %(owned)s из %(total)s, "
+    "воркеров %(workers)s"
+)
+BREAKER_TRANSITION_MESSAGE = (
+    "Автомат защиты API: %(old_state)s -> %(new_state)s"
+)
+
+
+def log_breaker_transition(old_state, new_state):
+    """Пишем в лог смену состояния автомата защиты."""
+    logger.warning(BREAKER_TRANSITION_MESSAGE, {
+        "old_state": old_state, "new_state": new_state
+    })
+
+
+def rebalance(shard, store, registry, index=None):
+    """Продлеваем аренды воркера, если пора, и обновляем метки.
+
+    Метки и статусы тенантов, сменивших владельца, перечитываются
+    из общего хранилища, поэтому тенант продолжает опрашиваться с того места,
+    где его оставил прежний воркер.
+    """
+    if shard is None or not shard.due():
+        return
+    hand_over(
+        shard, store, registry,
+        shard.refresh(tenant.tenant_id for tenant in registry),
+        index,
+    )
+
+
+def hand_over(shard, store, registry, moved, index=None):
+    """Забываем метки и статусы тенантов moved, сменивших владельца."""
+    if moved:
+        store.evict(moved)
+        if index is not None:
+            index.forget(moved)
+        logger.info(SHARD_MESSAGE, {
+            "worker_id": shard.worker_id,
+            "owned": len(shard.owned),
+            "total": len(registry),
+            "workers": len(shard.workers),
+        })
+
+
+class Poller:
+    """Опрос всех тенантов в одном потоке.
+
+    Держит общее для тенантов состояние: метки, индекс статусов,
+    политику пауз и учёт ошибок.
+    """
+
+    def __init__(
+        self, sender, session=None, store=None, policy=None, notifier=None,
+        breaker=None, lag=None, shard=None, board=None,
+    ):
+        """Всё, что не передано, создаётся со значениями по умолчанию."""
+        if store is None:
+            store = cursor_store.MemoryCursorStore()
+        if policy is None:
+            policy = poll_policy.PollPolicy(
+                homework.RETRY_PERIOD, retry=retry_policy.RetryPolicy()
+            )
+        if notifier is None:
+            notifier = error_notifier.ErrorNotifier(
+                homework.ERROR_MESSAGE_IN_MAIN
+            )
+        if breaker is None:
+            breaker = circuit_breaker.CircuitBreaker()
+            breaker.add_listener(log_breaker_transition)
+            breaker.export()
+        self.sender = sender
+        self.session = session
+        self.breaker = breaker
+        self.store = store
+        self.policy = policy
+        self.notifier = notifier
+        self.lag = delivery_lag.LagTracker() if lag is None else lag
+        # Доля тенантов этого воркера; None — опрашиваем всех.
+        self.shard = shard
+        # Доски статусов; None — сообщение о каждой смене статуса.
+        self.board = board
+        self.index = status_index.StatusIndex(store)
+        self.cache = response_cache.ResponseCache()
+        # Запросы по токенам из shared объединяются через flights.
+        self.flights = single_flight.SingleFlight()
+        self.shared = set()
+        # Тенанты, чей момент опроса уже наступил, но до них не дошла очередь.
+        self.backlog = 0
+
+    def poll_tenant(self, tenant, current_timestamp):
+        """Один цикл опроса тенанта, возвращаем новую метку времени.
+
+        Неизменившийся ответ не разбирается. Пока новых работ нет,
+        метка остаётся прежней: так следующий запрос снова попадёт в кеш.
+        Большой ответ разбирается потоком прямо в отправку.
+        """
+        headers = tenant.headers
+        response, homeworks = self.request(headers, current_timestamp)
+        if response is response_cache.NOT_MODIFIED:
+            return current_timestamp
+        if self.board is None:
+            deliver = functools.partial(
+                homework.send_new_statuses,
+                # Очередь принимает сообщение сразу, так что рассылка
+                # не копит недоставленные чаты и ей незачем жить дольше.
+                subscriptions.Broadcaster(self.sender, tenant.routes).send,
+                routed=True,
+            )
+        else:
+            deliver = functools.partial(self.board.post, tenant.chat_id)
+        if not deliver(self.index, homeworks, tenant.tenant_id, self.lag):
+            return current_timestamp
+        self.cache.commit(response_cache.cache_key(headers))
+        if not homeworks:
+            return current_timestamp
+        return response.get("current_date", current_timestamp)
+
+    def request(self, headers, current_timestamp):
+        """Ответ API и список работ из него.
+
+        Токен, общий для нескольких тенантов, запрашивается одним
+        запросом на всех: ответ и результат check_response достаются
+        каждому тенанту. Такой ответ не сверяется с кешем: то, что видел
+        один тенант, для другого ещё новое.
+        """
+        key = response_cache.cache_key(headers)
+        if key in self.shared:
+            return self.flights.do(
+                (key, current_timestamp), self.fetch,
+                headers, current_timestamp,
+            )
+        response = self.breaker.call(
+            homework.request_api,
+            current_timestamp,
+            headers,
+            self.session,
+            self.cache,
+            stream=True,
+        )
+        if response is response_cache.NOT_MODIFIED:
+            return response, None
+        if isinstance(response, stream_parser.HomeworkStream):
+            return response, response
+        return response, homework.check_response(response)
+
+    def fetch(self, headers, current_timestamp):
+        """Запрос без кеша и потока: его результат делят тенанты."""
+        response = self.breaker.call(
+            homework.request_api, current_timestamp, headers, self.session
+        )
+        return response, homework.check_response(response)
+
+    def poll_and_save(self, tenant, now):
+        """Опрашиваем тенанта с его сохранённой метки и сохраняем новую.
+
+        Возвращаем ошибку опроса или None.
+        """
+        current_timestamp = self.store.load(tenant.tenant_id, now)
+        try:
+            with metrics.LOOP_DURATION.time():
+                self.store.save(
+                    tenant.tenant_id,
+                    self.poll_tenant(tenant, current_timestamp),
+                )
+        except Exception as error:
+            metrics.count_error(error)
+            logger.error(TENANT_ERROR_MESSAGE, {
+                "tenant_id": tenant.tenant_id, "error": error
+            })
+            self.notify(tenant, self.notifier.on_error(
+                error, tenant.tenant_id
+            ))
+            return error
+        self.notify(tenant, self.notifier.on_success(tenant.tenant_id))
+        return None
+
+    def notify(self, tenant, message):
+        """Отправляем служебное сообщение тенанту, если оно есть."""
+        if message:
+            self.sender.send(tenant.chat_id, message)
+
+    def owns(self, tenant):
+        """Опрашивает ли тенанта этот воркер."""
+        return self.shard is None or self.shard.owns(tenant.tenant_id)
+
+    def saturated(self):
+        """Переполнена ли очередь отправки."""
+        return self.sender is not None and self.sender.saturated()
+
+    def poll_due(self, tenant, now, failures, offset):
+        """Опрос тенанта, чей момент наступил.
+
+        Возвращаем новое число сбоев подряд и момент следующего опроса.
+        Пока очередь отправки переполнена, опрос откладывается: новым
+        сообщениям пришлось бы ждать места, а метка тенанта не сдвигается.
+        """
+        error = None
+        if self.owns(tenant):
+            if self.saturated():
+                metrics.POLLS_DEFERRED.inc()
+                return failures, time.time() + self.policy.backpressure_delay
+            error = self.poll_and_save(tenant, now)
+            failures = poll_policy.count_failures(failures, error)
+        return failures, self.policy.next_deadline(
+            time.time(),
+            failures,
+            self.index.in_review(tenant.tenant_id),
+            offset,
+            error,
+            tenant.tenant_id,
+        )
+
+    def run(self, registry, now=None):
+        """Бесконечный цикл опроса по колесу таймеров.
+
+        Каждый тенант опрашивается в свой постоянный момент внутри
+        периода policy, поэтому запросы идут ровным потоком. После сбоя
+        или во время ревью пауза берётся из policy. В режиме шардирования
+        в колесе лежат все тенанты, но опрашиваются только свои.
+        Переполненная очередь отправки откладывает опросы. Тенанты
+        с общим токеном опрашиваются в один момент одним запросом.
+        """
+        now = int(time.time()) if now is None else now
+        period = self.policy.period
+        wheel = timing_wheel.TimingWheel(period, now=time.time())
+        # Смещения и счётчики сбоев — массивы чисел, а не списки
+        # объектов int: на сотнях тысяч тенантов это заметно.
+        self.shared = single_flight.shared_keys(registry)
+        offsets = array("q", (
+            timing_wheel.stable_offset(
+                single_flight.phase_key(tenant, self.shared), period
+            )
+            for tenant in registry
+        ))
+        failures = array("l", [0]) * len(registry)
+        for position in range(len(registry)):
+            wheel.insert(position, timing_wheel.phase_deadline(
+                time.time(), offsets[position], period
+            ))
+        metrics.POLL_QUEUE_DEPTH.set_function(lambda: self.backlog)
+        try:
+            while True:
+                self.backlog = 0
+                rebalance(self.shard, self.store, registry, self.index)
+                time.sleep(max(0, wheel.next_tick_at - time.time()))
+                due = wheel.advance(time.time())
+                for done, position in enumerate(due):
+                    self.backlog = len(due) - done
+                    failures[position], deadline = self.poll_due(
+                        registry[position],
+                        now,
+                        failures[position],
+                        offsets[position],
+                    )
+                    wheel.insert(position, deadline)
+        finally:
+            self.store.close()
+
+
+def main():
+    """Запуск опроса всех тенантов из реестра."""
+    if homework.TELEGRAM_TOKEN is None:
+        logger.critical(NO_TELEGRAM_TOKEN_MESSAGE)
+        return
+    try:
+        registry = tenants.load_tenants(TENANTS_FILE)
+    except exceptions.TenantRegistryError as error:
+        logger.critical(error)
+        return
+    if not registry:
+        logger.critical(NO_TENANTS_MESSAGE, {"path": TENANTS_FILE})
+        return
+    logger.info(POLLER_STARTED_MESSAGE, {"count": len(registry)})
+    metrics.serve()
+    if POLLER_MODE == "async":
+        import async_poller
+
+        asyncio.run(async_poller.run(
+            registry,
+            homework.TELEGRAM_TOKEN,
+            cursor_store.open_store(),
+            shard=sharding.open_shard(),
+        ))
+        return
+    bot = telegram.Bot(
+        token=homework.TELEGRAM_TOKEN,
+        base_url=homework.TELEGRAM_API_BASE + "/bot",
+    )
+    sender = outbox.open_outbox(bot)
+    if sender is None:
+        sender = send_queue.SendQueue(bot).start()
+    metrics.SEND_QUEUE_DEPTH.set_function(sender.__len__)
+    # Временные сбои повторяет RetryPolicy в пределах бюджетов; повторы
+    # адаптера под ней множили бы запросы в обход RETRY_RATE.
+    session = api_session.make_session(max_retries=0)
+    api_session.warm_up(session)
+    shard = sharding.open_shard()
+    # Доски правятся в пределах тех же лимитов Telegram, что и сообщения.
+    status_board = board.open_board(bot, sender.limiter)
+    lag = delivery_lag.LagTracker()
+    lag.export()
+    try:
+        Poller(
+            sender,
+            session,
+            cursor_store.open_store(),
+            lag=lag,
+            shard=shard,
+            board=status_board,
+        ).run(registry)
+    finally:
+        if shard is not None:
+            shard.close()
+        if status_board is not None:
+            status_board.stop(timeout=homework.READ_TIMEOUT)
+        sender.stop(timeout=homework.READ_TIMEOUT)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Кеш ответов API: не разбираем ответ, если он не изменился."""
+import hashlib
+import re
+
+# Возвращается вместо ответа API, если он такой же, как в прошлый раз.
+NOT_MODIFIED = object()
+
+NOT_MODIFIED_STATUS = 304
+# Сервер кладёт в каждый ответ текущее время: для сравнения оно не важно.
+CURRENT_DATE = re.compile(rb'"current_date"\s*:\s*\d+')
+
+
+def cache_key(headers):
+    """Ключ кеша — заголовок авторизации, то есть токен."""
+    return headers.get("Authorization")
+
+
+def digest(body):
+    """Отпечаток тела ответа без поля current_date."""
+    return hashlib.blake2b(
+        CURRENT_DATE.sub(b"", body), digest_size=16
+    ).digest()
+
+
+class Entry:
+    """Валидаторы последнего разобранного ответа."""
+
+    __slots__ = ("from_date", "digest", "etag", "last_modified")
+
+    def __init__(self, from_date, digest, etag, last_modified):
+        """Ответ на запрос с from_date."""
+        self.from_date = from_date
+        self.digest = digest
+        self.etag = etag
+        self.last_modified = last_modified
+
+
+class ResponseCache:
+    """Последний ответ на каждый токен при том же from_date.
+
+    Ответ запоминается в два шага: check откладывает новый ответ,
+    а commit принимает его, когда опрос тенанта прошёл успешно. Иначе
+    ответ, который не удалось обработать, считался бы уже виденным
+    и больше не разбирался. Неподтверждённый ответ просто заменится
+    следующим.
+    """
+
+    def __init__(self):
+        """Пустой кеш."""
+        self.entries = {}
+        self.staged = {}
+
+    def conditional_headers(self, key, from_date):
+        """Заголовки условного запроса, если ответ уже есть в кеше."""
+        entry = self.entries.get(key)
+        if entry is None or entry.from_date != from_date:
+            return {}
+        headers = {}
+        if entry.etag:
+            headers["If-None-Match"] = entry.etag
+        if entry.last_modified:
+            headers["If-Modified-Since"] = entry.last_modified
+        return headers
+
+    def check(self, key, from_date, status_code, body, headers):
+        """Ответ не изменился с прошлого успешного опроса.
+
+        Изменившийся ответ с кодом 200 откладывается до commit.
+        """
+        entry = self.entries.get(key)
+        if entry is not None and entry.from_date != from_date:
+            entry = None
+        if status_code == NOT_MODIFIED_STATUS:
+            return entry is not None
+        if status_code != 200:
+            return False
+        body_digest = digest(body)
+        if entry is not None and entry.digest == body_digest:
+            return True
+        self.staged[key] = Entry(
+            from_date,
+            body_digest,
+            headers.get("ETag"),
+            headers.get("Last-Modified"),
+        )
+        return False
+
+    def commit(self, key):
+        """Опрос успешен: отложенный ответ становится текущим."""
+        entry = self.staged.pop(key, None)
+        if entry is not None:
+            self.entries[key] = entry
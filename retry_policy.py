@@ -0,0 +1,209 @@
+"""Быстрые повторы опроса после временных сбоев API Практикума.
+
+Без них после любого сбоя тенант ждёт обычной паузы PollPolicy — не
+меньше RETRY_PERIOD. RetryPolicy повторяет временный сбой через секунды:
+правило выбирается по классу ошибки, а Retry-After из ответа
+соблюдается всегда. Чтобы повторы не раздули шторм запросов, у каждого
+тенанта есть бюджет повторов, а у всех вместе — предел их частоты.
+Сверх бюджета и предела тенант ждёт обычной паузы.
+"""
+import email.utils
+import math
+import os
+import random
+import threading
+import time
+from collections import namedtuple
+
+import exceptions
+import metrics
+
+NETWORK = "network"
+SERVER = "server"
+THROTTLED = "throttled"
+
+SCHEDULED = "scheduled"
+OVER_BUDGET = "budget"
+OVER_RATE = "rate"
+
+# Сколько быстрых повторов подряд, дальше — обычный отступ PollPolicy.
+RETRY_ATTEMPTS = int(os.getenv("RETRY_ATTEMPTS", 3))
+# Пауза перед первым повтором; с каждым следующим она удваивается.
+RETRY_BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY", 2))
+RETRY_THROTTLED_DELAY = float(os.getenv("RETRY_THROTTLED_DELAY", 30))
+RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY", 120))
+# Бюджет тенанта: столько быстрых повторов за RETRY_BUDGET_WINDOW секунд.
+RETRY_BUDGET = float(os.getenv("RETRY_BUDGET", 6))
+RETRY_BUDGET_WINDOW = float(os.getenv("RETRY_BUDGET_WINDOW", 3600))
+# Предел для всех тенантов процесса: повторов в секунду и запас на всплеск.
+RETRY_RATE = float(os.getenv("RETRY_RATE", 5))
+RETRY_BURST = float(os.getenv("RETRY_BURST", 20))
+RETRY_JITTER = float(os.getenv("RETRY_JITTER", 0.2))
+# Retry-After больше этого считаем ошибкой сервера и не ждём дольше.
+MAX_RETRY_AFTER = float(os.getenv("MAX_RETRY_AFTER", 3600))
+
+
+class RetryRule(namedtuple(
+    "RetryRule", ("base_delay", "max_delay", "attempts")
+)):
+    """Правило повторов для одного класса ошибок."""
+
+    __slots__ = ()
+
+    def delay(self, attempt):
+        """Пауза перед повтором номер attempt."""
+        return min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+
+
+RETRY_RULES = {
+    NETWORK: RetryRule(RETRY_BASE_DELAY, RETRY_MAX_DELAY, RETRY_ATTEMPTS),
+    # Упавшему серверу даём подняться чуть дольше, чем сети.
+    SERVER: RetryRule(2 * RETRY_BASE_DELAY, RETRY_MAX_DELAY, RETRY_ATTEMPTS),
+    THROTTLED: RetryRule(
+        RETRY_THROTTLED_DELAY, RETRY_MAX_DELAY, RETRY_ATTEMPTS
+    ),
+}
+
+
+def error_class(error):
+    """Класс временной ошибки или None, если быстрый повтор не поможет.
+
+    Отказ в доступе и ошибки в теле ответа повтором не лечатся.
+    Открытый автомат сам решает, когда пробовать снова.
+    """
+    if isinstance(error, exceptions.CircuitOpenError):
+        return None
+    if isinstance(error, exceptions.ResponseIsnt200Error):
+        if error.status_code == 429:
+            return THROTTLED
+        if error.status_code is None or error.status_code >= 500:
+            return SERVER
+        return None
+    if isinstance(error, ConnectionError):
+        return NETWORK
+    return None
+
+
+def parse_retry_after(value, now=None):
+    """Секунды из заголовка Retry-After: числом или HTTP-датой.
+
+    Дробная часть числа отбрасывается. Неразборчивое значение — None.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        seconds = float(value)
+    except ValueError:
+        seconds = None
+    if seconds is not None:
+        if not math.isfinite(seconds):
+            return None
+        return float(max(int(seconds), 0))
+    try:
+        moment = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    now = time.time() if now is None else now
+    return max(0.0, moment.timestamp() - now)
+
+
+class TokenBucket:
+    """Ведро жетонов: rate в секунду, не больше capacity."""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate, capacity, now):
+        """Ведро полное."""
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+
+    def refill(self, now):
+        """Доливаем жетоны за прошедшее время; True, если ведро полное."""
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.updated) * self.rate
+        )
+        self.updated = now
+        return self.tokens >= self.capacity
+
+
+class RetryPolicy:
+    """Выбор паузы после сбоя опроса с учётом бюджетов.
+
+    Один экземпляр на процесс: предел частоты общий для его тенантов.
+    Полные вёдра тенантов не хранятся, так что память занимают только
+    недавно сбоившие тенанты.
+    """
+
+    def __init__(
+        self,
+        rules=RETRY_RULES,
+        budget=RETRY_BUDGET,
+        budget_window=RETRY_BUDGET_WINDOW,
+        rate=RETRY_RATE,
+        burst=RETRY_BURST,
+        jitter=RETRY_JITTER,
+        clock=time.monotonic,
+        uniform=random.uniform,
+    ):
+        """Бюджеты всех тенантов полные."""
+        self.rules = rules
+        self.budget = budget
+        self.budget_window = budget_window
+        self.jitter = jitter
+        self.clock = clock
+        self.uniform = uniform
+        self.bucket = TokenBucket(rate, burst, clock())
+        self.budgets = {}
+        self.purge_at = clock() + budget_window
+        self.lock = threading.Lock()
+
+    def next_delay(self, tenant_id, error, failures, fallback):
+        """Пауза после failures-го сбоя подряд с ошибкой error.
+
+        fallback — обычная пауза PollPolicy: она берётся, если правила
+        для ошибки нет, быстрые повторы кончились или не хватило
+        бюджета. Retry-After удлиняет любую паузу.
+        """
+        retry_after = min(
+            getattr(error, "retry_after", None) or 0, MAX_RETRY_AFTER
+        )
+        kind = error_class(error)
+        rule = self.rules.get(kind)
+        if rule is None or failures > rule.attempts:
+            return max(fallback, retry_after)
+        outcome = self._spend(tenant_id)
+        metrics.API_RETRIES.inc(kind, outcome)
+        if outcome != SCHEDULED:
+            return max(fallback, retry_after)
+        delay = rule.delay(failures)
+        if self.jitter:
+            delay *= 1 + self.uniform(-self.jitter, self.jitter)
+        return max(delay, retry_after)
+
+    def _spend(self, tenant_id):
+        """Берём жетон из бюджета тенанта и общего ведра."""
+        now = self.clock()
+        with self.lock:
+            if now >= self.purge_at:
+                self.budgets = {
+                    known: bucket for known, bucket in self.budgets.items()
+                    if not bucket.refill(now)
+                }
+                self.purge_at = now + self.budget_window
+            budget = self.budgets.get(tenant_id)
+            if budget is None:
+                budget = self.budgets[tenant_id] = TokenBucket(
+                    self.budget / self.budget_window, self.budget, now
+                )
+            budget.refill(now)
+            self.bucket.refill(now)
+            if budget.tokens < 1:
+                return OVER_BUDGET
+            if self.bucket.tokens < 1:
+                return OVER_RATE
+            budget.tokens -= 1
+            self.bucket.tokens -= 1
+        return SCHEDULED
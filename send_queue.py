@@ -0,0 +1,389 @@
+"""Очередь исходящих сообщений в Telegram с ограничением скорости."""
+import functools
+import heapq
+import itertools
+import os
+import threading
+import time
+from collections import namedtuple
+
+import telegram
+
+import homework
+import metrics
+
+# Лимиты Telegram: около 30 сообщений в секунду на бота и одно в секунду
+# на чат.
+TELEGRAM_GLOBAL_RATE = float(os.getenv("TELEGRAM_GLOBAL_RATE", 30))
+TELEGRAM_CHAT_RATE = float(os.getenv("TELEGRAM_CHAT_RATE", 1))
+SEND_WORKERS = int(os.getenv("SEND_WORKERS", 4))
+# Пауза перед повтором удваивается с каждой попыткой до SEND_MAX_BACKOFF.
+SEND_MAX_BACKOFF = float(os.getenv("SEND_MAX_BACKOFF", 300))
+# Сколько сообщений может ждать отправки и что делать, когда места нет.
+SEND_QUEUE_SIZE = int(os.getenv("SEND_QUEUE_SIZE", 10000))
+SEND_QUEUE_POLICY = os.getenv("SEND_QUEUE_POLICY", "collapse")
+# С такой заполненности очередь считается переполненной и опрос
+# притормаживает.
+SEND_QUEUE_HIGH_WATER = float(os.getenv("SEND_QUEUE_HIGH_WATER", 0.8))
+# Корзины чатов, которые давно не писали, удаляются, когда их больше.
+MAX_IDLE_CHAT_BUCKETS = 10000
+
+logger = homework.logger.getChild("send_queue")
+
+RETRY_AFTER_MESSAGE = "Telegram просит подождать %(seconds)s с"
+DROP_MESSAGE = "Сообщение в чат %(chat_id)s отброшено: %(error)s"
+CHAT_MIGRATED_MESSAGE = "Чат %(chat_id)s переехал в %(new_chat_id)s"
+UNKNOWN_POLICY_MESSAGE = "Неизвестная политика очереди: {policy}"
+
+# Политики очереди: только ждать места или ещё и заменять неотправленное
+# сообщение о той же работе в тот же чат. Прочие сообщения не вытесняются:
+# их статусы уже в индексе, и второй раз опрос их не найдёт.
+BLOCK, COLLAPSE = "block", "collapse"
+POLICIES = (BLOCK, COLLAPSE)
+
+# Ошибки, которые повтором не лечатся: неверный запрос или чат, бот
+# заблокирован (Unauthorized — это и 403 Forbidden), неверный токен.
+PERMANENT_ERRORS = (
+    telegram.error.BadRequest,
+    telegram.error.Unauthorized,
+    telegram.error.InvalidToken,
+)
+
+# Этапы сообщения: ждёт лимита чата, ждёт общего лимита, готово.
+CHAT_STAGE, GLOBAL_STAGE, READY_STAGE = range(3)
+
+# on_delivered вызывается без аргументов, когда Telegram принял сообщение;
+# number — порядковый номер сообщения в очереди.
+Outgoing = namedtuple(
+    "Outgoing",
+    ("chat_id", "text", "attempt", "stage", "on_delivered", "number"),
+    defaults=(None, None),
+)
+
+
+class TokenBucket:
+    """Корзина токенов в форме GCRA: хранит только одно время.
+
+    reserve не ждёт, а возвращает момент, когда можно отправлять;
+    резервы выдаются по порядку, поэтому очередь ожидающих не нужна.
+    """
+
+    __slots__ = ("interval", "tolerance", "tat")
+
+    def __init__(self, rate, capacity=1):
+        """Скорость rate — токенов в секунду, capacity — размер всплеска."""
+        self.interval = 1 / rate
+        self.tolerance = (capacity - 1) * self.interval
+        self.tat = 0.0
+
+    def reserve(self, now):
+        """Берём токен и возвращаем момент, когда его можно потратить."""
+        allowed_at = max(now, self.tat - self.tolerance)
+        self.tat = max(self.tat, allowed_at) + self.interval
+        return allowed_at
+
+    def idle(self, now):
+        """Корзина полна, и её можно забыть без потери лимита."""
+        return self.tat <= now
+
+
+class RateLimiter:
+    """Общий лимит бота и лимит каждого чата, плюс пауза от RetryAfter."""
+
+    def __init__(
+        self, global_rate=TELEGRAM_GLOBAL_RATE, chat_rate=TELEGRAM_CHAT_RATE
+    ):
+        """Корзины чатов создаются при первом сообщении в чат."""
+        self.global_bucket = TokenBucket(global_rate, int(global_rate) or 1)
+        self.chat_rate = chat_rate
+        self.chats = {}
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def reserve_chat(self, chat_id, now):
+        """Момент, когда лимит чата позволит отправить сообщение."""
+        with self.lock:
+            bucket = self.chats.get(chat_id)
+            if bucket is None:
+                if len(self.chats) >= MAX_IDLE_CHAT_BUCKETS:
+                    self._forget_idle(now)
+                bucket = self.chats[chat_id] = TokenBucket(self.chat_rate)
+            return bucket.reserve(max(now, self.paused_until))
+
+    def reserve_global(self, now):
+        """Момент, когда общий лимит бота позволит отправить сообщение.
+
+        Общий токен берётся, только когда лимит чата уже пройден:
+        резерв на будущее занял бы место сообщений в другие чаты.
+        """
+        with self.lock:
+            return self.global_bucket.reserve(max(now, self.paused_until))
+
+    def chat_ready_at(self, chat_id, now):
+        """Момент, когда лимит чата освободится; токен не берётся."""
+        with self.lock:
+            bucket = self.chats.get(chat_id)
+            if bucket is None:
+                return now
+            return max(now, bucket.tat - bucket.tolerance)
+
+    def wait(self, chat_id):
+        """Ждём, пока лимиты чата и бота позволят отправить сообщение."""
+        allowed_at = self.reserve_chat(chat_id, time.monotonic())
+        time.sleep(max(0, allowed_at - time.monotonic()))
+        allowed_at = self.reserve_global(time.monotonic())
+        time.sleep(max(0, allowed_at - time.monotonic()))
+
+    def pause(self, seconds, now):
+        """Telegram ответил RetryAfter: молчим seconds секунд."""
+        with self.lock:
+            self.paused_until = max(self.paused_until, now + seconds)
+
+    def _forget_idle(self, now):
+        """Удаляем корзины чатов, которые уже полностью восстановились."""
+        self.chats = {
+            chat_id: bucket for chat_id, bucket in self.chats.items()
+            if not bucket.idle(now)
+        }
+
+
+class DirectSender:
+    """Отправка прямо из цикла опроса, без очереди и лимитов."""
+
+    def __init__(self, bot):
+        """Оборачиваем бота в интерфейс очереди."""
+        self.bot = bot
+
+    def send(self, chat_id, message, on_delivered=None, key=None):
+        """Отправляем сразу, как homework.send_message_to."""
+        return homework.send_and_confirm(
+            functools.partial(homework.send_message_to, self.bot, chat_id),
+            message,
+            on_delivered,
+        )
+
+    def saturated(self):
+        """Очереди нет, переполняться нечему."""
+        return False
+
+
+class SendQueue:
+    """Очередь сообщений, которую разбирают отдельные потоки.
+
+    send только кладёт сообщение в очередь, поэтому цикл опроса
+    не ждёт Telegram. Сообщение, которому лимит ещё не позволяет уйти,
+    возвращается в очередь с моментом готовности, а не держит поток.
+    В очереди не больше maxsize сообщений, считая отправляемые.
+    Статус уже записан в индекс, когда сообщение попадает в очередь,
+    поэтому временные ошибки повторяются, пока Telegram не примет
+    сообщение; бросается только то, что он не примет никогда.
+    Сообщение, которое заменило более новое о той же работе, помечается
+    отменённым и выбрасывается, когда до него дойдёт очередь.
+    """
+
+    def __init__(self, bot, limiter=None, workers=SEND_WORKERS,
+                 max_backoff=SEND_MAX_BACKOFF, maxsize=SEND_QUEUE_SIZE,
+                 policy=SEND_QUEUE_POLICY, high_water=SEND_QUEUE_HIGH_WATER):
+        """Потоки запускаются методом start."""
+        if policy not in POLICIES:
+            raise ValueError(UNKNOWN_POLICY_MESSAGE.format(policy=policy))
+        self.bot = bot
+        self.limiter = RateLimiter() if limiter is None else limiter
+        self.workers = workers
+        self.max_backoff = max_backoff
+        self.maxsize = maxsize
+        self.policy = policy
+        self.high_water = high_water
+        self.heap = []
+        self.counter = itertools.count()
+        self.numbers = itertools.count()
+        # Номер -> ключ всех принятых и ещё не завершённых сообщений
+        # в порядке поступления; ключ -> номер для схлопывания.
+        self.pending = {}
+        self.keys = {}
+        self.cancelled = set()
+        self.lock = threading.RLock()
+        self.condition = threading.Condition(self.lock)
+        self.space = threading.Condition(self.lock)
+        self.threads = []
+        self.stopped = False
+
+    def __len__(self):
+        """Сколько сообщений ждёт отправки."""
+        with self.lock:
+            return len(self.pending)
+
+    def saturated(self):
+        """Очередь заполнена до high_water: опросу пора притормозить."""
+        with self.lock:
+            return len(self.pending) >= self.maxsize * self.high_water
+
+    def send(self, chat_id, message, on_delivered=None, key=None):
+        """Ставим сообщение в очередь; отправка произойдёт в фоне.
+
+        key — ключ работы и чата: при политике collapse новое сообщение
+        заменяет ещё не отправленное с тем же ключом. Когда места нет,
+        ждём его. Возвращаем False, если очередь остановлена и полна.
+        """
+        with self.lock:
+            if self.policy == COLLAPSE and key in self.keys:
+                self._shed(self.keys[key], COLLAPSE)
+            while len(self.pending) >= self.maxsize and not self.stopped:
+                self.space.wait()
+            if len(self.pending) >= self.maxsize:
+                return False
+            number = next(self.numbers)
+            self.pending[number] = key
+            if key is not None:
+                self.keys[key] = number
+            self._push(time.monotonic(), Outgoing(
+                chat_id, message, 0, CHAT_STAGE, on_delivered, number
+            ))
+        return True
+
+    def start(self):
+        """Запускаем потоки-отправители."""
+        for number in range(self.workers):
+            thread = threading.Thread(
+                target=self._work, name=f"send-{number}", daemon=True
+            )
+            thread.start()
+            self.threads.append(thread)
+        return self
+
+    def stop(self, timeout=None):
+        """Останавливаем потоки; неотправленное остаётся в очереди."""
+        with self.lock:
+            self.stopped = True
+            self.condition.notify_all()
+            self.space.notify_all()
+        for thread in self.threads:
+            thread.join(timeout)
+
+    def _push(self, ready_at, outgoing):
+        """Кладём сообщение в кучу по моменту готовности."""
+        with self.lock:
+            if outgoing.number in self.cancelled:
+                self.cancelled.discard(outgoing.number)
+                return
+            heapq.heappush(
+                self.heap, (ready_at, next(self.counter), outgoing)
+            )
+            self.condition.notify()
+
+    def _pop(self):
+        """Ждём первое сообщение, которому пора уходить."""
+        with self.condition:
+            while not self.stopped:
+                now = time.monotonic()
+                if self.heap and self.heap[0][0] <= now:
+                    outgoing = heapq.heappop(self.heap)[2]
+                    if outgoing.number not in self.cancelled:
+                        return outgoing
+                    self.cancelled.discard(outgoing.number)
+                    continue
+                timeout = self.heap[0][0] - now if self.heap else None
+                self.condition.wait(timeout)
+        return None
+
+    def _shed(self, number, reason):
+        """Вытесняем устаревшее сообщение: оно будет выброшено."""
+        key = self.pending.pop(number)
+        if key is not None and self.keys.get(key) == number:
+            del self.keys[key]
+        self.cancelled.add(number)
+        metrics.SEND_QUEUE_SHED.inc(reason)
+        if len(self.heap) > 2 * self.maxsize:
+            self._compact()
+
+    def _compact(self):
+        """Убираем из кучи заменённые сообщения, не дожидаясь их срока."""
+        removed = {
+            entry[2].number for entry in self.heap
+            if entry[2].number in self.cancelled
+        }
+        self.heap = [
+            entry for entry in self.heap if entry[2].number not in removed
+        ]
+        heapq.heapify(self.heap)
+        self.cancelled -= removed
+
+    def _finish(self, outgoing):
+        """Сообщение доставлено или брошено: освобождаем место."""
+        with self.lock:
+            key = self.pending.pop(outgoing.number, None)
+            if key is not None and self.keys.get(key) == outgoing.number:
+                del self.keys[key]
+            self.cancelled.discard(outgoing.number)
+            self.space.notify()
+
+    def _work(self):
+        """Цикл потока-отправителя."""
+        while True:
+            outgoing = self._pop()
+            if outgoing is None:
+                return
+            now = time.monotonic()
+            if outgoing.stage == CHAT_STAGE:
+                allowed_at = self.limiter.reserve_chat(outgoing.chat_id, now)
+            elif outgoing.stage == GLOBAL_STAGE:
+                allowed_at = self.limiter.reserve_global(now)
+            else:
+                self._deliver(outgoing)
+                continue
+            outgoing = outgoing._replace(stage=outgoing.stage + 1)
+            self._push(allowed_at, outgoing)
+
+    def _deliver(self, outgoing):
+        """Отправляем сообщение и решаем, что делать при ошибке."""
+        try:
+            with metrics.SEND_LATENCY.time():
+                self.bot.send_message(outgoing.chat_id, outgoing.text)
+        except telegram.error.RetryAfter as error:
+            metrics.count_error(error)
+            logger.warning(
+                RETRY_AFTER_MESSAGE, {"seconds": error.retry_after}
+            )
+            self.limiter.pause(error.retry_after, time.monotonic())
+            self._push(
+                time.monotonic(), outgoing._replace(stage=CHAT_STAGE)
+            )
+        except telegram.TelegramError as error:
+            metrics.count_error(error)
+            logger.error(homework.SENDING_ERROR_MESSAGE, {
+                "message": outgoing.text, "error": error
+            })
+            self._retry(outgoing, error)
+        else:
+            logger.debug(
+                homework.SUCCESSFUL_SENDING_MESSAGE, {"message": outgoing.text}
+            )
+            self._finish(outgoing)
+            if outgoing.on_delivered is not None:
+                outgoing.on_delivered()
+
+    def _retry(self, outgoing, error):
+        """Повторяем с растущей паузой, пока ошибка временная.
+
+        Группу, ставшую супергруппой, повторяем сразу по новому id.
+        """
+        if isinstance(error, telegram.error.ChatMigrated):
+            logger.warning(CHAT_MIGRATED_MESSAGE, {
+                "chat_id": outgoing.chat_id,
+                "new_chat_id": error.new_chat_id,
+            })
+            self._push(time.monotonic(), outgoing._replace(
+                chat_id=error.new_chat_id, stage=CHAT_STAGE
+            ))
+            return
+        if isinstance(error, PERMANENT_ERRORS):
+            logger.error(DROP_MESSAGE, {
+                "chat_id": outgoing.chat_id, "error": error
+            })
+            self._finish(outgoing)
+            return
+        attempt = outgoing.attempt + 1
+        self._push(
+            time.monotonic() + min(self.max_backoff, 2 ** attempt),
+            outgoing._replace(attempt=attempt, stage=CHAT_STAGE),
+        )
@@ -0,0 +1,197 @@
+"""Шардирование тенантов между процессами опроса.
+
+Воркеры регистрируются в общей базе SQLite и раз в SHARD_HEARTBEAT
+секунд продлевают свою запись. Тенанты делятся между живыми воркерами
+по кольцу согласованного хеширования, а опрашивать тенанта воркер
+может, только пока держит его аренду в таблице leases. Воркер, не
+продливший запись за SHARD_LEASE_TTL секунд, считается упавшим: его
+тенанты переходят к остальным, как только истекут аренды.
+"""
+import bisect
+import hashlib
+import os
+import socket
+import sqlite3
+import threading
+import time
+
+SHARD_DB = os.getenv("SHARD_DB")
+WORKER_ID = os.getenv("WORKER_ID") or "{host}-{pid}".format(
+    host=socket.gethostname(), pid=os.getpid()
+)
+SHARD_LEASE_TTL = float(os.getenv("SHARD_LEASE_TTL", 30))
+SHARD_HEARTBEAT = float(os.getenv("SHARD_HEARTBEAT", 10))
+# Точек кольца на воркера: чем больше, тем ровнее доли.
+SHARD_REPLICAS = int(os.getenv("SHARD_REPLICAS", 128))
+
+CREATE_TABLES = (
+    "CREATE TABLE IF NOT EXISTS workers ("
+    "worker_id TEXT PRIMARY KEY, expires_at REAL NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS leases ("
+    "tenant_id TEXT PRIMARY KEY, worker_id TEXT NOT NULL, "
+    "expires_at REAL NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS leases_worker ON leases (worker_id)",
+)
+UPSERT_WORKER = (
+    "INSERT INTO workers (worker_id, expires_at) VALUES (?, ?) "
+    "ON CONFLICT(worker_id) DO UPDATE SET expires_at = excluded.expires_at"
+)
+DELETE_EXPIRED_WORKERS = "DELETE FROM workers WHERE expires_at < ?"
+DELETE_WORKER = "DELETE FROM workers WHERE worker_id = ?"
+SELECT_WORKERS = "SELECT worker_id FROM workers"
+RENEW_LEASES = "UPDATE leases SET expires_at = ? WHERE worker_id = ?"
+# Чужую аренду можно забрать, только если она истекла.
+CLAIM_LEASE = (
+    "INSERT INTO leases (tenant_id, worker_id, expires_at) VALUES (?, ?, ?) "
+    "ON CONFLICT(tenant_id) DO UPDATE SET "
+    "worker_id = excluded.worker_id, expires_at = excluded.expires_at "
+    "WHERE leases.worker_id = excluded.worker_id OR leases.expires_at < ?"
+)
+RELEASE_LEASE = "DELETE FROM leases WHERE tenant_id = ? AND worker_id = ?"
+RELEASE_ALL = "DELETE FROM leases WHERE worker_id = ?"
+SELECT_OWNED = (
+    "SELECT tenant_id FROM leases WHERE worker_id = ? AND expires_at >= ?"
+)
+
+
+def ring_hash(key):
+    """Точка ключа на кольце, одинаковая во всех процессах."""
+    digest = hashlib.blake2b(str(key).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
+
+
+class HashRing:
+    """Кольцо согласованного хеширования.
+
+    У воркера replicas точек, тенант принадлежит первой точке по
+    часовой стрелке. Появление или уход воркера переносит только
+    его долю тенантов, остальные остаются на месте.
+    """
+
+    def __init__(self, workers, replicas=SHARD_REPLICAS):
+        """Кольцо из точек всех воркеров."""
+        points = sorted(
+            (ring_hash(f"{worker}#{replica}"), worker)
+            for worker in workers
+            for replica in range(replicas)
+        )
+        self.hashes = [point for point, _ in points]
+        self.workers = [worker for _, worker in points]
+
+    def owner(self, key):
+        """Воркер, которому принадлежит ключ, или None без воркеров."""
+        if not self.workers:
+            return None
+        position = bisect.bisect(self.hashes, ring_hash(key))
+        return self.workers[position % len(self.workers)]
+
+
+class Shard:
+    """Доля тенантов одного воркера.
+
+    refresh продлевает регистрацию воркера и аренды, отпускает тенантов,
+    ушедших к другим воркерам, и забирает свои. Тенант, чья аренда
+    ещё у другого воркера, достанется этому на одном из следующих
+    refresh, поэтому двое одного тенанта не опрашивают.
+    """
+
+    def __init__(
+        self,
+        path,
+        worker_id=WORKER_ID,
+        ttl=SHARD_LEASE_TTL,
+        heartbeat=SHARD_HEARTBEAT,
+        replicas=SHARD_REPLICAS,
+        clock=time.time,
+    ):
+        """Открываем общую базу и создаём таблицы при первом запуске."""
+        self.worker_id = worker_id
+        self.ttl = ttl
+        self.heartbeat = heartbeat
+        self.replicas = replicas
+        self.clock = clock
+        # Асинхронный опрос продлевает аренды в пуле потоков, а закрывает
+        # базу из цикла событий; одновременный доступ исключает lock.
+        self.connection = sqlite3.connect(
+            path, timeout=heartbeat, check_same_thread=False
+        )
+        self.lock = threading.Lock()
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        with self.connection:
+            for statement in CREATE_TABLES:
+                self.connection.execute(statement)
+        self.owned = frozenset()
+        self.workers = ()
+        self.valid_until = 0.0
+        self.refreshed_at = None
+
+    def due(self):
+        """Пора ли снова продлевать аренды."""
+        return (
+            self.refreshed_at is None
+            or self.clock() - self.refreshed_at >= self.heartbeat
+        )
+
+    def owns(self, tenant_id):
+        """Можно ли сейчас опрашивать тенанта.
+
+        Аренда, не продлённая вовремя, например из-за долгой паузы
+        процесса, могла перейти к другому воркеру: по ней не опрашиваем.
+        """
+        return tenant_id in self.owned and self.clock() < self.valid_until
+
+    def refresh(self, tenant_ids):
+        """Пересчитываем долю; возвращаем тенантов, сменивших владельца."""
+        now = self.clock()
+        expires_at = now + self.ttl
+        with self.lock, self.connection:
+            self.connection.execute(DELETE_EXPIRED_WORKERS, (now,))
+            self.connection.execute(
+                UPSERT_WORKER, (self.worker_id, expires_at)
+            )
+            workers = sorted(
+                row[0] for row in self.connection.execute(SELECT_WORKERS)
+            )
+            ring = HashRing(workers, self.replicas)
+            wanted = {
+                tenant_id for tenant_id in tenant_ids
+                if ring.owner(tenant_id) == self.worker_id
+            }
+            self.connection.executemany(RELEASE_LEASE, (
+                (tenant_id, self.worker_id)
+                for tenant_id in self.owned - wanted
+            ))
+            self.connection.execute(
+                RENEW_LEASES, (expires_at, self.worker_id)
+            )
+            self.connection.executemany(CLAIM_LEASE, (
+                (tenant_id, self.worker_id, expires_at, now)
+                for tenant_id in wanted - self.owned
+            ))
+            owned = frozenset(
+                row[0] for row in self.connection.execute(
+                    SELECT_OWNED, (self.worker_id, now)
+                )
+            )
+        moved = owned ^ self.owned
+        self.owned = owned
+        self.workers = tuple(workers)
+        self.valid_until = expires_at
+        self.refreshed_at = now
+        return moved
+
+    def close(self):
+        """Отпускаем все аренды, чтобы их сразу забрали другие воркеры."""
+        with self.lock:
+            with self.connection:
+                self.connection.execute(RELEASE_ALL, (self.worker_id,))
+                self.connection.execute(DELETE_WORKER, (self.worker_id,))
+            self.connection.close()
+        self.owned = frozenset()
+
+
+def open_shard(path=SHARD_DB):
+    """Доля воркера, если задана общая база, иначе None."""
+    if path:
+        return Shard(path)
+    return None
@@ -0,0 +1,149 @@
+"""Один запрос к API на всех тенантов с общим токеном.
+
+Несколько чатов могут следить за одним аккаунтом Практикума. Их опросы
+с одинаковыми токеном и from_date объединяются: пока запрос идёт,
+остальные ждут его результата, а успешный результат ещё
+SINGLE_FLIGHT_WINDOW секунд отдаётся без нового запроса.
+"""
+import asyncio
+import collections
+import os
+import threading
+import time
+
+import metrics
+import response_cache
+
+SINGLE_FLIGHT_WINDOW = float(os.getenv("SINGLE_FLIGHT_WINDOW", 5))
+
+
+def shared_keys(registry):
+    """Ключи токенов, которые указаны у нескольких тенантов."""
+    counts = collections.Counter(
+        response_cache.cache_key(tenant.headers) for tenant in registry
+    )
+    return {key for key, count in counts.items() if count > 1}
+
+
+def phase_key(tenant, shared):
+    """По чему считать момент опроса тенанта внутри периода.
+
+    Тенанты с общим токеном опрашиваются в один момент, чтобы их
+    запросы объединялись; остальные — каждый в свой.
+    """
+    key = response_cache.cache_key(tenant.headers)
+    return key if key in shared else tenant.tenant_id
+
+
+class Flight:
+    """Идущий вызов, результата которого ждут другие потоки."""
+
+    __slots__ = ("done", "value", "error")
+
+    def __init__(self):
+        """Вызов ещё не закончен."""
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+    def wait(self):
+        """Результат вызова или его исключение."""
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+
+class SingleFlight:
+    """Общий результат одинаковых вызовов.
+
+    do — для потоков, do_async — для корутин одного цикла событий.
+    Ошибку получают все, кто ждал вызова, но в окне она не хранится:
+    следующий вызов пойдёт в API заново.
+    """
+
+    def __init__(self, window=SINGLE_FLIGHT_WINDOW, clock=time.monotonic):
+        """Окно в секундах; clock — монотонные часы."""
+        self.window = window
+        self.clock = clock
+        self.results = {}
+        self.flights = {}
+        self.lock = threading.Lock()
+        self.purge_at = 0.0
+
+    def _cached(self, key):
+        """Кортеж из результата в окне или None; вызывать под lock."""
+        now = self.clock()
+        if now >= self.purge_at:
+            self.results = {
+                known: entry for known, entry in self.results.items()
+                if entry[0] > now
+            }
+            self.purge_at = now + self.window
+        entry = self.results.get(key)
+        if entry is None or entry[0] <= now:
+            return None
+        metrics.SINGLE_FLIGHT_SHARED.inc()
+        return (entry[1],)
+
+    def _remember(self, key, value):
+        """Запоминаем успешный результат на окно; вызывать под lock."""
+        if self.window > 0:
+            self.results[key] = (self.clock() + self.window, value)
+
+    def do(self, key, func, *args, **kwargs):
+        """Результат func(*args, **kwargs), общий для ключа key."""
+        with self.lock:
+            hit = self._cached(key)
+            if hit is not None:
+                return hit[0]
+            flight = self.flights.get(key)
+            if flight is None:
+                flight = self.flights[key] = Flight()
+                leader = True
+            else:
+                leader = False
+        if not leader:
+            metrics.SINGLE_FLIGHT_SHARED.inc()
+            return flight.wait()
+        try:
+            flight.value = func(*args, **kwargs)
+        except BaseException as error:
+            # Ждущие получат то же исключение, что и первый вызов.
+            flight.error = error
+            raise
+        finally:
+            with self.lock:
+                del self.flights[key]
+                if flight.error is None:
+                    self._remember(key, flight.value)
+            flight.done.set()
+        return flight.value
+
+    async def do_async(self, key, func, *args, **kwargs):
+        """Асинхронный аналог do: func — корутинная функция."""
+        hit = self._cached(key)
+        if hit is not None:
+            return hit[0]
+        future = self.flights.get(key)
+        if future is not None:
+            metrics.SINGLE_FLIGHT_SHARED.inc()
+            return await asyncio.shield(future)
+        future = self.flights[key] = (
+            asyncio.get_running_loop().create_future()
+        )
+        try:
+            value = await func(*args, **kwargs)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as error:
+            future.set_exception(error)
+            # Ждущих может не быть: помечаем ошибку полученной.
+            future.exception()
+            raise
+        finally:
+            del self.flights[key]
+        self._remember(key, value)
+        future.set_result(value)
+        return value
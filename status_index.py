@@ -0,0 +1,178 @@
+"""Индекс последних известных статусов домашних работ."""
+from array import array
+
+REVIEWING = "reviewing"
+APPROVED = "approved"
+REJECTED = "rejected"
+# Статусы работ из API Практикума: из них собраны ключи
+# homework.HOMEWORK_VERDICTS и фильтры подписок.
+HOMEWORK_STATUSES = (REVIEWING, APPROVED, REJECTED)
+# Статусы хранятся однобайтовыми кодами. Известные заранее —
+# HOMEWORK_STATUSES, остальные получают код при первой встрече.
+STATUSES = list(HOMEWORK_STATUSES)
+STATUS_CODES = {status: code for code, status in enumerate(STATUSES)}
+MAX_STATUS_CODES = 256
+# Пока работ у тенанта не больше стольких и их id — целые числа,
+# они лежат в массиве и ищутся перебором; дальше — в словаре.
+ARRAY_LIMIT = 32
+
+TOO_MANY_STATUSES_MESSAGE = "Слишком много разных статусов: {status}"
+
+
+def homework_key(homework):
+    """Ключ работы: id, а если его нет — название."""
+    return homework.get("id", homework.get("homework_name"))
+
+
+def status_code(status):
+    """Код статуса; новый статус получает следующий свободный код."""
+    code = STATUS_CODES.get(status)
+    if code is None:
+        if len(STATUSES) >= MAX_STATUS_CODES:
+            raise ValueError(TOO_MANY_STATUSES_MESSAGE.format(status=status))
+        code = STATUS_CODES[status] = len(STATUSES)
+        STATUSES.append(status)
+    return code
+
+
+def status_name(code):
+    """Статус по его коду."""
+    return STATUSES[code]
+
+
+class TenantState:
+    """Статусы работ одного тенанта в компактном виде.
+
+    Коды статусов лежат в bytearray, целые id работ — в array('q'):
+    на работу уходит девять байт вместо записи словаря и объекта int.
+    Нецелый ключ или много работ переводят поиск на словарь позиций.
+    """
+
+    __slots__ = ("reviewing", "keys", "codes", "positions")
+
+    def __init__(self):
+        """Работ пока нет."""
+        self.reviewing = 0
+        self.keys = array("q")
+        self.codes = bytearray()
+        self.positions = None
+
+    def __len__(self):
+        """Число работ."""
+        return len(self.codes)
+
+    def find(self, key):
+        """Позиция работы или None."""
+        if self.positions is not None:
+            return self.positions.get(key)
+        if type(key) is not int:
+            return None
+        try:
+            return self.keys.index(key)
+        except ValueError:
+            return None
+
+    def get(self, key):
+        """Код статуса работы или None."""
+        position = self.find(key)
+        return None if position is None else self.codes[position]
+
+    def put(self, key, code):
+        """Запоминаем код статуса работы и возвращаем прежний или None."""
+        position = self.find(key)
+        if position is not None:
+            previous = self.codes[position]
+            self.codes[position] = code
+            return previous
+        if self.positions is None and (
+            type(key) is not int or len(self.codes) >= ARRAY_LIMIT
+        ):
+            self.positions = {
+                known: number for number, known in enumerate(self.keys)
+            }
+            self.keys = None
+        if self.positions is None:
+            self.keys.append(key)
+        else:
+            self.positions[key] = len(self.codes)
+        self.codes.append(code)
+        return None
+
+
+class StatusIndex:
+    """Последние отправленные статусы работ всех тенантов.
+
+    На тенанта — одна запись TenantState, поэтому индекс держит
+    сотни тысяч тенантов без словаря на каждую работу. Со store
+    (cursor_store) статусы переживают перезапуск: при первом обращении
+    к тенанту индекс читает их из store, а новые записывает туда же.
+    Иначе после отката метки на CURSOR_OVERLAP статусы из этого
+    интервала ушли бы повторно.
+    """
+
+    def __init__(self, store=None):
+        """Пустой индекс: любая работа считается изменившейся."""
+        self.tenants = {}
+        self.store = store
+        # Тенанты, чьи статусы уже прочитаны из store.
+        self.loaded = set()
+
+    def __len__(self):
+        """Число работ в индексе."""
+        return sum(len(state) for state in self.tenants.values())
+
+    def diff(self, homeworks, scope=None):
+        """Работы, чей статус отличается от последнего известного.
+
+        Работает как генератор, поэтому годится и для потока работ.
+        """
+        state = self._state(scope)
+        for homework in homeworks:
+            known = None if state is None else state.get(
+                homework_key(homework)
+            )
+            if known is None or known != STATUS_CODES.get(
+                homework.get("status")
+            ):
+                yield homework
+
+    def commit(self, homework, scope=None):
+        """Запоминаем статус работы после успешной отправки."""
+        self._state(scope)
+        key = homework_key(homework)
+        status = homework.get("status")
+        if self._put(scope, key, status) and self.store is not None:
+            self.store.save_status(scope, key, status)
+
+    def forget(self, scopes):
+        """Забываем статусы тенантов: их перечитаем из store.
+
+        Так воркер отдаёт тенантов, ушедших к другому воркеру.
+        """
+        for scope in scopes:
+            self.tenants.pop(scope, None)
+            self.loaded.discard(scope)
+
+    def _state(self, scope):
+        """Статусы тенанта, при первом обращении — из store."""
+        if self.store is not None and scope not in self.loaded:
+            self.loaded.add(scope)
+            for key, status in self.store.load_statuses(scope):
+                self._put(scope, key, status)
+        return self.tenants.get(scope)
+
+    def _put(self, scope, key, status):
+        """Запоминаем статус работы; True, если он изменился."""
+        state = self.tenants.get(scope)
+        if state is None:
+            state = self.tenants[scope] = TenantState()
+        code = status_code(status)
+        previous = state.put(key, code)
+        reviewing = STATUS_CODES[REVIEWING]
+        state.reviewing += (code == reviewing) - (previous == reviewing)
+        return previous != code
+
+    def in_review(self, scope=None):
+        """Есть ли у тенанта работа, взятая на ревью."""
+        state = self.tenants.get(scope)
+        return state is not None and state.reviewing > 0
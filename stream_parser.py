@@ -0,0 +1,244 @@
+"""Потоковый разбор ответа API: работы по одной, без всего ответа в памяти."""
+import codecs
+import json
+import os
+
+# Ответ длиннее этого числа байт (или без Content-Length) разбирается
+# потоком; короткий — целиком, как раньше.
+STREAM_MIN_BYTES = int(os.getenv("STREAM_MIN_BYTES", 256 * 1024))
+STREAM_CHUNK_SIZE = int(os.getenv("STREAM_CHUNK_SIZE", 64 * 1024))
+
+NOT_AN_OBJECT_MESSAGE = "В ответе API вместо словаря получен {type}"
+NOT_A_LIST_MESSAGE = 'Значение по ключу "homeworks" не список, а {type}'
+NO_HOMEWORKS_MESSAGE = 'Нет ключа "homeworks"'
+MALFORMED_MESSAGE = "Ответ API оборван или не является JSON: {position}"
+
+WHITESPACE = " \t\n\r"
+# Символы, которыми может продолжаться число JSON.
+NUMBER_CHARS = "0123456789.eE+-"
+# Состояния разбора верхнего уровня ответа.
+(
+    START, KEY, COLON, VALUE, AFTER_VALUE, ITEM, AFTER_ITEM, DONE
+) = range(8)
+JSON_TYPES = {"{": dict, "[": list, '"': str}
+
+
+def is_large(headers):
+    """Ответ стоит разбирать потоком: он длинный или длина неизвестна."""
+    length = headers.get("Content-Length")
+    return length is None or int(length) >= STREAM_MIN_BYTES
+
+
+class HomeworkDecoder:
+    """Разбор ответа {"homeworks": [...], ...} по мере прихода байтов.
+
+    feed возвращает работы, которые уже пришли целиком, остальные поля
+    верхнего уровня собираются в fields. В памяти держится только
+    неразобранный хвост, то есть не больше одной работы и одного куска.
+    """
+
+    def __init__(self):
+        """Разбор ещё не начат."""
+        self.text = codecs.getincrementaldecoder("utf-8")()
+        self.json = json.JSONDecoder()
+        self.buffer = ""
+        self.position = 0
+        self.state = START
+        self.key = None
+        self.fields = {}
+        self.count = 0
+        self.steps = {
+            START: self._start,
+            KEY: self._key,
+            COLON: self._colon,
+            VALUE: self._field,
+            AFTER_VALUE: self._after_field,
+            ITEM: self._item,
+            AFTER_ITEM: self._after_item,
+        }
+
+    def feed(self, data):
+        """Добавляем байты и возвращаем список новых работ."""
+        self.buffer = self.buffer[self.position:] + self.text.decode(data)
+        self.position = 0
+        return self._parse(final=False)
+
+    def close(self):
+        """Разбираем остаток и проверяем, что ответ закончился."""
+        items = self.feed(b"")
+        self.buffer += self.text.decode(b"", final=True)
+        items.extend(self._parse(final=True))
+        if self.state != DONE or self._skip_whitespace() < len(self.buffer):
+            raise ValueError(MALFORMED_MESSAGE.format(position=self.position))
+        if "homeworks" not in self.fields:
+            raise KeyError(NO_HOMEWORKS_MESSAGE)
+        return items
+
+    def _skip_whitespace(self):
+        """Пропускаем пробелы и возвращаем позицию."""
+        while (
+            self.position < len(self.buffer)
+            and self.buffer[self.position] in WHITESPACE
+        ):
+            self.position += 1
+        return self.position
+
+    def _value(self, final):
+        """Очередное значение JSON или None, если оно ещё не пришло.
+
+        Число, оборванное границей куска, тоже разбирается: «1500.»
+        даёт 1500. Поэтому значение принимается, только если за ним
+        идёт символ, которым число продолжиться не может.
+        """
+        try:
+            value, end = self.json.raw_decode(self.buffer, self.position)
+        except json.JSONDecodeError:
+            if final:
+                raise ValueError(
+                    MALFORMED_MESSAGE.format(position=self.position)
+                )
+            return None
+        if not final and (
+            end == len(self.buffer) or self.buffer[end] in NUMBER_CHARS
+        ):
+            return None
+        self.position = end
+        return (value,)
+
+    def _parse(self, final):
+        """Разбираем буфер, пока хватает данных."""
+        items = []
+        while (
+            self.state != DONE
+            and self._skip_whitespace() < len(self.buffer)
+        ):
+            step = self.steps[self.state]
+            if not step(self.buffer[self.position], final, items):
+                break
+        return items
+
+    def _start(self, char, final, items):
+        """Ответ должен быть объектом."""
+        if char != "{":
+            raise TypeError(NOT_AN_OBJECT_MESSAGE.format(
+                type=JSON_TYPES.get(char, "значение")
+            ))
+        self.position += 1
+        self.state = KEY
+        return True
+
+    def _key(self, char, final, items):
+        """Ключ верхнего уровня или конец объекта."""
+        if char == "}":
+            return self._end_object(char, final, items)
+        key = self._value(final)
+        if key is None:
+            return False
+        self.key = key[0]
+        self.state = COLON
+        return True
+
+    def _colon(self, char, final, items):
+        """Двоеточие после ключа."""
+        self._expect(":")
+        self.state = VALUE
+        return True
+
+    def _field(self, char, final, items):
+        """Значение ключа; массив homeworks не читается целиком."""
+        if self.key != "homeworks":
+            value = self._value(final)
+            if value is None:
+                return False
+            self.fields[self.key] = value[0]
+            self.state = AFTER_VALUE
+            return True
+        if char != "[":
+            raise TypeError(NOT_A_LIST_MESSAGE.format(
+                type=JSON_TYPES.get(char, "значение")
+            ))
+        self.position += 1
+        self.fields["homeworks"] = None
+        self.state = ITEM
+        return True
+
+    def _after_field(self, char, final, items):
+        """Запятая перед следующим ключом или конец объекта."""
+        if char == "}":
+            return self._end_object(char, final, items)
+        self._expect(",")
+        self.state = KEY
+        return True
+
+    def _end_object(self, char, final, items):
+        """Конец ответа."""
+        self.position += 1
+        self.state = DONE
+        return True
+
+    def _item(self, char, final, items):
+        """Очередная работа или конец массива."""
+        if char == "]":
+            return self._end_array(char, final, items)
+        item = self._value(final)
+        if item is None:
+            return False
+        items.append(item[0])
+        self.count += 1
+        self.state = AFTER_ITEM
+        return True
+
+    def _after_item(self, char, final, items):
+        """Запятая перед следующей работой или конец массива."""
+        if char == "]":
+            return self._end_array(char, final, items)
+        self._expect(",")
+        self.state = ITEM
+        return True
+
+    def _end_array(self, char, final, items):
+        """Массив работ закончился."""
+        self.position += 1
+        self.state = AFTER_VALUE
+        return True
+
+    def _expect(self, char):
+        """Следующий символ должен быть char."""
+        if self.buffer[self.position] != char:
+            raise ValueError(MALFORMED_MESSAGE.format(position=self.position))
+        self.position += 1
+
+
+class HomeworkStream:
+    """Работы ответа по мере чтения из итератора кусков байтов.
+
+    Проходится один раз. Ведёт себя как список работ для
+    send_new_statuses, а после прохода — как ответ: get отдаёт
+    поля верхнего уровня, а len — число работ.
+    """
+
+    def __init__(self, chunks, close=None):
+        """Итератор байтов chunks; close зовётся после чтения."""
+        self.chunks = chunks
+        self.on_close = close
+        self.decoder = HomeworkDecoder()
+
+    def __iter__(self):
+        """Работы по одной."""
+        try:
+            for chunk in self.chunks:
+                yield from self.decoder.feed(chunk)
+            yield from self.decoder.close()
+        finally:
+            if self.on_close is not None:
+                self.on_close()
+
+    def __len__(self):
+        """Сколько работ уже прочитано."""
+        return self.decoder.count
+
+    def get(self, key, default=None):
+        """Поле верхнего уровня, прочитанное к этому моменту."""
+        if key == "homeworks":
+            return default
+        return self.decoder.fields.get(key, default)
@@ -0,0 +1,97 @@
+"""Логирование через очередь: цикл опроса не ждёт вывода логов."""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import re
+import sys
+
+# json — запись в строку JSON, text — прежний человекочитаемый формат.
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+# Токен не должен попасть в лог, даже если оказался в тексте ошибки.
+OAUTH_TOKEN = re.compile(r"(OAuth\s+)[^\s'\",}]+")
+TOKEN_MASK = r"\1***"
+
+
+def redact(text):
+    """Текст с замаскированными OAuth-токенами."""
+    return OAUTH_TOKEN.sub(TOKEN_MASK, text)
+
+
+class RedactingFormatter(logging.Formatter):
+    """Текстовый формат с маскировкой токенов."""
+
+    def format(self, record):
+        """Форматируем запись и маскируем токены."""
+        return redact(super().format(record))
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна запись — одна строка JSON.
+
+    Именованные аргументы сообщения (logger.info(MESSAGE, {...}))
+    попадают в запись отдельными полями.
+    """
+
+    def format(self, record):
+        """Запись в виде строки JSON."""
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if isinstance(record.args, dict):
+            for key, value in record.args.items():
+                entry.setdefault(key, str(value))
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return redact(json.dumps(entry, ensure_ascii=False))
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """Кладёт в очередь саму запись, не форматируя её.
+
+    Очередь живёт внутри процесса, поэтому запись не нужно готовить
+    к сериализации: сообщение соберёт поток QueueListener.
+    """
+
+    def prepare(self, record):
+        """Запись уходит в очередь как есть."""
+        return record
+
+
+class Listener(logging.handlers.QueueListener):
+    """QueueListener, который можно остановить повторно."""
+
+    def stop(self):
+        """Дописываем очередь и останавливаем поток, если он ещё жив."""
+        if self._thread is not None:
+            super().stop()
+
+
+def make_formatter(log_format=LOG_FORMAT):
+    """Форматтер для LOG_FORMAT."""
+    if log_format == "text":
+        return RedactingFormatter(TEXT_FORMAT)
+    return JsonFormatter()
+
+
+def setup(logger, stream=sys.stdout, log_format=LOG_FORMAT):
+    """Подключаем к logger очередь и поток, который пишет в stream.
+
+    Возвращаем запущенный QueueListener; при выходе он дописывает
+    оставшиеся записи.
+    """
+    records = queue.SimpleQueue()
+    output = logging.StreamHandler(stream=stream)
+    output.setFormatter(make_formatter(log_format))
+    logger.addHandler(LazyQueueHandler(records))
+    listener = Listener(records, output, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
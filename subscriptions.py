@@ -0,0 +1,180 @@
+"""Подписки: один аккаунт Практикума — несколько чатов с фильтрами.
+
+Сообщение о смене статуса собирается parse_status один раз и уходит
+в каждый чат, фильтр которого пропускает этот статус. Отправляют его
+те же отправители, что и обычные сообщения.
+"""
+import os
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import exceptions
+import status_index
+
+# Формат: чаты через запятую, у чата после двоеточия — статусы через |.
+# Например, «111,222:approved|rejected»: в 222 придут только итоги.
+SUBSCRIPTIONS = os.getenv("TELEGRAM_SUBSCRIPTIONS")
+# Сколько чатов одной рассылки получают сообщение одновременно.
+SUBSCRIPTION_WORKERS = int(os.getenv("SUBSCRIPTION_WORKERS", 8))
+CHAT_SEPARATOR = ","
+FILTER_SEPARATOR = ":"
+STATUS_SEPARATOR = "|"
+KNOWN_STATUSES = frozenset(status_index.HOMEWORK_STATUSES)
+
+EMPTY_CHAT_MESSAGE = "В подписке «{subscription}» не указан чат"
+UNKNOWN_STATUS_MESSAGE = "Неизвестный статус {status} в подписке чата {chat}"
+DUPLICATE_CHAT_MESSAGE = "Чат {chat} подписан дважды"
+NOT_LIST_MESSAGE = "Подписки должны быть списком, а не {type}"
+NOT_OBJECT_MESSAGE = "Подписка должна быть объектом, а не {record!r}"
+
+
+class Subscription(namedtuple("Subscription", ("chat_id", "statuses"))):
+    """Чат и статусы, о которых ему писать; пустой набор — обо всех."""
+
+    __slots__ = ()
+
+    def accepts(self, status):
+        """Пропускает ли фильтр чата этот статус."""
+        return not self.statuses or status in self.statuses
+
+
+def subscription(chat_id, statuses=()):
+    """Проверенная подписка чата chat_id."""
+    chat = str(chat_id).strip()
+    if not chat:
+        raise exceptions.SubscriptionError(
+            EMPTY_CHAT_MESSAGE.format(subscription=chat_id)
+        )
+    statuses = frozenset(str(status).strip() for status in statuses)
+    unknown = statuses - KNOWN_STATUSES
+    if unknown:
+        raise exceptions.SubscriptionError(UNKNOWN_STATUS_MESSAGE.format(
+            status=", ".join(sorted(unknown)), chat=chat
+        ))
+    return Subscription(chat, statuses)
+
+
+def _unique(subscriptions):
+    """Кортеж подписок; один чат не может быть подписан дважды."""
+    seen = set()
+    for route in subscriptions:
+        if route.chat_id in seen:
+            raise exceptions.SubscriptionError(
+                DUPLICATE_CHAT_MESSAGE.format(chat=route.chat_id)
+            )
+        seen.add(route.chat_id)
+    return tuple(subscriptions)
+
+
+def parse_subscriptions(text):
+    """Подписки из строки формата TELEGRAM_SUBSCRIPTIONS."""
+    routes = []
+    for item in text.split(CHAT_SEPARATOR):
+        chat, _, statuses = item.partition(FILTER_SEPARATOR)
+        routes.append(subscription(
+            chat, statuses.split(STATUS_SEPARATOR) if statuses else ()
+        ))
+    return _unique(routes)
+
+
+def from_records(records):
+    """Подписки из списка объектов с полями chat_id и statuses."""
+    if not isinstance(records, (list, tuple)):
+        raise exceptions.SubscriptionError(
+            NOT_LIST_MESSAGE.format(type=type(records))
+        )
+    routes = []
+    for record in records:
+        if not isinstance(record, dict):
+            raise exceptions.SubscriptionError(
+                NOT_OBJECT_MESSAGE.format(record=record)
+            )
+        routes.append(subscription(
+            record.get("chat_id", ""), record.get("statuses", ())
+        ))
+    return _unique(routes)
+
+
+def recipients(subscriptions, status):
+    """Чаты, которым нужно написать о статусе status."""
+    return [
+        route.chat_id for route in subscriptions if route.accepts(status)
+    ]
+
+
+class Countdown:
+    """Зовёт callback, когда его самого вызвали count раз."""
+
+    __slots__ = ("remaining", "callback", "lock")
+
+    def __init__(self, count, callback):
+        """Ждём count вызовов."""
+        self.remaining = count
+        self.callback = callback
+        self.lock = threading.Lock()
+
+    def __call__(self):
+        """Ещё один чат получил сообщение."""
+        with self.lock:
+            self.remaining -= 1
+            last = self.remaining == 0
+        if last:
+            self.callback()
+
+
+class Broadcaster:
+    """Рассылка одного сообщения по подпискам аккаунта.
+
+    send подходит для homework.send_new_statuses с routed=True.
+    С workers > 1 чаты получают сообщение параллельно: это нужно, когда
+    отправитель ждёт ответа Telegram. Если часть чатов сообщение
+    не получила, повтор уйдёт только им — пока о работе не придёт
+    другое сообщение. on_delivered вызывается, когда сообщение приняли
+    все чаты этой попытки.
+    """
+
+    def __init__(self, sender, subscriptions, workers=0):
+        """Отправитель sender — с интерфейсом send_queue.SendQueue."""
+        self.sender = sender
+        self.subscriptions = subscriptions
+        self.executor = (
+            ThreadPoolExecutor(workers, thread_name_prefix="broadcast")
+            if workers > 1 else None
+        )
+        # Ключ работы -> (сообщение, чаты, которые его ещё не получили).
+        self.pending = {}
+
+    def send(self, message, on_delivered=None, key=None, status=None):
+        """Отправляем message подписанным на status; True, если всем."""
+        retry = self.pending.pop(key, None)
+        if retry is not None and retry[0] == message:
+            chats = retry[1]
+        else:
+            chats = recipients(self.subscriptions, status)
+        if not chats:
+            return True
+        if on_delivered is not None and len(chats) > 1:
+            on_delivered = Countdown(len(chats), on_delivered)
+
+        def send_to(chat_id):
+            return self.sender.send(
+                chat_id, message, on_delivered,
+                key=None if key is None else (chat_id, key),
+            )
+
+        if self.executor is None or len(chats) == 1:
+            results = [send_to(chat_id) for chat_id in chats]
+        else:
+            results = list(self.executor.map(send_to, chats))
+        failed = [chat for chat, sent in zip(chats, results) if not sent]
+        if failed and key is not None:
+            self.pending[key] = (message, failed)
+        return not failed
+
+
+def open_broadcaster(sender, text=SUBSCRIPTIONS, workers=SUBSCRIPTION_WORKERS):
+    """Рассылка по TELEGRAM_SUBSCRIPTIONS, если он задан, иначе None."""
+    if text:
+        return Broadcaster(sender, parse_subscriptions(text), workers)
+    return None
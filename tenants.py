@@ -0,0 +1,97 @@
+"""Реестр тенантов: токены Практикума и чаты в Телеграме."""
+import json
+import os
+import sqlite3
+from collections import namedtuple
+
+import exceptions
+import subscriptions
+
+SQLITE_SUFFIXES = (".db", ".sqlite", ".sqlite3")
+TENANT_FIELDS = ("tenant_id", "practicum_token", "chat_id")
+SELECT_TENANTS = "SELECT tenant_id, practicum_token, chat_id FROM tenants"
+
+FILE_NOT_FOUND_MESSAGE = "Файл с тенантами {path} не найден"
+BAD_FILE_MESSAGE = "Не удалось прочитать тенантов из {path}: {error}"
+NOT_LIST_MESSAGE = "В файле {path} ожидается список тенантов, а не {type}"
+MISSING_FIELD_MESSAGE = "У тенанта {tenant} нет поля {field}"
+DUPLICATE_TENANT_MESSAGE = "Тенант {tenant_id} указан дважды"
+
+
+class Tenant(namedtuple(
+    "Tenant", TENANT_FIELDS + ("subscriptions",), defaults=((),)
+)):
+    """Пользователь бота: токен Практикума и чат для уведомлений.
+
+    subscriptions — необязательные подписки других чатов с фильтрами;
+    если они заданы, пишем только по ним.
+    """
+
+    __slots__ = ()
+
+    @property
+    def routes(self):
+        """Подписки тенанта; без них — все статусы в chat_id."""
+        return self.subscriptions or (
+            subscriptions.Subscription(self.chat_id, frozenset()),
+        )
+
+    @property
+    def headers(self):
+        """Заголовки запроса к API от имени тенанта."""
+        return {"Authorization": f"OAuth {self.practicum_token}"}
+
+
+def _from_json(path):
+    """Читаем тенантов из JSON-файла со списком объектов."""
+    with open(path, encoding="utf-8") as file:
+        records = json.load(file)
+    if not isinstance(records, list):
+        raise exceptions.TenantRegistryError(
+            NOT_LIST_MESSAGE.format(path=path, type=type(records))
+        )
+    tenants = []
+    for record in records:
+        for field in TENANT_FIELDS:
+            if field not in record:
+                raise exceptions.TenantRegistryError(
+                    MISSING_FIELD_MESSAGE.format(tenant=record, field=field)
+                )
+        tenants.append(Tenant(
+            *(str(record[f]) for f in TENANT_FIELDS),
+            subscriptions.from_records(record.get("subscriptions", ())),
+        ))
+    return tenants
+
+
+def _from_sqlite(path):
+    """Читаем тенантов из таблицы tenants базы SQLite."""
+    connection = sqlite3.connect(path)
+    try:
+        rows = connection.execute(SELECT_TENANTS).fetchall()
+    finally:
+        connection.close()
+    return [Tenant(*(str(value) for value in row)) for row in rows]
+
+
+def load_tenants(path):
+    """Загружаем реестр тенантов из JSON-файла или базы SQLite."""
+    if not os.path.isfile(path):
+        raise exceptions.TenantRegistryError(
+            FILE_NOT_FOUND_MESSAGE.format(path=path)
+        )
+    loader = _from_sqlite if path.endswith(SQLITE_SUFFIXES) else _from_json
+    try:
+        tenants = loader(path)
+    except (OSError, ValueError, TypeError, sqlite3.Error) as error:
+        raise exceptions.TenantRegistryError(
+            BAD_FILE_MESSAGE.format(path=path, error=error)
+        )
+    seen = set()
+    for tenant in tenants:
+        if tenant.tenant_id in seen:
+            raise exceptions.TenantRegistryError(
+                DUPLICATE_TENANT_MESSAGE.format(tenant_id=tenant.tenant_id)
+            )
+        seen.add(tenant.tenant_id)
+    return tenants
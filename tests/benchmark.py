@@ -0,0 +1,139 @@
+"""Замеры скорости и памяти для tests/test_benchmarks.py."""
+import gc
+import json
+import os
+import time
+import tracemalloc
+
+BASELINE_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    'fixtures',
+    'benchmark_baseline.json',
+)
+# Сколько секунд крутить каждый замер и сколько раундов брать лучший.
+BENCHMARK_MIN_TIME = float(os.getenv('BENCHMARK_MIN_TIME', 0.2))
+BENCHMARK_ROUNDS = int(os.getenv('BENCHMARK_ROUNDS', 3))
+# Допустимая просадка относительно базовой линии: 0.5 — вдвое медленнее.
+BENCHMARK_TOLERANCE = float(os.getenv('BENCHMARK_TOLERANCE', 0.5))
+# Малые выделения памяти колеблются на десятки байт: их не считаем.
+BENCHMARK_BYTES_SLACK = 1024
+# BENCHMARK_UPDATE=1 перезаписывает базовую линию текущими замерами.
+BENCHMARK_UPDATE = os.getenv('BENCHMARK_UPDATE') == '1'
+
+
+def ops_per_second(func, min_time=BENCHMARK_MIN_TIME,
+                   rounds=BENCHMARK_ROUNDS):
+    """Лучшая из rounds скорость вызовов func в секунду."""
+    func()
+    best = 0.0
+    for _ in range(rounds):
+        calls = 0
+        gc.disable()
+        started = time.perf_counter()
+        try:
+            while True:
+                func()
+                calls += 1
+                elapsed = time.perf_counter() - started
+                if elapsed >= min_time:
+                    break
+        finally:
+            gc.enable()
+        best = max(best, calls / elapsed)
+    return best
+
+
+def allocated_bytes(func):
+    """Пик памяти, выделенной за один вызов func."""
+    func()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def retained_bytes(build):
+    """Память, которую держит результат build после его создания."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = build()
+        gc.collect()
+        return tracemalloc.get_traced_memory()[0], result
+    finally:
+        tracemalloc.stop()
+
+
+def calibration():
+    """Эталонная нагрузка: словари и форматирование строк, как в боте."""
+    items = [
+        {'homework_name': f'hw{number}', 'status': 'approved'}
+        for number in range(200)
+    ]
+    return [
+        'Работа "{}" {}'.format(item['homework_name'], item['status'])
+        for item in items
+    ]
+
+
+def measure(func):
+    """Скорость относительно эталона и пик памяти за вызов.
+
+    Скорость делится на скорость эталонной нагрузки на той же машине,
+    поэтому базовая линия не зависит от железа.
+    """
+    before = ops_per_second(calibration)
+    speed = ops_per_second(func)
+    # Эталон меряем до и после: так случайная нагрузка на машину
+    # скорее занизит обе скорости, чем одну.
+    reference = (before + ops_per_second(calibration)) / 2
+    return {
+        'score': speed / reference,
+        'bytes': allocated_bytes(func),
+    }
+
+
+def load_baseline(path=BASELINE_PATH):
+    """Сохранённые замеры или пустой словарь."""
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as file:
+        return json.load(file)
+
+
+def save_baseline(name, result, path=BASELINE_PATH):
+    """Записываем замер name в базовую линию."""
+    baseline = load_baseline(path)
+    baseline[name] = {'bytes': result['bytes']}
+    if 'score' in result:
+        baseline[name]['score'] = round(result['score'], 4)
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(baseline, file, indent=2, sort_keys=True)
+        file.write('\n')
+
+
+def regressions(result, expected, tolerance=BENCHMARK_TOLERANCE,
+                slack=BENCHMARK_BYTES_SLACK):
+    """Список нарушений базовой линии для сообщения теста."""
+    problems = []
+    if 'score' in expected and (
+        result['score'] < expected['score'] * (1 - tolerance)
+    ):
+        problems.append(
+            'скорость {:.4f} против {:.4f} в базовой линии'.format(
+                result['score'], expected['score']
+            )
+        )
+    allowed_bytes = (
+        expected['bytes'] * (1 + tolerance) + slack
+    )
+    if result['bytes'] > allowed_bytes:
+        problems.append(
+            'память {} байт против {} в базовой линии'.format(
+                result['bytes'], expected['bytes']
+            )
+        )
+    return problems
@@ -23,6 +23,144 @@ def homework_module():
     return homework
 
 
+@pytest.fixture
+def api_session_module():
+    import api_session
+    return api_session
+
+
+@pytest.fixture
+def async_poller_module():
+    import async_poller
+    return async_poller
+
+
+@pytest.fixture
+def board_module():
+    import board
+    return board
+
+
+@pytest.fixture
+def circuit_breaker_module():
+    import circuit_breaker
+    return circuit_breaker
+
+
+@pytest.fixture
+def cursor_store_module():
+    import cursor_store
+    return cursor_store
+
+
+@pytest.fixture
+def delivery_lag_module():
+    import delivery_lag
+    return delivery_lag
+
+
+@pytest.fixture
+def error_notifier_module():
+    import error_notifier
+    return error_notifier
+
+
+@pytest.fixture
+def fake_services_module():
+    import fake_services
+    return fake_services
+
+
+@pytest.fixture
+def metrics_module():
+    import metrics
+    return metrics
+
+
+@pytest.fixture
+def outbox_module():
+    import outbox
+    return outbox
+
+
+@pytest.fixture
+def poll_policy_module():
+    import poll_policy
+    return poll_policy
+
+
+@pytest.fixture
+def poller_module():
+    import poller
+    return poller
+
+
+@pytest.fixture
+def response_cache_module():
+    import response_cache
+    return response_cache
+
+
+@pytest.fixture
+def retry_policy_module():
+    import retry_policy
+    return retry_policy
+
+
+@pytest.fixture
+def send_queue_module():
+    import send_queue
+    return send_queue
+
+
+@pytest.fixture
+def sharding_module():
+    import sharding
+    return sharding
+
+
+@pytest.fixture
+def single_flight_module():
+    import single_flight
+    return single_flight
+
+
+@pytest.fixture
+def status_index_module():
+    import status_index
+    return status_index
+
+
+@pytest.fixture
+def stream_parser_module():
+    import stream_parser
+    return stream_parser
+
+
+@pytest.fixture
+def structured_logging_module():
+    import structured_logging
+    return structured_logging
+
+
+@pytest.fixture
+def subscriptions_module():
+    import subscriptions
+    return subscriptions
+
+
+@pytest.fixture
+def tenants_module():
+    import tenants
+    return tenants
+
+
+@pytest.fixture
+def timing_wheel_module():
+    import timing_wheel
+    return timing_wheel
+
+
 @pytest.fixture
 def random_message():
     def random_string(string_length=15):
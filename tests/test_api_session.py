@@ -0,0 +1,56 @@
+import requests
+
+import utils
+
+
+class TestApiSession:
+
+    def test_session_pool_and_retries(self, api_session_module):
+        session = api_session_module.make_session(pool_size=7, max_retries=3)
+        adapter = session.get_adapter('https://practicum.yandex.ru/')
+        assert adapter._pool_maxsize == 7
+        assert adapter.max_retries.connect == 3
+        assert adapter.max_retries.status == 0, (
+            'Сессия не должна сама повторять ответы с кодом ошибки.'
+        )
+        assert session.headers['Connection'] == 'keep-alive'
+
+    def test_keep_alive_can_be_disabled(self, api_session_module):
+        session = api_session_module.make_session(keep_alive=False)
+        assert session.headers['Connection'] == 'close'
+
+    def test_request_api_uses_session_with_timeout(self, random_timestamp,
+                                                   homework_module):
+        calls = []
+
+        class Session:
+            def get(self, **kwargs):
+                calls.append(kwargs)
+                return utils.MockResponseGET(
+                    random_timestamp=random_timestamp
+                )
+
+        result = homework_module.request_api(0, {}, Session())
+        assert result['current_date'] == random_timestamp
+        assert calls[0]['timeout'] == homework_module.REQUEST_TIMEOUT
+
+    def test_get_api_answer_has_timeout(self, monkeypatch, current_timestamp,
+                                        homework_module):
+        calls = []
+
+        def mock_get(*args, **kwargs):
+            calls.append(kwargs)
+            return utils.MockResponseGET()
+
+        monkeypatch.setattr(requests, 'get', mock_get)
+        homework_module.get_api_answer(current_timestamp)
+        assert calls[0].get('timeout'), (
+            'Запрос к API без таймаута может зависнуть навсегда.'
+        )
+
+    def test_warm_up_failure_is_not_fatal(self, api_session_module):
+        class Session:
+            def head(self, url, timeout=None):
+                raise requests.ConnectionError('no route')
+
+        assert api_session_module.warm_up(Session()) is False
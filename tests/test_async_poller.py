@@ -0,0 +1,190 @@
+import asyncio
+
+import pytest
+from aiohttp import web
+
+
+def run_with_server(routes, coroutine_factory):
+    """Поднимаем локальный сервер и выполняем корутину против него."""
+    async def scenario():
+        app = web.Application()
+        app.add_routes(routes)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        try:
+            return await coroutine_factory(f'http://127.0.0.1:{port}')
+        finally:
+            await runner.cleanup()
+    return asyncio.run(scenario())
+
+
+class TestAsyncPoller:
+
+    def test_concurrency_is_bounded(self, monkeypatch, homework_module,
+                                    async_poller_module):
+        import aiohttp
+        import tenants
+        in_flight = {'now': 0, 'max': 0}
+
+        async def statuses(request):
+            in_flight['now'] += 1
+            in_flight['max'] = max(in_flight['max'], in_flight['now'])
+            await asyncio.sleep(0.01)
+            in_flight['now'] -= 1
+            return web.json_response({
+                'homeworks': [{'homework_name': 'hw', 'status': 'approved'}],
+                'current_date': 42,
+            })
+
+        sent = []
+
+        async def send(request):
+            sent.append(await request.json())
+            return web.json_response({'ok': True})
+
+        async def poll_all(base_url):
+            monkeypatch.setattr(
+                homework_module, 'ENDPOINT', f'{base_url}/statuses/'
+            )
+            monkeypatch.setattr(
+                async_poller_module, 'TELEGRAM_API_URL',
+                base_url + '/bot{token}/{method}'
+            )
+            registry = [
+                tenants.Tenant(str(i), f'token-{i}', str(i))
+                for i in range(20)
+            ]
+            async with aiohttp.ClientSession() as session:
+                client = async_poller_module.AsyncClient(
+                    session, 'tg', concurrency=3
+                )
+                poller = async_poller_module.AsyncPoller(client, store=None)
+                return await asyncio.gather(*(
+                    poller.poll_tenant(tenant, 0) for tenant in registry
+                ))
+
+        results = run_with_server(
+            [web.get('/statuses/', statuses),
+             web.post('/bottg/sendMessage', send)],
+            poll_all,
+        )
+        assert results == [42] * 20
+        assert in_flight['max'] <= 3, (
+            'Число одновременных запросов превышает лимит семафора.'
+        )
+        assert sorted(int(message['chat_id']) for message in sent) == list(
+            range(20)
+        )
+
+    def test_not_200_raises(self, monkeypatch, homework_module,
+                            async_poller_module):
+        import aiohttp
+        import exceptions
+
+        async def statuses(request):
+            return web.Response(status=502, text='Bad gateway')
+
+        async def request(base_url):
+            monkeypatch.setattr(homework_module, 'ENDPOINT', base_url + '/')
+            async with aiohttp.ClientSession() as session:
+                client = async_poller_module.AsyncClient(session, 'tg')
+                await client.request_api(0, {})
+
+        with pytest.raises(exceptions.ResponseIsnt200Error):
+            run_with_server([web.get('/', statuses)], request)
+
+    def test_non_json_telegram_reply(self, monkeypatch, homework_module,
+                                     async_poller_module):
+        import aiohttp
+        import cursor_store
+        import tenants
+
+        async def statuses(request):
+            return web.json_response({
+                'homeworks': [{'homework_name': 'hw', 'status': 'approved'}],
+                'current_date': 42,
+            })
+
+        async def send(request):
+            return web.Response(
+                status=502, text='<html>Bad gateway</html>',
+                content_type='text/html',
+            )
+
+        async def poll(base_url):
+            monkeypatch.setattr(
+                homework_module, 'ENDPOINT', f'{base_url}/statuses/'
+            )
+            monkeypatch.setattr(
+                async_poller_module, 'TELEGRAM_API_URL',
+                base_url + '/bot{token}/{method}'
+            )
+            tenant = tenants.Tenant('alice', 'token', '1')
+            async with aiohttp.ClientSession() as session:
+                client = async_poller_module.AsyncClient(session, 'tg')
+                poller = async_poller_module.AsyncPoller(
+                    client, store=cursor_store.open_store(None)
+                )
+                sent = await client.send_message_to('1', 'text')
+                return sent, await poller.poll_and_save(tenant, 0)
+
+        sent, error = run_with_server(
+            [web.get('/statuses/', statuses),
+             web.post('/bottg/sendMessage', send)],
+            poll,
+        )
+        assert not sent
+        assert error is None, (
+            'Недоставленное сообщение не должно ронять опрос тенанта.'
+        )
+
+    def test_failed_notice_does_not_raise(self, async_poller_module):
+        import cursor_store
+        import tenants
+
+        class Client:
+            async def request_api(self, *args, **kwargs):
+                raise ConnectionError('down')
+
+            async def send_message_to(self, chat_id, message):
+                raise ValueError('not json')
+
+        poller = async_poller_module.AsyncPoller(
+            Client(), store=cursor_store.open_store(None)
+        )
+        error = asyncio.run(poller.poll_and_save(
+            tenants.Tenant('alice', 'token', '1'), 0
+        ))
+        assert isinstance(error, ConnectionError)
+
+    def test_broadcast_retries_only_failed_chats(self, async_poller_module):
+        import subscriptions
+        import tenants
+
+        class Client:
+            def __init__(self):
+                self.failing = {'2'}
+                self.sent = []
+
+            async def send_message_to(self, chat_id, message):
+                if chat_id in self.failing:
+                    return False
+                self.sent.append(chat_id)
+                return True
+
+        client = Client()
+        poller = async_poller_module.AsyncPoller(client, store=None)
+        tenant = tenants.Tenant(
+            'alice', 'token', '1',
+            subscriptions.parse_subscriptions('1,2,3'),
+        )
+        work = {'homework_name': 'hw', 'status': 'approved'}
+        assert not asyncio.run(poller.broadcast(tenant, work))
+        client.failing.clear()
+        assert asyncio.run(poller.broadcast(tenant, work))
+        assert client.sent == ['1', '3', '2'], (
+            'Чаты, уже получившие сообщение, не должны получить его снова.'
+        )
@@ -0,0 +1,128 @@
+import logging
+import time
+
+import pytest
+import requests
+import telegram
+
+import benchmark
+import utils
+
+HOMEWORKS = 5000
+MAIN_HOMEWORKS = 1000
+TENANTS = 100_000
+TENANT_HOMEWORKS = 5
+STATUSES = ('approved', 'reviewing', 'rejected')
+
+
+def make_response(count):
+    """Ответ API с историей из count работ."""
+    return {
+        'homeworks': [
+            {
+                'id': number,
+                'status': STATUSES[number % 3],
+                'homework_name': f'student__hw{number:05}.zip',
+                'reviewer_comment': 'Хорошая работа, но есть замечания.',
+                'date_updated': '2020-02-13T14:40:57Z',
+                'lesson_name': f'Спринт {number % 20}',
+            }
+            for number in range(count)
+        ],
+        'current_date': 1581604970,
+    }
+
+
+@pytest.fixture
+def main_loop(monkeypatch, homework_module):
+    """Одна итерация main() на заглушках из tests/utils."""
+    data = make_response(MAIN_HOMEWORKS)
+
+    def response_get(*args, **kwargs):
+        response = utils.MockResponseGET(*args, random_timestamp=0, **kwargs)
+        response.json = lambda: data
+        return response
+
+    def interrupt(seconds):
+        raise utils.BreakInfiniteLoop
+
+    for token in homework_module.TOKENS:
+        monkeypatch.setattr(homework_module, token, 'token')
+    monkeypatch.setattr(requests, 'get', response_get)
+    monkeypatch.setattr(telegram, 'Bot', utils.MockTelegramBot)
+    monkeypatch.setattr(time, 'sleep', interrupt)
+    # Журнал отправок не мерим: он уходит в очередь логов.
+    monkeypatch.setattr(homework_module.logger, 'level', logging.INFO)
+    logging.disable(logging.WARNING)
+
+    def iteration():
+        try:
+            homework_module.main()
+        except utils.BreakInfiniteLoop:
+            pass
+
+    yield iteration
+    logging.disable(logging.NOTSET)
+
+
+@pytest.fixture
+def cases(homework_module, main_loop):
+    response = make_response(HOMEWORKS)
+    return {
+        'check_response': lambda: homework_module.check_response(response),
+        'parse_status': lambda: [
+            homework_module.parse_status(homework)
+            for homework in response['homeworks']
+        ],
+        'main_iteration': main_loop,
+    }
+
+
+@pytest.mark.parametrize(
+    'name', ['check_response', 'parse_status', 'main_iteration']
+)
+def test_benchmark(name, cases):
+    result = benchmark.measure(cases[name])
+    if benchmark.BENCHMARK_UPDATE:
+        benchmark.save_baseline(name, result)
+        return
+    expected = benchmark.load_baseline().get(name)
+    assert expected is not None, (
+        f'Нет базовой линии для `{name}`: запустите тесты '
+        'с BENCHMARK_UPDATE=1.'
+    )
+    problems = benchmark.regressions(result, expected)
+    assert not problems, f'Регрессия `{name}`: ' + '; '.join(problems)
+
+
+def test_tenant_state_memory():
+    import status_index
+    tenant_ids = [f'tenant-{number}' for number in range(TENANTS)]
+    homeworks = [
+        {'id': 1_000_000 + number, 'status': STATUSES[number % 3]}
+        for number in range(TENANT_HOMEWORKS)
+    ]
+
+    def build():
+        index = status_index.StatusIndex()
+        for tenant_id in tenant_ids:
+            for item in homeworks:
+                index.commit(item, tenant_id)
+        return index
+
+    total, index = benchmark.retained_bytes(build)
+    assert len(index) == TENANTS * TENANT_HOMEWORKS
+    # Меряем байты на тенанта: на них и держится базовая линия.
+    result = {'bytes': total // TENANTS}
+    if benchmark.BENCHMARK_UPDATE:
+        benchmark.save_baseline('tenant_state', result)
+        return
+    expected = benchmark.load_baseline().get('tenant_state')
+    assert expected is not None, (
+        'Нет базовой линии для `tenant_state`: запустите тесты '
+        'с BENCHMARK_UPDATE=1.'
+    )
+    problems = benchmark.regressions(
+        result, expected, tolerance=0.2, slack=0
+    )
+    assert not problems, 'Регрессия `tenant_state`: ' + '; '.join(problems)
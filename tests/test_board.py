@@ -0,0 +1,177 @@
+import threading
+import time
+import types
+
+import pytest
+import telegram
+
+import utils
+
+
+class BoardBot:
+    def __init__(self, errors=()):
+        self.errors = list(errors)
+        self.calls = []
+        self.texts = {}
+
+    def _call(self, name, *args, **kwargs):
+        self.calls.append(name)
+        if self.errors:
+            raise self.errors.pop(0)
+
+    def send_message(self, chat_id, text):
+        self._call('send_message')
+        message_id = len(self.texts) + 1
+        self.texts[message_id] = text
+        return types.SimpleNamespace(message_id=message_id)
+
+    def edit_message_text(self, text, chat_id=None, message_id=None):
+        self._call('edit_message_text')
+        self.texts[message_id] = text
+
+    def pin_chat_message(self, chat_id, message_id, **kwargs):
+        self._call('pin_chat_message')
+
+
+def homework(status, name='hw1', **kwargs):
+    return dict(homework_name=name, status=status, **kwargs)
+
+
+def make_board(module, bot, clock=None, interval=5, store=None):
+    import send_queue
+    limiter = send_queue.RateLimiter(global_rate=1000, chat_rate=1000)
+    return module.StatusBoard(
+        bot, interval=interval,
+        clock=utils.Clock(100.0) if clock is None else clock,
+        limiter=limiter, store=store,
+    )
+
+
+class TestStatusBoard:
+
+    def test_board_is_posted_pinned_then_edited(self, board_module,
+                                                homework_module):
+        import status_index
+        bot = BoardBot()
+        clock = utils.Clock(100.0)
+        board = make_board(board_module, bot, clock)
+        index = status_index.StatusIndex()
+        assert board.post(1, index, [homework('reviewing')])
+        assert bot.calls == [], 'Опрос не должен ждать Telegram.'
+        assert board.flush()
+        assert bot.calls == ['send_message', 'pin_chat_message']
+        clock.now += 5
+        board.post(
+            1, index, [homework('approved'), homework('rejected', 'a')]
+        )
+        board.flush()
+        assert bot.calls[2:] == ['edit_message_text'], (
+            'Изменения одного опроса должны попадать в одну правку.'
+        )
+        assert bot.texts[1].splitlines() == [
+            board_module.BOARD_TITLE,
+            'a: ' + homework_module.HOMEWORK_VERDICTS['rejected'],
+            'hw1: ' + homework_module.HOMEWORK_VERDICTS['approved'],
+        ]
+
+    def test_changes_within_interval_are_coalesced(self, board_module):
+        import status_index
+        bot = BoardBot()
+        clock = utils.Clock(100.0)
+        board = make_board(board_module, bot, clock)
+        index = status_index.StatusIndex()
+        board.post(1, index, [homework('reviewing')])
+        board.flush()
+        for name in ('hw2', 'hw3', 'hw4'):
+            clock.now += 1
+            board.post(1, index, [homework('approved', name)])
+            board.flush()
+        assert bot.calls.count('edit_message_text') == 0
+        clock.now += 5
+        assert board.flush()
+        assert bot.calls.count('edit_message_text') == 1
+        assert len(bot.texts[1].splitlines()) == 5
+
+    def test_failed_edit_is_retried(self, board_module):
+        bot = BoardBot()
+        clock = utils.Clock(100.0)
+        board = make_board(board_module, bot, clock)
+        delivered = []
+        board.update(1, homework('reviewing'), lambda: delivered.append(1))
+        bot.errors.append(telegram.error.NetworkError('down'))
+        assert not board.flush()
+        assert delivered == [], (
+            'Задержка доставки считается только после удачной правки.'
+        )
+        clock.now += 5
+        assert board.flush()
+        assert delivered == [1]
+
+    def test_deleted_board_is_posted_again(self, board_module):
+        bot = BoardBot()
+        clock = utils.Clock(100.0)
+        board = make_board(board_module, bot, clock)
+        board.update(1, homework('reviewing'))
+        board.flush()
+        clock.now += 5
+        board.update(1, homework('approved'))
+        bot.errors.append(
+            telegram.error.BadRequest('Message to edit not found')
+        )
+        assert not board.flush()
+        assert board.flush()
+        assert bot.calls.count('send_message') == 2
+
+    def test_board_survives_restart(self, tmp_path, board_module,
+                                    homework_module):
+        path = str(tmp_path / 'boards.db')
+        bot = BoardBot()
+        board = make_board(
+            board_module, bot, store=board_module.BoardStore(path)
+        )
+        board.update(1, homework('approved', 'hw1', id=1))
+        board.update(1, homework('reviewing', 'hw2', id=2))
+        board.flush()
+        board.stop()
+        board = make_board(
+            board_module, bot, store=board_module.BoardStore(path)
+        )
+        board.update(1, homework('rejected', 'hw2', id=2))
+        assert board.flush()
+        board.stop()
+        assert bot.calls == [
+            'send_message', 'pin_chat_message', 'edit_message_text'
+        ], 'После перезапуска правится прежняя доска.'
+        assert bot.texts[1].splitlines() == [
+            board_module.BOARD_TITLE,
+            'hw1: ' + homework_module.HOMEWORK_VERDICTS['approved'],
+            'hw2: ' + homework_module.HOMEWORK_VERDICTS['rejected'],
+        ]
+
+    def test_unknown_status_is_rejected(self, board_module):
+        board = make_board(board_module, BoardBot())
+        with pytest.raises(ValueError):
+            board.update(1, homework('unknown'))
+        assert not board.dirty
+
+    def test_thread_publishes_board(self, board_module):
+        bot = BoardBot()
+        board = make_board(board_module, bot, time.monotonic, 0).start()
+        try:
+            delivered = threading.Event()
+            board.update(1, homework('approved'), delivered.set)
+            assert delivered.wait(2)
+        finally:
+            board.stop(1)
+        assert bot.calls == ['send_message', 'pin_chat_message']
+
+    def test_long_board_fits_message(self, board_module):
+        board = board_module.Board()
+        for number in range(500):
+            board.lines[number] = (f'student__hw{number:03}.zip', 'approved')
+        text = board_module.render(board)
+        assert len(text) <= board_module.MAX_MESSAGE_LENGTH
+        assert text.splitlines()[-1].startswith('…и ещё')
+
+    def test_open_board_is_opt_in(self, board_module):
+        assert board_module.open_board(BoardBot(), enabled=False) is None
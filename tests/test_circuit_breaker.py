@@ -0,0 +1,97 @@
+import pytest
+
+import utils
+
+
+def fail():
+    raise ConnectionError('down')
+
+
+class TestCircuitBreaker:
+
+    def make(self, module, clock, transitions):
+        breaker = module.CircuitBreaker(
+            failure_threshold=2, reset_timeout=30, clock=clock
+        )
+        breaker.add_listener(
+            lambda old, new: transitions.append((old, new))
+        )
+        return breaker
+
+    def test_full_cycle(self, circuit_breaker_module):
+        import exceptions
+        clock, transitions, calls = utils.Clock(), [], []
+        breaker = self.make(circuit_breaker_module, clock, transitions)
+        for _ in range(2):
+            with pytest.raises(ConnectionError):
+                breaker.call(fail)
+        assert breaker.state == circuit_breaker_module.OPEN
+
+        with pytest.raises(exceptions.CircuitOpenError):
+            breaker.call(calls.append, 'request')
+        assert calls == [], 'Открытый автомат не должен ходить в сеть.'
+
+        clock.now = 30
+        breaker.before_call()
+        assert breaker.state == circuit_breaker_module.HALF_OPEN
+        with pytest.raises(exceptions.CircuitOpenError):
+            breaker.before_call()
+        breaker.record(None)
+        assert breaker.state == circuit_breaker_module.CLOSED
+        assert transitions == [
+            ('closed', 'open'), ('open', 'half_open'), ('half_open', 'closed')
+        ]
+
+    def test_failed_probe_reopens(self, circuit_breaker_module):
+        clock, transitions = utils.Clock(), []
+        breaker = self.make(circuit_breaker_module, clock, transitions)
+        for _ in range(2):
+            breaker.on_failure()
+        clock.now = 31
+        with pytest.raises(ConnectionError):
+            breaker.call(fail)
+        assert breaker.state == circuit_breaker_module.OPEN
+        assert breaker.opened_at == 31
+
+    def test_tenant_errors_do_not_open(self, circuit_breaker_module):
+        import exceptions
+        breaker = self.make(circuit_breaker_module, utils.Clock(), [])
+        unauthorized = exceptions.ResponseIsnt200Error('401', 401)
+        for _ in range(5):
+            breaker.record(unauthorized)
+        assert breaker.state == circuit_breaker_module.CLOSED
+        assert circuit_breaker_module.is_outage(
+            exceptions.ResponseIsnt200Error('502', 502)
+        )
+        assert circuit_breaker_module.is_outage(
+            exceptions.ResponseIsnt200Error('429', 429)
+        )
+
+    def test_cancelled_probe_is_released(self, circuit_breaker_module):
+        clock = utils.Clock()
+        breaker = self.make(circuit_breaker_module, clock, [])
+        for _ in range(2):
+            breaker.on_failure()
+        clock.now = 31
+
+        def cancelled():
+            raise KeyboardInterrupt
+
+        with pytest.raises(KeyboardInterrupt):
+            breaker.call(cancelled)
+        assert breaker.state == circuit_breaker_module.HALF_OPEN
+        assert breaker.call(lambda: 'ok') == 'ok', (
+            'Прерванная проба не должна занимать автомат навсегда.'
+        )
+        assert breaker.state == circuit_breaker_module.CLOSED
+
+    def test_state_is_exported(self, circuit_breaker_module):
+        import metrics
+        breaker = self.make(circuit_breaker_module, utils.Clock(), [])
+        breaker.export()
+        for _ in range(2):
+            breaker.on_failure()
+        assert 'circuit_breaker_state{state="open"} 1' in (
+            metrics.REGISTRY.render()
+        )
+        assert metrics.BREAKER_STATE.get()[('closed',)] == 0
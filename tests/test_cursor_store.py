@@ -0,0 +1,121 @@
+import sqlite3
+
+import pytest
+import requests
+import telegram
+
+import utils
+
+
+class TestCursorStore:
+
+    def test_cursor_survives_restart_with_overlap(self, tmp_path,
+                                                  cursor_store_module):
+        path = str(tmp_path / 'cursors.db')
+        store = cursor_store_module.CursorStore(path, overlap=60)
+        store.save('alice', 1000)
+        store.close()
+
+        store = cursor_store_module.CursorStore(path, overlap=60)
+        assert store.load('alice', 5000) == 940, (
+            'После перезапуска опрос должен продолжиться с сохранённой '
+            'метки за вычетом перекрытия.'
+        )
+        assert store.load('bob', 5000) == 5000
+        store.close()
+
+    def test_overlap_applied_only_once(self, tmp_path, cursor_store_module):
+        path = str(tmp_path / 'cursors.db')
+        store = cursor_store_module.CursorStore(path, overlap=60)
+        store.save('alice', 1000)
+        store.close()
+        store = cursor_store_module.CursorStore(
+            path, overlap=60, flush_interval=0
+        )
+        assert store.load('alice', 0) == 940
+        store.save('alice', 1200)
+        assert store.load('alice', 0) == 1200
+        store.close()
+
+    def test_writes_are_batched(self, tmp_path, cursor_store_module):
+        path = str(tmp_path / 'cursors.db')
+        store = cursor_store_module.CursorStore(
+            path, batch_size=3, flush_interval=3600
+        )
+        reader = cursor_store_module.CursorStore(path, overlap=0)
+        store.save('a', 1)
+        store.save('b', 2)
+        assert reader.load('a', None) is None
+        store.save('c', 3)
+        assert reader.load('a', None) == 1
+        store.close()
+        reader.close()
+
+    def test_statuses_survive_restart(self, tmp_path, cursor_store_module):
+        import status_index
+        path = str(tmp_path / 'cursors.db')
+        store = cursor_store_module.CursorStore(path, overlap=60)
+        index = status_index.StatusIndex(store)
+        approved = {'id': 1, 'homework_name': 'hw', 'status': 'approved'}
+        named = {'homework_name': 'hw2', 'status': 'reviewing'}
+        for work in (approved, named):
+            assert list(index.diff([work], 'alice')) == [work]
+            index.commit(work, 'alice')
+        store.save('alice', 1000)
+        store.close()
+
+        store = cursor_store_module.CursorStore(path, overlap=60)
+        index = status_index.StatusIndex(store)
+        assert list(index.diff([approved, named], 'alice')) == [], (
+            'Статусы из интервала перекрытия не должны уходить повторно.'
+        )
+        assert index.in_review('alice')
+        rejected = dict(approved, status='rejected')
+        assert list(index.diff([rejected], 'alice')) == [rejected]
+        assert list(index.diff([approved], 'bob')) == [approved]
+        store.close()
+
+    def test_wal_mode(self, tmp_path, cursor_store_module):
+        store = cursor_store_module.CursorStore(str(tmp_path / 'c.db'))
+        mode = store.connection.execute('PRAGMA journal_mode').fetchone()[0]
+        assert mode == 'wal'
+        store.close()
+
+    def test_open_store_without_path_is_in_memory(self, cursor_store_module):
+        store = cursor_store_module.open_store(None)
+        assert isinstance(store, cursor_store_module.MemoryCursorStore)
+        store.save('alice', 10)
+        assert store.load('alice', 0) == 10
+
+    def test_main_persists_cursor(self, monkeypatch, tmp_path,
+                                  homework_module, cursor_store_module):
+        path = str(tmp_path / 'cursors.db')
+        stores = []
+
+        def open_store():
+            stores.append(cursor_store_module.CursorStore(
+                path, overlap=0, batch_size=100, flush_interval=3600
+            ))
+            return stores[-1]
+
+        def response_get(*args, **kwargs):
+            return utils.MockResponseGET(random_timestamp=2000)
+
+        def interrupt(seconds):
+            raise utils.BreakInfiniteLoop
+
+        for token in homework_module.TOKENS:
+            monkeypatch.setattr(homework_module, token, 'token')
+        monkeypatch.setattr(cursor_store_module, 'open_store', open_store)
+        monkeypatch.setattr(requests, 'get', response_get)
+        monkeypatch.setattr(telegram, 'Bot', utils.MockTelegramBot)
+        monkeypatch.setattr(homework_module.time, 'sleep', interrupt)
+        with pytest.raises(utils.BreakInfiniteLoop):
+            homework_module.main()
+        store = cursor_store_module.CursorStore(path, overlap=0)
+        assert store.load(homework_module.DEFAULT_TENANT_ID, 0) == 2000, (
+            'Метка единственного пользователя должна попасть в базу.'
+        )
+        store.close()
+        with pytest.raises(sqlite3.ProgrammingError):
+            stores[0].connection.execute('SELECT 1')
@@ -0,0 +1,103 @@
+import pytest
+
+
+UPDATED_AT = 1581604857  # 2020-02-13T14:40:57Z
+
+
+class TestDeliveryLag:
+
+    @pytest.mark.parametrize('value, expected', [
+        ('2020-02-13T14:40:57Z', UPDATED_AT),
+        ('2020-02-13T14:40:57+00:00', UPDATED_AT),
+        ('2020-02-13T14:40:57', UPDATED_AT),
+        ('вчера', None),
+        (None, None),
+    ])
+    def test_parse_date_updated(self, delivery_lag_module, value, expected):
+        assert delivery_lag_module.parse_date_updated(value) == expected
+
+    def test_percentiles_per_tenant_and_overall(self, delivery_lag_module):
+        tracker = delivery_lag_module.LagTracker(window=100)
+        for lag in range(1, 101):
+            tracker.record('alice', 0, lag)
+        tracker.record('bob', 0, 1000)
+        alice = tracker.percentiles('alice')
+        assert alice == {0.5: 50, 0.9: 90, 0.99: 99}
+        assert tracker.percentiles('bob')[0.5] == 1000
+        assert tracker.percentiles('carol')[0.5] is None
+        assert tracker.overall_percentiles()[0.99] == 100
+
+    def test_percentiles_are_exported(self, delivery_lag_module):
+        import metrics
+        tracker = delivery_lag_module.LagTracker(window=100)
+        tracker.export()
+        assert metrics.WORST_TENANT_LAG_QUANTILES.get() == {}
+        for lag in range(1, 101):
+            tracker.record('alice', 0, lag)
+        text = metrics.REGISTRY.render()
+        assert (
+            'worst_tenant_notification_lag_quantile_seconds'
+            '{tenant="alice",quantile="0.9"} 90'
+        ) in text
+        assert 'notification_lag_quantile_seconds{quantile="0.99"} 99' in text
+
+    def test_only_worst_tenants_are_exported(self, delivery_lag_module):
+        tracker = delivery_lag_module.LagTracker(window=100, worst=2)
+        for number in range(50):
+            for lag in range(1, 101):
+                tracker.record(f'tenant-{number}', 0, lag + number)
+        samples = tracker.worst_tenant_samples()
+        assert len(samples) == 2 * len(delivery_lag_module.LAG_QUANTILES), (
+            'Число серий не должно расти вместе с числом тенантов.'
+        )
+        assert {tenant for tenant, _ in samples} == {
+            'tenant-49', 'tenant-48'
+        }
+        assert samples[('tenant-49', 0.99)] == 148
+
+    @pytest.mark.parametrize('quantile', [0.01, 0.5, 0.9, 0.99, 1])
+    def test_tail_percentile_matches_sorted(self, delivery_lag_module,
+                                            quantile):
+        samples = [7, 3, 9, 1, 5, 5, 2]
+        assert delivery_lag_module.tail_percentile(
+            samples, quantile
+        ) == delivery_lag_module.percentile(sorted(samples), quantile)
+
+    def test_window_keeps_recent_samples(self, delivery_lag_module):
+        tracker = delivery_lag_module.LagTracker(window=2)
+        for lag in (100, 1, 2):
+            tracker.record('alice', 0, lag)
+        assert tracker.percentiles('alice', (1,)) == {1: 2}
+
+    def test_clock_skew_and_sla(self, delivery_lag_module):
+        import metrics
+        tracker = delivery_lag_module.LagTracker(sla=60)
+        misses = metrics.NOTIFICATION_LAG_SLA_MISSES.get()
+        assert tracker.record('alice', 100, 90) == 0
+        assert tracker.record('alice', 100, 200) == 100
+        assert metrics.NOTIFICATION_LAG_SLA_MISSES.get() == misses + 1
+
+    def test_lag_recorded_only_after_delivery(self, delivery_lag_module):
+        import homework
+        import status_index
+        tracker = delivery_lag_module.LagTracker(
+            clock=lambda: UPDATED_AT + 30
+        )
+        callbacks = []
+
+        def send(message, on_delivered):
+            callbacks.append(on_delivered)
+            return True
+
+        homeworks = [
+            {'homework_name': 'hw1', 'status': 'approved',
+             'date_updated': '2020-02-13T14:40:57Z'},
+            {'homework_name': 'hw2', 'status': 'approved'},
+        ]
+        homework.send_new_statuses(
+            send, status_index.StatusIndex(), homeworks, 'alice', tracker
+        )
+        assert callbacks[1] is None, 'Без date_updated задержку не считаем.'
+        assert tracker.percentiles('alice')[0.5] is None
+        callbacks[0]()
+        assert tracker.percentiles('alice')[0.5] == 30
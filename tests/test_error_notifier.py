@@ -0,0 +1,62 @@
+import utils
+
+
+class TestErrorNotifier:
+
+    def make(self, module, clock, interval=100):
+        return module.ErrorNotifier(
+            'Сбой: {error}', summary_interval=interval, clock=clock
+        )
+
+    def test_repeated_error_is_collapsed(self, error_notifier_module):
+        clock = utils.Clock()
+        notifier = self.make(error_notifier_module, clock)
+        assert notifier.on_error(ConnectionError('from_date=1')) == (
+            'Сбой: from_date=1'
+        )
+        clock.now = 10
+        assert notifier.on_error(ConnectionError('from_date=2')) is None, (
+            'Та же ошибка с другими числами не должна отправляться снова.'
+        )
+        clock.now = 100
+        summary = notifier.on_error(ConnectionError('from_date=3'))
+        assert summary.startswith('Сбой продолжается (3 раз')
+        clock.now = 150
+        assert notifier.on_error(ConnectionError('from_date=4')) is None
+
+    def test_object_address_does_not_make_error_new(
+            self, error_notifier_module):
+        notifier = self.make(error_notifier_module, utils.Clock())
+        template = (
+            'HTTPSConnectionPool: Max retries exceeded (Caused by '
+            'NewConnectionError(\'<urllib3.connection.HTTPSConnection '
+            'object at {address}>: Failed to establish a new connection\'))'
+        )
+        assert notifier.on_error(
+            ConnectionError(template.format(address='0x7f3a2c1d9e50'))
+        )
+        for address in ('0x7f3a2c1dab10', '0x7fbbd0e4f2c0'):
+            assert notifier.on_error(
+                ConnectionError(template.format(address=address))
+            ) is None
+
+    def test_new_error_is_sent_at_once(self, error_notifier_module):
+        notifier = self.make(error_notifier_module, utils.Clock())
+        notifier.on_error(ConnectionError('down'))
+        assert notifier.on_error(KeyError('status')) is not None
+
+    def test_recovery_message(self, error_notifier_module):
+        notifier = self.make(error_notifier_module, utils.Clock())
+        assert notifier.on_success() is None
+        notifier.on_error(ConnectionError('down'))
+        notifier.on_error(ConnectionError('down'))
+        assert '2' in notifier.on_success()
+        assert notifier.on_success() is None
+        assert notifier.failing == {}
+
+    def test_tenants_are_independent(self, error_notifier_module):
+        notifier = self.make(error_notifier_module, utils.Clock())
+        assert notifier.on_error(ConnectionError('down'), 'alice')
+        assert notifier.on_error(ConnectionError('down'), 'bob')
+        assert notifier.on_success('bob')
+        assert notifier.on_error(ConnectionError('down'), 'alice') is None
@@ -0,0 +1,83 @@
+import pytest
+import telegram
+
+
+@pytest.fixture
+def serve(fake_services_module, monkeypatch, homework_module):
+    """Поднимаем заглушки и направляем на них бота."""
+    servers = []
+
+    def start(**settings):
+        chaos = fake_services_module.Chaos(
+            **dict(dict(latency=0, jitter=0, error_rate=0, throttle_rate=0),
+                   **settings)
+        )
+        app = fake_services_module.make_app(chaos)
+        base_url, stop = fake_services_module.serve_in_thread(app)
+        servers.append(stop)
+        monkeypatch.setattr(
+            homework_module, 'ENDPOINT',
+            base_url + fake_services_module.PRACTICUM_PATH,
+        )
+        return app, base_url
+
+    yield start
+    for stop in servers:
+        stop()
+
+
+HEADERS = {'Authorization': 'OAuth student'}
+
+
+class TestFakeServices:
+
+    def test_statuses_since_from_date(self, serve, homework_module):
+        app, _ = serve()
+        app['practicum'].churn = 0
+        first = homework_module.request_api(0, HEADERS)
+        assert [work['status'] for work in first['homeworks']] == [
+            'reviewing'
+        ] * 5
+        assert first['homeworks'][0]['date_updated'].endswith('Z')
+        later = homework_module.request_api(
+            first['current_date'] + 1, HEADERS
+        )
+        assert later['homeworks'] == []
+
+    def test_churn_changes_a_homework(self, serve, homework_module):
+        app, _ = serve()
+        app['practicum'].churn = 1
+        homework_module.request_api(0, HEADERS)
+        for work in app['practicum'].students['student']:
+            work['updated'] = 0
+        changed = homework_module.request_api(1, HEADERS)
+        assert len(changed['homeworks']) == 1
+
+    def test_throttling_and_auth(self, serve, homework_module):
+        import exceptions
+        serve(throttle_rate=1)
+        with pytest.raises(exceptions.ResponseIsnt200Error) as error:
+            homework_module.request_api(0, HEADERS)
+        assert error.value.status_code == 429
+        with pytest.raises(exceptions.ResponseIsnt200Error) as error:
+            homework_module.request_api(0, {})
+        assert error.value.status_code == 401
+
+    def test_telegram_bot_talks_to_fake(self, serve, fake_services_module):
+        app, base_url = serve()
+        bot = telegram.Bot(
+            token=fake_services_module.FAKE_BOT_TOKEN,
+            base_url=base_url + '/bot',
+        )
+        bot.send_message(42, 'Привет')
+        assert app['telegram'].delivered == {'42': 1}
+
+    def test_telegram_retry_after(self, serve, fake_services_module):
+        _, base_url = serve(throttle_rate=1, retry_after=3)
+        bot = telegram.Bot(
+            token=fake_services_module.FAKE_BOT_TOKEN,
+            base_url=base_url + '/bot',
+        )
+        with pytest.raises(telegram.error.RetryAfter) as error:
+            bot.send_message(42, 'Привет')
+        assert error.value.retry_after == 3
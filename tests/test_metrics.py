@@ -0,0 +1,95 @@
+import urllib.request
+
+import pytest
+import telegram
+
+
+class TestMetrics:
+
+    def test_histogram_buckets_are_cumulative(self, metrics_module):
+        histogram = metrics_module.Histogram(
+            'latency_seconds', 'Задержка', buckets=(0.1, 1)
+        )
+        for value in (0.05, 0.5, 0.5, 5):
+            histogram.observe(value)
+        lines = list(histogram.samples())
+        assert 'latency_seconds_bucket{le="0.1"} 1' in lines
+        assert 'latency_seconds_bucket{le="1"} 3' in lines
+        assert 'latency_seconds_bucket{le="+Inf"} 4' in lines
+        assert 'latency_seconds_count 4' in lines
+
+    def test_histogram_times_failed_block(self, metrics_module):
+        histogram = metrics_module.Histogram('block_seconds', 'Блок')
+        with pytest.raises(ValueError):
+            with histogram.time():
+                raise ValueError
+        assert histogram.count == 1
+
+    def test_counter_and_gauge_render(self, metrics_module):
+        registry = metrics_module.Registry()
+        errors = registry.register(metrics_module.Counter(
+            'errors_total', 'Ошибки', labels=('type',)
+        ))
+        depth = registry.register(metrics_module.Gauge('depth', 'Очередь'))
+        errors.inc('ConnectionError')
+        errors.inc('ConnectionError')
+        depth.set_function(lambda: 7)
+        text = registry.render()
+        assert '# TYPE errors_total counter' in text
+        assert 'errors_total{type="ConnectionError"} 2' in text
+        assert 'depth 7' in text
+
+    def test_labeled_gauge_render(self, metrics_module):
+        registry = metrics_module.Registry()
+        lag = registry.register(metrics_module.Gauge(
+            'lag', 'Задержка', labels=('tenant', 'quantile')
+        ))
+        assert registry.render() == '# HELP lag Задержка\n# TYPE lag gauge\n'
+        lag.set_function(lambda: {('alice', 0.5): 30, ('bob', 0.5): 60})
+        text = registry.render()
+        assert 'lag{tenant="alice",quantile="0.5"} 30' in text
+        assert 'lag{tenant="bob",quantile="0.5"} 60' in text
+
+    def test_label_values_are_escaped(self, metrics_module):
+        assert metrics_module.format_labels(
+            ('error',), ['C:\\tmp "x"\nnext']
+        ) == '{error="C:\\\\tmp \\"x\\"\\nnext"}', (
+            'Обратная косая, кавычка и перевод строки экранируются.'
+        )
+
+    def test_telegram_error_is_counted(self, metrics_module):
+        import homework
+
+        class FailingBot:
+            def send_message(self, chat_id, text):
+                raise telegram.TelegramError('down')
+
+        before = metrics_module.ERRORS.get('TelegramError')
+        sends = metrics_module.SEND_LATENCY.count
+        assert not homework.send_message_to(FailingBot(), 1, 'text')
+        assert metrics_module.ERRORS.get('TelegramError') == before + 1
+        assert metrics_module.SEND_LATENCY.count == sends + 1
+
+    def test_server_exposes_registry(self, metrics_module):
+        registry = metrics_module.Registry()
+        registry.register(metrics_module.Gauge('up', 'Бот работает'))
+        assert metrics_module.serve(port=0, registry=registry) is None
+        server = metrics_module.start_server(0, registry=registry)
+        try:
+            url = 'http://127.0.0.1:{}/metrics'.format(server.server_port)
+            with urllib.request.urlopen(url, timeout=5) as response:
+                body = response.read().decode()
+        finally:
+            server.shutdown()
+        assert 'up 0' in body
+
+    def test_histogram_quantile(self, metrics_module):
+        histogram = metrics_module.Histogram(
+            'quantile_seconds', 'Квантиль', buckets=(0.1, 1)
+        )
+        assert histogram.quantile(0.5) is None
+        for value in (0.05,) * 98 + (0.5, 5):
+            histogram.observe(value)
+        assert histogram.quantile(0.5) == 0.1
+        assert histogram.quantile(0.99) == 1
+        assert histogram.quantile(1) == float('inf')
@@ -0,0 +1,168 @@
+import sqlite3
+import time
+
+import pytest
+import telegram
+
+import utils
+
+
+def pending(path):
+    connection = sqlite3.connect(path)
+    try:
+        return connection.execute(
+            'SELECT chat_id, text, attempts FROM outbox'
+        ).fetchall()
+    finally:
+        connection.close()
+
+
+class TestOutbox:
+
+    def test_message_survives_restart(self, tmp_path, outbox_module):
+        path = str(tmp_path / 'outbox.db')
+        outbox = outbox_module.Outbox(path, utils.RecordingBot())
+        assert outbox.send(1, 'text') is True
+        outbox.stop()
+        bot = utils.RecordingBot()
+        outbox = outbox_module.Outbox(path, bot).start()
+        assert bot.done.wait(2), (
+            'Сообщение из базы должно уйти после перезапуска.'
+        )
+        outbox.stop(1)
+        assert bot.sent == [('1', 'text')]
+        assert pending(path) == []
+
+    def test_pending_duplicate_is_ignored(self, tmp_path, outbox_module):
+        path = str(tmp_path / 'outbox.db')
+        outbox = outbox_module.Outbox(path, utils.RecordingBot())
+        outbox.send(1, 'text', key=('alice', 1))
+        outbox.send(1, 'text', key=('alice', 1))
+        outbox.send(2, 'text', key=('alice', 1))
+        outbox.send(1, 'text')
+        outbox.send(1, 'text')
+        assert len(outbox) == 3
+        outbox.stop()
+
+    def test_repeated_status_is_not_lost(self, tmp_path, outbox_module):
+        path = str(tmp_path / 'outbox.db')
+        outbox = outbox_module.Outbox(path, utils.RecordingBot())
+        for text in ('reviewing', 'rejected', 'reviewing'):
+            outbox.send(1, text, key=('alice', 1))
+        outbox.stop()
+        assert [text for _, text, _ in pending(path)] == [
+            'reviewing', 'rejected', 'reviewing'
+        ], 'Последним чат должен увидеть актуальный статус.'
+
+    def test_old_schema_is_migrated(self, tmp_path, outbox_module):
+        path = str(tmp_path / 'outbox.db')
+        connection = sqlite3.connect(path)
+        connection.execute(
+            'CREATE TABLE outbox ('
+            'id INTEGER PRIMARY KEY AUTOINCREMENT, '
+            'chat_id TEXT NOT NULL, text TEXT NOT NULL, '
+            'attempts INTEGER NOT NULL DEFAULT 0, ready_at REAL NOT NULL, '
+            'UNIQUE (chat_id, text))'
+        )
+        connection.execute(
+            "INSERT INTO outbox (chat_id, text, ready_at) VALUES ('1', 'a', 0)"
+        )
+        connection.commit()
+        connection.close()
+        outbox = outbox_module.Outbox(path, utils.RecordingBot())
+        outbox.send(1, 'a', key=('alice', 1))
+        outbox.stop()
+        assert pending(path) == [('1', 'a', 0), ('1', 'a', 0)]
+
+    def test_throttled_chat_does_not_block_others(self, tmp_path,
+                                                 outbox_module):
+        import send_queue
+        path = str(tmp_path / 'outbox.db')
+        bot = utils.RecordingBot()
+        limiter = send_queue.RateLimiter(global_rate=1000, chat_rate=0.5)
+        outbox = outbox_module.Outbox(path, bot, limiter)
+        for number in range(3):
+            outbox.send(1, f'text {number}')
+        outbox.send(2, 'other')
+        outbox.start()
+        started = time.monotonic()
+        deadline = started + 3
+        while ('2', 'other') not in bot.sent and time.monotonic() < deadline:
+            time.sleep(0.01)
+        outbox.stop(1)
+        assert time.monotonic() - started < 1, (
+            'Сообщение в свободный чат не должно ждать лимита другого чата.'
+        )
+        assert bot.sent[:2] == [('1', 'text 0'), ('2', 'other')]
+
+    def test_failed_send_is_retried_with_backoff(self, tmp_path,
+                                                 outbox_module):
+        path = str(tmp_path / 'outbox.db')
+        bot = utils.RecordingBot([telegram.error.NetworkError('down')] * 2)
+        delivered = []
+        outbox = outbox_module.Outbox(path, bot, backoff=0.05).start()
+        started = time.monotonic()
+        outbox.send(1, 'text', lambda: delivered.append(True))
+        assert bot.done.wait(3)
+        outbox.stop(1)
+        assert time.monotonic() - started >= 0.05 + 0.1
+        assert bot.sent == [('1', 'text')] and delivered == [True]
+
+    def test_backoff_is_capped(self, tmp_path, outbox_module):
+        outbox = outbox_module.Outbox(
+            str(tmp_path / 'outbox.db'), None, backoff=1, max_backoff=10
+        )
+        assert [outbox.delay(attempt) for attempt in (1, 2, 3, 5)] == [
+            1, 2, 4, 10
+        ]
+        outbox.stop()
+
+    def test_permanent_error_is_dropped(self, tmp_path, outbox_module):
+        path = str(tmp_path / 'outbox.db')
+        bot = utils.RecordingBot([telegram.error.BadRequest('chat not found')])
+        outbox = outbox_module.Outbox(path, bot).start()
+        outbox.send(1, 'text')
+        for _ in range(100):
+            if not pending(path):
+                break
+            time.sleep(0.01)
+        outbox.stop(1)
+        assert bot.sent == [] and pending(path) == []
+
+    def test_main_advances_cursor_while_telegram_is_down(
+            self, monkeypatch, tmp_path, homework_module, outbox_module):
+        import cursor_store
+        import requests
+        path = str(tmp_path / 'outbox.db')
+        store = cursor_store.MemoryCursorStore()
+        outbox = outbox_module.Outbox(path, utils.RecordingBot())
+
+        def sleep_to_interrupt(secs):
+            raise utils.BreakInfiniteLoop('break')
+
+        def response_get(*args, **kwargs):
+            response = utils.MockResponseGET(
+                *args, random_timestamp=1000, **kwargs
+            )
+            response.json = lambda: {
+                'homeworks': [{'homework_name': 'hw', 'status': 'approved'}],
+                'current_date': 1000,
+            }
+            return response
+
+        monkeypatch.setattr(time, 'sleep', sleep_to_interrupt)
+        monkeypatch.setattr(telegram, 'Bot', utils.MockTelegramBot)
+        monkeypatch.setattr(requests, 'get', response_get)
+        monkeypatch.setattr(cursor_store, 'open_store', lambda: store)
+        monkeypatch.setattr(homework_module, 'open_outbox', lambda bot: outbox)
+        for token in homework_module.TOKENS:
+            monkeypatch.setattr(homework_module, token, 'token')
+        with pytest.raises(utils.BreakInfiniteLoop):
+            homework_module.main()
+        outbox.stop()
+        assert store.load(homework_module.DEFAULT_TENANT_ID, 0) == 1000, (
+            'Метка должна сдвигаться, как только сообщение в очереди.'
+        )
+        assert pending(path) == [('token', homework_module.parse_status(
+            {'homework_name': 'hw', 'status': 'approved'}
+        ), 0)]
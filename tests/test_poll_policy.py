@@ -0,0 +1,82 @@
+import time
+
+import pytest
+
+
+class TestPollPolicy:
+
+    def test_regular_period(self, poll_policy_module):
+        policy = poll_policy_module.PollPolicy(600, jitter=0)
+        assert policy.next_delay() == 600
+
+    def test_exponential_backoff_is_capped(self, poll_policy_module):
+        policy = poll_policy_module.PollPolicy(
+            600, max_period=3000, jitter=0
+        )
+        delays = [policy.next_delay(failures) for failures in range(1, 5)]
+        assert delays == [600, 1200, 2400, 3000]
+        assert policy.next_delay(10 ** 6) == 3000
+
+    def test_reviewing_is_polled_faster(self, poll_policy_module):
+        policy = poll_policy_module.PollPolicy(
+            600, reviewing_period=120, jitter=0
+        )
+        assert policy.next_delay(reviewing=True) == 120
+        assert policy.next_delay(failures=1, reviewing=True) == 600, (
+            'Недоступность API важнее ускоренного опроса на ревью.'
+        )
+
+    def test_jitter_bounds(self, poll_policy_module):
+        policy = poll_policy_module.PollPolicy(
+            600, jitter=0.1, uniform=lambda low, high: high
+        )
+        assert policy.next_delay() == pytest.approx(660)
+
+    def test_only_api_outages_count_as_failures(self, poll_policy_module):
+        import exceptions
+        count = poll_policy_module.count_failures
+        assert count(0, ConnectionError()) == 1
+        assert count(1, exceptions.ResponseIsnt200Error()) == 2
+        assert count(2, KeyError('status')) == 0
+        assert count(2, None) == 0
+        assert count(2, exceptions.CircuitOpenError()) == 2, (
+            'Пока автомат открыт, запросов нет и отступ не растёт.'
+        )
+
+    def test_index_tracks_reviewing(self):
+        import status_index
+        index = status_index.StatusIndex()
+        reviewing = {'homework_name': 'hw', 'status': 'reviewing'}
+        index.commit(reviewing, 'alice')
+        assert index.in_review('alice') and not index.in_review('bob')
+        index.commit(dict(reviewing, status='approved'), 'alice')
+        assert not index.in_review('alice')
+
+    def test_regular_poll_keeps_tenant_phase(self, poll_policy_module):
+        policy = poll_policy_module.PollPolicy(600, jitter=0)
+        assert policy.next_deadline(1000, 0, False, 30) == 1830
+        assert policy.next_deadline(1830, 0, False, 30) == 2430
+        assert policy.next_deadline(1000, 1, False, 30) == 1600
+
+
+class TestBackpressure:
+
+    def test_saturated_queue_defers_polls(self, monkeypatch):
+        import poller
+        import tenants
+
+        class SaturatedSender:
+            def saturated(self):
+                return True
+
+        worker = poller.Poller(SaturatedSender())
+        polled = []
+        monkeypatch.setattr(
+            worker, 'poll_and_save', lambda *args: polled.append(args)
+        )
+        tenant = tenants.Tenant('alice', 'token', '1')
+        started = time.time()
+        failures, deadline = worker.poll_due(tenant, 0, 2, 0)
+        assert polled == [], 'Опрос должен ждать, пока очередь разгрузится.'
+        assert failures == 2
+        assert deadline >= started + worker.policy.backpressure_delay
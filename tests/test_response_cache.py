@@ -0,0 +1,82 @@
+import json
+
+import requests
+
+import utils
+
+
+def body(current_date, homeworks=()):
+    return json.dumps(
+        {'homeworks': list(homeworks), 'current_date': current_date}
+    ).encode()
+
+
+class TestResponseCache:
+
+    def test_same_body_with_new_current_date_is_unchanged(
+            self, response_cache_module):
+        cache = response_cache_module.ResponseCache()
+        assert not cache.check('token', 100, 200, body(1), {})
+        cache.commit('token')
+        assert cache.check('token', 100, 200, body(2), {}), (
+            'Ответ, отличающийся только current_date, не должен '
+            'разбираться заново.'
+        )
+        assert not cache.check('token', 100, 200, body(3, [{'id': 1}]), {})
+        assert not cache.check('token', 200, 200, body(2), {}), (
+            'Ответ на другой from_date нельзя брать из кеша.'
+        )
+
+    def test_uncommitted_response_is_parsed_again(
+            self, response_cache_module):
+        cache = response_cache_module.ResponseCache()
+        assert not cache.check('token', 100, 200, body(1), {})
+        assert not cache.check('token', 100, 200, body(1), {})
+
+    def test_conditional_request(self, response_cache_module):
+        cache = response_cache_module.ResponseCache()
+        assert cache.conditional_headers('token', 100) == {}
+        cache.check('token', 100, 200, body(1), {
+            'ETag': '"abc"', 'Last-Modified': 'Wed, 21 Oct 2015 07:28:00 GMT'
+        })
+        cache.commit('token')
+        assert cache.conditional_headers('token', 100) == {
+            'If-None-Match': '"abc"',
+            'If-Modified-Since': 'Wed, 21 Oct 2015 07:28:00 GMT',
+        }
+        assert cache.check('token', 100, 304, b'', {})
+
+    def test_poller_skips_parsing_unchanged_response(
+            self, monkeypatch, homework_module, response_cache_module):
+        import poller
+        import send_queue
+        import tenants
+        requests_sent, parsed = [], []
+
+        def mock_get(*args, **kwargs):
+            requests_sent.append(kwargs['headers'])
+            response = utils.MockResponseGET(random_timestamp=500)
+            response.content = body(len(requests_sent))
+            response.headers = {
+                'ETag': '"v1"', 'Content-Length': len(response.content)
+            }
+            return response
+
+        check_response = homework_module.check_response
+
+        def counting_check_response(response):
+            parsed.append(response)
+            return check_response(response)
+
+        monkeypatch.setattr(requests, 'get', mock_get)
+        monkeypatch.setattr(
+            homework_module, 'check_response', counting_check_response
+        )
+        tenant = tenants.Tenant('alice', 'token', '1')
+        instance = poller.Poller(
+            send_queue.DirectSender(utils.MockTelegramBot())
+        )
+        assert instance.poll_tenant(tenant, 100) == 100
+        assert instance.poll_tenant(tenant, 100) == 100
+        assert len(parsed) == 1
+        assert requests_sent[1]['If-None-Match'] == '"v1"'
@@ -0,0 +1,143 @@
+import email.utils
+
+import pytest
+import requests
+
+import utils
+
+
+def http_error(status_code, retry_after=None):
+    import exceptions
+    return exceptions.ResponseIsnt200Error(
+        str(status_code), status_code, retry_after
+    )
+
+
+def make_policy(module, clock=None, **kwargs):
+    options = dict(
+        budget=100, budget_window=3600, rate=100, burst=100, jitter=0
+    )
+    options.update(kwargs)
+    return module.RetryPolicy(
+        clock=utils.Clock(100.0) if clock is None else clock, **options
+    )
+
+
+class TestRetryPolicy:
+
+    def test_error_classes(self, retry_policy_module):
+        import exceptions
+        error_class = retry_policy_module.error_class
+        assert error_class(ConnectionError()) == retry_policy_module.NETWORK
+        assert error_class(http_error(502)) == retry_policy_module.SERVER
+        assert error_class(http_error(429)) == retry_policy_module.THROTTLED
+        assert error_class(http_error(401)) is None
+        assert error_class(exceptions.CircuitOpenError()) is None
+        assert error_class(KeyError('status')) is None
+
+    def test_parse_retry_after(self, retry_policy_module):
+        parse = retry_policy_module.parse_retry_after
+        assert parse('120') == 120
+        assert parse('1.5') == 1
+        assert parse('-3') == 0
+        assert parse('inf') is None
+        date = email.utils.formatdate(1030, usegmt=True)
+        assert parse(date, now=1000) == 30
+        assert parse('soon') is None
+        assert parse(None) is None
+
+    def test_transient_errors_are_retried_fast(self, retry_policy_module):
+        policy = make_policy(retry_policy_module)
+        rule = retry_policy_module.RETRY_RULES[retry_policy_module.NETWORK]
+        delays = [
+            policy.next_delay('alice', ConnectionError(), failures, 600)
+            for failures in range(1, rule.attempts + 2)
+        ]
+        assert delays[:-1] == [
+            rule.delay(attempt) for attempt in range(1, rule.attempts + 1)
+        ]
+        assert delays[0] < 600
+        assert delays[-1] == 600, (
+            'После быстрых повторов тенант ждёт обычного отступа.'
+        )
+
+    def test_client_errors_wait_regular_backoff(self, retry_policy_module):
+        policy = make_policy(retry_policy_module)
+        assert policy.next_delay('alice', http_error(401), 1, 600) == 600
+
+    def test_retry_after_is_honoured(self, retry_policy_module):
+        policy = make_policy(retry_policy_module)
+        assert policy.next_delay(
+            'alice', http_error(429, retry_after=90), 1, 600
+        ) == 90
+        assert policy.next_delay(
+            'alice', http_error(401, retry_after=900), 1, 600
+        ) == 900
+        assert policy.next_delay(
+            'alice', http_error(429, retry_after=10 ** 9), 1, 600
+        ) == retry_policy_module.MAX_RETRY_AFTER
+
+    def test_tenant_budget(self, retry_policy_module):
+        clock = utils.Clock(100.0)
+        policy = make_policy(
+            retry_policy_module, clock, budget=2, budget_window=100
+        )
+        error = http_error(502)
+        assert policy.next_delay('alice', error, 1, 600) < 600
+        assert policy.next_delay('alice', error, 1, 600) < 600
+        assert policy.next_delay('alice', error, 1, 600) == 600
+        assert policy.next_delay('bob', error, 1, 600) < 600, (
+            'Бюджет у каждого тенанта свой.'
+        )
+        clock.now += 50
+        assert policy.next_delay('alice', error, 1, 600) < 600
+
+    def test_global_rate_cap(self, retry_policy_module):
+        clock = utils.Clock(100.0)
+        policy = make_policy(retry_policy_module, clock, rate=1, burst=2)
+        error = ConnectionError()
+        delays = [
+            policy.next_delay(tenant, error, 1, 600)
+            for tenant in ('a', 'b', 'c')
+        ]
+        assert delays[:2] == [delays[0]] * 2 and delays[0] < 600
+        assert delays[2] == 600, 'Шторм повторов не должен разрастаться.'
+        clock.now += 1
+        assert policy.next_delay('c', error, 1, 600) < 600
+
+    def test_full_budgets_are_purged(self, retry_policy_module):
+        clock = utils.Clock(100.0)
+        policy = make_policy(
+            retry_policy_module, clock, budget=2, budget_window=100
+        )
+        for tenant in range(10):
+            policy.next_delay(tenant, ConnectionError(), 1, 600)
+        clock.now += 300
+        policy.next_delay('alice', ConnectionError(), 1, 600)
+        assert list(policy.budgets) == ['alice']
+
+    def test_poll_policy_uses_retry(self, retry_policy_module):
+        import poll_policy
+        policy = poll_policy.PollPolicy(
+            600, jitter=0, retry=make_policy(retry_policy_module)
+        )
+        assert policy.next_delay(1, error=http_error(503)) < 600
+        assert policy.next_delay(1) == 600
+        assert policy.next_deadline(
+            1000, 1, False, 30, http_error(429, retry_after=45), 'alice'
+        ) == 1045
+
+    def test_request_api_reads_retry_after(self, monkeypatch,
+                                           homework_module):
+        import exceptions
+
+        def mock_get(*args, **kwargs):
+            response = utils.MockResponseGET(http_status=429)
+            response.headers = {'Retry-After': '17'}
+            return response
+
+        monkeypatch.setattr(requests, 'get', mock_get)
+        with pytest.raises(exceptions.ResponseIsnt200Error) as error:
+            homework_module.get_api_answer(0)
+        assert error.value.status_code == 429
+        assert error.value.retry_after == 17
@@ -0,0 +1,167 @@
+import threading
+import time
+
+import pytest
+import telegram
+
+import utils
+
+
+class TestSendQueue:
+
+    def test_bucket_allows_burst_then_rate(self, send_queue_module):
+        bucket = send_queue_module.TokenBucket(rate=10, capacity=3)
+        moments = [bucket.reserve(100.0) for _ in range(5)]
+        assert moments[:3] == [100.0] * 3
+        assert moments[3] == pytest.approx(100.1)
+        assert moments[4] == pytest.approx(100.2)
+
+    def test_per_chat_limit(self, send_queue_module):
+        limiter = send_queue_module.RateLimiter(global_rate=30, chat_rate=1)
+        assert limiter.reserve_chat('a', 0.0) == 0.0
+        assert limiter.reserve_chat('a', 0.0) == pytest.approx(1.0), (
+            'В один чат нельзя писать чаще раза в секунду.'
+        )
+        assert limiter.reserve_chat('b', 0.0) == 0.0
+
+    def test_global_limit(self, send_queue_module):
+        limiter = send_queue_module.RateLimiter(global_rate=2, chat_rate=100)
+        moments = [limiter.reserve_global(0.0) for _ in range(4)]
+        assert moments == pytest.approx([0.0, 0.0, 0.5, 1.0])
+
+    def test_pause_delays_every_chat(self, send_queue_module):
+        limiter = send_queue_module.RateLimiter()
+        limiter.pause(5, 10.0)
+        assert limiter.reserve_chat('a', 10.0) == 15.0
+        assert limiter.reserve_global(10.0) == 15.0
+
+    def test_send_does_not_block(self, send_queue_module):
+        bot = utils.RecordingBot()
+        queue = send_queue_module.SendQueue(bot)
+        assert queue.send('chat', 'text') is True
+        assert len(queue) == 1 and bot.sent == [], (
+            'Сообщение должно уходить в фоне, а не в цикле опроса.'
+        )
+        queue.start()
+        assert bot.done.wait(2)
+        queue.stop(1)
+        assert bot.sent == [('chat', 'text')]
+
+    def test_retry_after_is_honoured(self, send_queue_module):
+        bot = utils.RecordingBot([telegram.error.RetryAfter(0.2)])
+        queue = send_queue_module.SendQueue(bot).start()
+        started = time.monotonic()
+        queue.send('chat', 'text')
+        assert bot.done.wait(3)
+        queue.stop(1)
+        assert bot.times[0] - started >= 0.2
+
+    @pytest.mark.parametrize('error', [
+        telegram.error.BadRequest('chat not found'),
+        telegram.error.Unauthorized('Forbidden: bot was blocked by the user'),
+        telegram.error.InvalidToken(),
+    ])
+    def test_permanent_error_is_not_retried(self, send_queue_module, error):
+        bot = utils.RecordingBot([error])
+        queue = send_queue_module.SendQueue(bot, workers=1).start()
+        queue.send('chat', 'text')
+        time.sleep(0.1)
+        queue.stop(1)
+        assert bot.sent == [] and len(queue) == 0
+
+    def test_migrated_chat_gets_message(self, send_queue_module):
+        bot = utils.RecordingBot([telegram.error.ChatMigrated(-100500)])
+        queue = send_queue_module.SendQueue(bot, workers=1).start()
+        queue.send(-5, 'text')
+        assert bot.done.wait(3)
+        queue.stop(1)
+        assert [chat for chat, _ in bot.sent] == [-100500]
+
+    def test_transient_error_is_retried_until_delivered(
+            self, send_queue_module):
+        bot = utils.RecordingBot([telegram.error.NetworkError('down')] * 5)
+        limiter = send_queue_module.RateLimiter(
+            global_rate=1000, chat_rate=1000
+        )
+        queue = send_queue_module.SendQueue(
+            bot, limiter, workers=1, max_backoff=0.01
+        ).start()
+        delivered = []
+        queue.send('chat', 'text', lambda: delivered.append(1))
+        assert bot.done.wait(3), (
+            'Статус уже в индексе: сообщение нельзя бросать после N попыток.'
+        )
+        queue.stop(1)
+        assert delivered == [1] and len(queue) == 0
+
+    def test_collapse_never_drops_other_messages(self, send_queue_module):
+        bot = utils.RecordingBot()
+        queue = send_queue_module.SendQueue(bot, maxsize=2, policy='collapse')
+        queue.send('a', 'first', key=1)
+        queue.send('b', 'second', key=2)
+        assert queue.send('b', 'newer', key=2)
+        sent = threading.Event()
+        thread = threading.Thread(
+            target=lambda: queue.send('c', 'third', key=3) and sent.set()
+        )
+        thread.start()
+        assert not sent.wait(0.1), (
+            'Статусы в очереди уже в индексе: вытеснять их нельзя.'
+        )
+        queue.start()
+        assert sent.wait(2)
+        thread.join(1)
+        deadline = time.monotonic() + 5
+        while len(bot.sent) < 3 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        queue.stop(1)
+        assert sorted(text for _, text in bot.sent) == [
+            'first', 'newer', 'third'
+        ]
+
+    def test_collapse_replaces_pending_message(self, send_queue_module):
+        bot = utils.RecordingBot()
+        queue = send_queue_module.SendQueue(bot, policy='collapse')
+        delivered = []
+        queue.send('chat', 'reviewing', lambda: delivered.append(1), key=1)
+        queue.send('chat', 'approved', lambda: delivered.append(2), key=1)
+        queue.send('other-chat', 'other', key=2)
+        assert len(queue) == 2
+        queue.start()
+        deadline = time.monotonic() + 5
+        while len(bot.sent) < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        queue.stop(1)
+        assert sorted(text for _, text in bot.sent) == [
+            'approved', 'other'
+        ]
+        assert delivered == [2]
+
+    def test_block_waits_for_space(self, send_queue_module):
+        bot = utils.RecordingBot()
+        queue = send_queue_module.SendQueue(bot, maxsize=1, policy='block')
+        queue.send('a', 'first')
+        sent = threading.Event()
+        thread = threading.Thread(
+            target=lambda: queue.send('b', 'second') and sent.set()
+        )
+        thread.start()
+        assert not sent.wait(0.1), 'Полная очередь должна ждать места.'
+        queue.start()
+        assert sent.wait(2)
+        thread.join(1)
+        queue.stop(1)
+
+    def test_saturation(self, send_queue_module):
+        queue = send_queue_module.SendQueue(
+            utils.RecordingBot(), maxsize=10, high_water=0.5
+        )
+        for number in range(4):
+            queue.send('chat', f'text{number}')
+        assert not queue.saturated()
+        queue.send('chat', 'text4')
+        assert queue.saturated()
+
+    def test_unknown_policy(self, send_queue_module):
+        with pytest.raises(ValueError):
+            send_queue_module.SendQueue(utils.RecordingBot(), policy='drop_oldest')
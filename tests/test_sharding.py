@@ -0,0 +1,175 @@
+import collections
+
+import utils
+
+
+TENANT_IDS = [f'tenant-{number}' for number in range(1000)]
+
+
+def make_shards(sharding_module, path, clock, names):
+    return {
+        name: sharding_module.Shard(
+            path, worker_id=name, ttl=30, heartbeat=10, clock=clock
+        )
+        for name in names
+    }
+
+
+def settle(shards, rounds=2):
+    for _ in range(rounds):
+        for shard in shards.values():
+            shard.refresh(TENANT_IDS)
+
+
+class TestHashRing:
+
+    def test_shares_are_even(self, sharding_module):
+        ring = sharding_module.HashRing(['w1', 'w2', 'w3', 'w4'])
+        shares = collections.Counter(ring.owner(key) for key in TENANT_IDS)
+        assert set(shares) == {'w1', 'w2', 'w3', 'w4'}
+        assert max(shares.values()) < 1.5 * len(TENANT_IDS) / 4
+
+    def test_new_worker_takes_only_its_share(self, sharding_module):
+        before = sharding_module.HashRing(['w1', 'w2', 'w3'])
+        after = sharding_module.HashRing(['w1', 'w2', 'w3', 'w4'])
+        for key in TENANT_IDS:
+            if after.owner(key) != 'w4':
+                assert after.owner(key) == before.owner(key), (
+                    'Новый воркер не должен перекладывать чужих тенантов.'
+                )
+
+    def test_empty_ring(self, sharding_module):
+        assert sharding_module.HashRing([]).owner('alice') is None
+
+
+class TestShard:
+
+    def test_workers_split_tenants(self, tmp_path, sharding_module):
+        clock = utils.Clock(1000.0)
+        shards = make_shards(
+            sharding_module, str(tmp_path / 'shards.db'), clock, ['a', 'b']
+        )
+        settle(shards)
+        owned = [shard.owned for shard in shards.values()]
+        assert not owned[0] & owned[1], (
+            'Один тенант не должен опрашиваться двумя воркерами.'
+        )
+        assert owned[0] | owned[1] == set(TENANT_IDS)
+        assert all(shards['a'].owns(tenant) for tenant in owned[0])
+
+    def test_lease_is_not_taken_before_release(self, tmp_path,
+                                               sharding_module):
+        clock = utils.Clock(1000.0)
+        path = str(tmp_path / 'shards.db')
+        first = make_shards(sharding_module, path, clock, ['a'])['a']
+        first.refresh(TENANT_IDS)
+        assert first.owned == set(TENANT_IDS)
+        second = make_shards(sharding_module, path, clock, ['b'])['b']
+        second.refresh(TENANT_IDS)
+        assert not second.owned, (
+            'Аренду живого воркера нельзя забрать до её освобождения.'
+        )
+        first.refresh(TENANT_IDS)
+        assert second.refresh(TENANT_IDS)
+        assert second.owned and not first.owned & second.owned
+
+    def test_dead_worker_is_rebalanced(self, tmp_path, sharding_module):
+        clock = utils.Clock(1000.0)
+        shards = make_shards(
+            sharding_module, str(tmp_path / 'shards.db'), clock, ['a', 'b']
+        )
+        settle(shards)
+        clock.now += 31
+        assert not shards['b'].owns(next(iter(shards['b'].owned))), (
+            'Не продлённая вовремя аренда не даёт права опроса.'
+        )
+        shards['a'].refresh(TENANT_IDS)
+        assert shards['a'].owned == set(TENANT_IDS)
+        assert shards['a'].workers == ('a',)
+
+    def test_close_hands_tenants_over(self, tmp_path, sharding_module):
+        clock = utils.Clock(1000.0)
+        shards = make_shards(
+            sharding_module, str(tmp_path / 'shards.db'), clock, ['a', 'b']
+        )
+        settle(shards)
+        shards['b'].close()
+        shards['a'].refresh(TENANT_IDS)
+        assert shards['a'].owned == set(TENANT_IDS)
+
+    def test_due_follows_heartbeat(self, tmp_path, sharding_module):
+        clock = utils.Clock(1000.0)
+        shard = make_shards(
+            sharding_module, str(tmp_path / 'shards.db'), clock, ['a']
+        )['a']
+        assert shard.due()
+        shard.refresh(TENANT_IDS)
+        assert not shard.due()
+        clock.now += 10
+        assert shard.due()
+
+    def test_open_shard_without_path(self, sharding_module):
+        assert sharding_module.open_shard(None) is None
+
+
+class TestShardedPoller:
+
+    def test_poller_skips_foreign_tenants(self, tmp_path, sharding_module):
+        import cursor_store
+        import poller
+        import tenants
+        clock = utils.Clock(1000.0)
+        path = str(tmp_path / 'shards.db')
+        shards = make_shards(sharding_module, path, clock, ['a', 'b'])
+        registry = [
+            tenants.Tenant(tenant_id, 'token', '1')
+            for tenant_id in TENANT_IDS
+        ]
+        store = cursor_store.CursorStore(str(tmp_path / 'cursors.db'))
+        for _ in range(2):
+            for shard in shards.values():
+                poller.rebalance(shard, store, registry)
+                clock.now += 10
+        workers = [
+            poller.Poller(sender=None, store=store, shard=shard)
+            for shard in shards.values()
+        ]
+        for tenant in registry:
+            assert sum(worker.owns(tenant) for worker in workers) == 1
+        store.close()
+
+    def test_async_leases_are_refreshed_off_the_loop(
+            self, tmp_path, sharding_module):
+        import asyncio
+        import threading
+
+        import async_poller
+        import cursor_store
+        import tenants
+        shard = sharding_module.Shard(
+            str(tmp_path / 'shards.db'), worker_id='a', heartbeat=0.01
+        )
+        threads = []
+        refresh = shard.refresh
+
+        def recording_refresh(tenant_ids):
+            threads.append(threading.current_thread())
+            return refresh(tenant_ids)
+
+        shard.refresh = recording_refresh
+        worker = async_poller.AsyncPoller(
+            None, cursor_store.MemoryCursorStore(), shard=shard
+        )
+        registry = [tenants.Tenant('alice', 'token', '1')]
+
+        async def scenario():
+            task = asyncio.create_task(worker.shard_loop(registry))
+            await asyncio.sleep(0.1)
+            task.cancel()
+
+        asyncio.run(scenario())
+        shard.close()
+        assert threads and threading.main_thread() not in threads, (
+            'Блокирующий SQLite не должен занимать цикл событий.'
+        )
+        assert shard.owned == frozenset()
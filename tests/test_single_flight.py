@@ -0,0 +1,129 @@
+import asyncio
+import threading
+
+import pytest
+
+import utils
+
+
+class TestSingleFlight:
+
+    def test_concurrent_calls_share_one(self, single_flight_module):
+        flights = single_flight_module.SingleFlight()
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def slow():
+            calls.append(1)
+            started.set()
+            release.wait(2)
+            return 'answer'
+
+        results = []
+        leader = threading.Thread(
+            target=lambda: results.append(flights.do('key', slow))
+        )
+        leader.start()
+        assert started.wait(2)
+        follower = threading.Thread(
+            target=lambda: results.append(flights.do('key', slow))
+        )
+        follower.start()
+        release.set()
+        leader.join(2)
+        follower.join(2)
+        assert calls == [1] and results == ['answer', 'answer']
+
+    def test_result_is_reused_within_window(self, single_flight_module):
+        clock = utils.Clock(100.0)
+        flights = single_flight_module.SingleFlight(window=5, clock=clock)
+        calls = []
+
+        def call():
+            calls.append(1)
+            return len(calls)
+
+        assert flights.do('key', call) == 1
+        clock.now += 4
+        assert flights.do('key', call) == 1
+        assert flights.do('other', call) == 2
+        clock.now += 2
+        assert flights.do('key', call) == 3
+
+    def test_error_is_not_remembered(self, single_flight_module):
+        flights = single_flight_module.SingleFlight(
+            window=5, clock=utils.Clock(100.0)
+        )
+
+        def fail():
+            raise ConnectionError('down')
+
+        with pytest.raises(ConnectionError):
+            flights.do('key', fail)
+        assert flights.do('key', lambda: 'ok') == 'ok'
+
+    def test_async_calls_share_one(self, single_flight_module):
+        flights = single_flight_module.SingleFlight()
+        calls = []
+
+        async def slow():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return 'answer'
+
+        async def scenario():
+            return await asyncio.gather(*(
+                flights.do_async('key', slow) for _ in range(5)
+            ))
+
+        assert asyncio.run(scenario()) == ['answer'] * 5
+        assert calls == [1]
+
+    def test_shared_tokens_poll_once(self, monkeypatch, single_flight_module):
+        import homework
+        import poller
+        import tenants
+        registry = [
+            tenants.Tenant('student', 'token', '1'),
+            tenants.Tenant('mentor', 'token', '2'),
+            tenants.Tenant('other', 'other-token', '3'),
+        ]
+        requests = []
+
+        def request_api(current_timestamp, headers, *args, **kwargs):
+            requests.append(headers['Authorization'])
+            return {
+                'homeworks': [{'homework_name': 'hw', 'status': 'approved'}],
+                'current_date': 2000,
+            }
+
+        class Sender:
+            def __init__(self):
+                self.sent = []
+
+            def send(self, chat_id, message, on_delivered=None, key=None):
+                self.sent.append(chat_id)
+                return True
+
+        monkeypatch.setattr(homework, 'request_api', request_api)
+        sender = Sender()
+        worker = poller.Poller(sender)
+        worker.shared = single_flight_module.shared_keys(registry)
+        assert worker.shared == {'OAuth token'}
+        for tenant in registry:
+            assert worker.poll_tenant(tenant, 1000) == 2000
+        assert requests == ['OAuth token', 'OAuth other-token'], (
+            'Тенанты с общим токеном должны делить один запрос.'
+        )
+        assert sorted(sender.sent) == ['1', '2', '3']
+
+    def test_shared_tokens_share_phase(self, single_flight_module):
+        import tenants
+        first = tenants.Tenant('student', 'token', '1')
+        second = tenants.Tenant('mentor', 'token', '2')
+        shared = single_flight_module.shared_keys([first, second])
+        assert single_flight_module.phase_key(
+            first, shared
+        ) == single_flight_module.phase_key(second, shared)
+        assert single_flight_module.phase_key(first, set()) == 'student'
@@ -0,0 +1,139 @@
+import pytest
+
+import utils
+
+
+def homework(status, name='hw1', **kwargs):
+    return dict(homework_name=name, status=status, **kwargs)
+
+
+class TestStatusIndex:
+
+    def test_only_transitions_are_reported(self, status_index_module):
+        index = status_index_module.StatusIndex()
+        first = [homework('reviewing'), homework('reviewing', 'hw2')]
+        assert list(index.diff(first)) == first
+        for item in first:
+            index.commit(item)
+        assert list(index.diff(first)) == [], (
+            'Повторный статус не должен отправляться ещё раз.'
+        )
+        second = [homework('approved'), homework('reviewing', 'hw2')]
+        assert list(index.diff(second)) == [homework('approved')]
+
+    def test_id_is_preferred_over_name(self, status_index_module):
+        index = status_index_module.StatusIndex()
+        index.commit(homework('approved', 'same', id=1))
+        assert list(index.diff([homework('approved', 'same', id=2)]))
+
+    def test_tenants_do_not_share_statuses(self, status_index_module):
+        index = status_index_module.StatusIndex()
+        index.commit(homework('approved'), 'alice')
+        assert list(index.diff([homework('approved')], 'bob'))
+        assert not list(index.diff([homework('approved')], 'alice'))
+
+    def test_every_changed_homework_is_sent(self, homework_module,
+                                            status_index_module):
+        index = status_index_module.StatusIndex()
+        sent = []
+
+        def send(message):
+            sent.append(message)
+            return True
+
+        homeworks = [homework('approved'), homework('rejected', 'hw2')]
+        assert homework_module.send_new_statuses(send, index, homeworks)
+        assert len(sent) == 2, (
+            'Должны отправляться все изменившиеся работы, а не только первая.'
+        )
+        assert homework_module.send_new_statuses(send, index, homeworks)
+        assert len(sent) == 2
+
+    def test_failed_send_is_retried(self, homework_module,
+                                    status_index_module):
+        index = status_index_module.StatusIndex()
+        homeworks = [homework('approved')]
+        assert not homework_module.send_new_statuses(
+            lambda message: False, index, homeworks
+        )
+        assert list(index.diff(homeworks)) == homeworks
+
+    def test_main_sends_nothing_without_changes(self, monkeypatch,
+                                                homework_module):
+        import time
+        import requests
+        import telegram
+        sent = []
+
+        def sleep_to_interrupt(secs):
+            raise utils.BreakInfiniteLoop('break')
+
+        monkeypatch.setattr(time, 'sleep', sleep_to_interrupt)
+        monkeypatch.setattr(
+            telegram, 'Bot', lambda **kwargs: utils.MockTelegramBot()
+        )
+        monkeypatch.setattr(
+            requests, 'get', lambda *args, **kwargs: utils.MockResponseGET()
+        )
+        monkeypatch.setattr(
+            homework_module, 'send_message',
+            lambda bot, message: sent.append(message)
+        )
+        monkeypatch.setattr(homework_module, 'PRACTICUM_TOKEN', 'token')
+        monkeypatch.setattr(homework_module, 'TELEGRAM_TOKEN', '1:abc')
+        monkeypatch.setattr(homework_module, 'TELEGRAM_CHAT_ID', '1')
+        with pytest.raises(utils.BreakInfiniteLoop):
+            homework_module.main()
+        assert sent == [], (
+            'Пустой список работ не должен приводить к отправке сообщений.'
+        )
+
+
+class TestTenantState:
+
+    def test_known_statuses_have_codes(self, homework_module,
+                                       status_index_module):
+        assert set(homework_module.HOMEWORK_VERDICTS) <= set(
+            status_index_module.STATUS_CODES
+        )
+        for status, code in status_index_module.STATUS_CODES.items():
+            assert status_index_module.status_name(code) == status
+
+    def test_many_homeworks_move_to_dict(self, status_index_module):
+        index = status_index_module.StatusIndex()
+        count = status_index_module.ARRAY_LIMIT + 5
+        for number in range(count):
+            index.commit(homework('approved', id=number), 'alice')
+        index.commit(homework('rejected', id=3), 'alice')
+        assert index.tenants['alice'].positions is not None
+        assert len(index) == count
+        assert list(index.diff([homework('rejected', id=3)], 'alice')) == []
+        assert list(index.diff([homework('approved', id=3)], 'alice'))
+
+    def test_review_counter_follows_transitions(self, status_index_module):
+        index = status_index_module.StatusIndex()
+        index.commit(homework('reviewing', id=1), 'alice')
+        index.commit(homework('reviewing', id=1), 'alice')
+        assert index.in_review('alice')
+        index.commit(homework('approved', id=1), 'alice')
+        assert not index.in_review('alice')
+        assert not index.in_review('bob')
+
+    def test_forgotten_tenant_is_reloaded(self, status_index_module):
+        class Store:
+            def __init__(self):
+                self.statuses = {}
+
+            def load_statuses(self, tenant_id):
+                return list(self.statuses.get(tenant_id, {}).items())
+
+            def save_status(self, tenant_id, key, status):
+                self.statuses.setdefault(tenant_id, {})[key] = status
+
+        store = Store()
+        index = status_index_module.StatusIndex(store)
+        index.commit(homework('reviewing'), 'alice')
+        # Пока тенант был у другого воркера, тот отправил новый статус.
+        store.statuses['alice']['hw1'] = 'approved'
+        index.forget(['alice'])
+        assert not list(index.diff([homework('approved')], 'alice'))
@@ -0,0 +1,127 @@
+import json
+import tracemalloc
+
+import pytest
+
+
+RESPONSE = {
+    'current_date': 1581604970,
+    'homeworks': [
+        {'id': 1, 'status': 'approved', 'homework_name': 'Ёлка.zip',
+         'reviewer_comment': 'Отлично, но "кавычки" \\ и 1e3'},
+        {'id': 22, 'status': 'rejected', 'homework_name': 'hw2.zip'},
+    ],
+    'extra': [1, {'nested': None}],
+}
+
+
+def decode(module, data, size):
+    decoder = module.HomeworkDecoder()
+    items = []
+    for start in range(0, len(data), size):
+        items.extend(decoder.feed(data[start:start + size]))
+    items.extend(decoder.close())
+    return items, decoder.fields
+
+
+class TestStreamParser:
+
+    @pytest.mark.parametrize('size', [1, 2, 3, 7, 1000])
+    def test_any_chunking_matches_json(self, stream_parser_module, size):
+        data = json.dumps(RESPONSE, ensure_ascii=False, indent=1).encode()
+        items, fields = decode(stream_parser_module, data, size)
+        assert items == RESPONSE['homeworks']
+        assert fields['current_date'] == RESPONSE['current_date']
+        assert fields['extra'] == RESPONSE['extra']
+
+    @pytest.mark.parametrize('size', [1, 2, 3, 5])
+    @pytest.mark.parametrize('number', ['1500.5', '1e5', '-2.5E-3', '100000'])
+    def test_numbers_split_by_chunks(self, stream_parser_module, size,
+                                     number):
+        data = (
+            '{"current_date":%s,"homeworks":[%s,{"id":%s}],"x":%s}'
+            % (number, number, number, number)
+        ).encode()
+        items, fields = decode(stream_parser_module, data, size)
+        value = json.loads(number)
+        assert fields['current_date'] == value
+        assert fields['x'] == value
+        assert items == [value, {'id': value}]
+
+    @pytest.mark.parametrize('data, error', [
+        (b'[]', TypeError),
+        (b'{"homeworks": {}}', TypeError),
+        (b'{"current_date": 1}', KeyError),
+        (b'{"homeworks": [{"id": 1}', ValueError),
+        (b'{"homeworks": [] "x": 1}', ValueError),
+    ])
+    def test_invalid_responses(self, stream_parser_module, data, error):
+        with pytest.raises(error):
+            decode(stream_parser_module, data, 4)
+
+    def test_memory_is_bounded(self, stream_parser_module):
+        homework = json.dumps({
+            'id': 0, 'status': 'approved', 'homework_name': 'x' * 200
+        }).encode()
+        count = 20000
+
+        def chunks():
+            yield b'{"homeworks": ['
+            for number in range(count):
+                yield (b',' if number else b'') + homework
+            yield b'], "current_date": 1}'
+
+        stream = stream_parser_module.HomeworkStream(chunks())
+        tracemalloc.start()
+        try:
+            seen = sum(1 for _ in stream)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        assert seen == count == len(stream)
+        assert stream.get('current_date') == 1
+        assert peak < len(homework) * count / 20, (
+            'Поток не должен держать в памяти весь ответ.'
+        )
+
+
+class StreamedResponse:
+    status_code = 200
+    headers = {}
+
+    def __init__(self, data):
+        self.data = data
+        self.closed = False
+
+    def iter_content(self, size):
+        for start in range(0, len(self.data), 5):
+            yield self.data[start:start + 5]
+
+    def close(self):
+        self.closed = True
+
+
+def test_poller_streams_large_history(monkeypatch):
+    import requests
+
+    import poller
+    import send_queue
+    import tenants
+    import utils
+
+    response = StreamedResponse(json.dumps(RESPONSE).encode())
+    calls = []
+
+    def get(*args, **kwargs):
+        calls.append(kwargs)
+        return response
+
+    monkeypatch.setattr(requests, 'get', get)
+    bot = utils.MockTelegramBot()
+    sent = []
+    bot.send_message = lambda chat_id, text: sent.append(text)
+    instance = poller.Poller(send_queue.DirectSender(bot))
+    cursor = instance.poll_tenant(tenants.Tenant('alice', 't', '1'), 0)
+    assert calls[0]['stream'] is True
+    assert len(sent) == 2 and response.closed
+    assert cursor == RESPONSE['current_date']
@@ -0,0 +1,66 @@
+import io
+import json
+import logging
+
+import pytest
+import requests
+
+
+class Spy:
+    def __init__(self):
+        self.rendered = 0
+
+    def __str__(self):
+        self.rendered += 1
+        return 'spy'
+
+
+class TestStructuredLogging:
+
+    def test_records_are_written_as_json(self, structured_logging_module):
+        stream = io.StringIO()
+        logger = logging.getLogger('test_structured_logging.json')
+        logger.setLevel(logging.INFO)
+        listener = structured_logging_module.setup(logger, stream=stream)
+        logger.info('Тенант %(tenant_id)s опрошен', {'tenant_id': 'alice'})
+        listener.stop()
+        entry = json.loads(stream.getvalue())
+        assert entry['message'] == 'Тенант alice опрошен'
+        assert entry['tenant_id'] == 'alice'
+        assert entry['level'] == 'INFO'
+
+    def test_suppressed_level_is_not_formatted(
+        self, structured_logging_module
+    ):
+        stream = io.StringIO()
+        logger = logging.getLogger('test_structured_logging.lazy')
+        logger.setLevel(logging.INFO)
+        listener = structured_logging_module.setup(logger, stream=stream)
+        spy = Spy()
+        logger.debug('%(value)s', {'value': spy})
+        listener.stop()
+        assert spy.rendered == 0
+        assert stream.getvalue() == ''
+
+    @pytest.mark.parametrize('log_format', ['json', 'text'])
+    def test_token_is_redacted(self, structured_logging_module, log_format):
+        stream = io.StringIO()
+        logger = logging.getLogger('test_structured_logging.' + log_format)
+        listener = structured_logging_module.setup(
+            logger, stream=stream, log_format=log_format
+        )
+        logger.error('%s', {'Authorization': 'OAuth secret-token'})
+        listener.stop()
+        assert 'secret-token' not in stream.getvalue()
+        assert 'OAuth ***' in stream.getvalue()
+
+    def test_request_error_has_no_token(self, monkeypatch):
+        import homework
+
+        def failing_get(*args, **kwargs):
+            raise requests.RequestException('down')
+
+        monkeypatch.setattr(requests, 'get', failing_get)
+        with pytest.raises(ConnectionError) as error:
+            homework.request_api(0, {'Authorization': 'OAuth secret-token'})
+        assert 'secret-token' not in str(error.value)
@@ -0,0 +1,164 @@
+import json
+import threading
+
+import pytest
+
+
+class Sender:
+    def __init__(self, failing=(), barrier=None):
+        self.failing = set(failing)
+        self.barrier = barrier
+        self.sent = []
+        self.keys = []
+
+    def send(self, chat_id, message, on_delivered=None, key=None):
+        if self.barrier is not None:
+            self.barrier.wait(2)
+        if chat_id in self.failing:
+            return False
+        self.sent.append((chat_id, message))
+        self.keys.append(key)
+        if on_delivered is not None:
+            on_delivered()
+        return True
+
+
+class TestSubscriptions:
+
+    def test_parse_subscriptions(self, subscriptions_module):
+        routes = subscriptions_module.parse_subscriptions(
+            '111, 222:approved|rejected'
+        )
+        assert [route.chat_id for route in routes] == ['111', '222']
+        assert routes[0].accepts('reviewing')
+        assert not routes[1].accepts('reviewing')
+        assert routes[1].accepts('approved')
+
+    @pytest.mark.parametrize('text', [
+        '111,111', '111:unknown', ',111', '111:approved|',
+    ])
+    def test_invalid_subscriptions(self, text, subscriptions_module):
+        import exceptions
+        with pytest.raises(exceptions.SubscriptionError):
+            subscriptions_module.parse_subscriptions(text)
+
+    def test_known_statuses_are_verdicts(self, subscriptions_module,
+                                         monkeypatch):
+        import homework
+        import status_index
+        monkeypatch.setattr(
+            status_index, 'STATUSES', list(status_index.STATUSES)
+        )
+        monkeypatch.setattr(
+            status_index, 'STATUS_CODES', dict(status_index.STATUS_CODES)
+        )
+        status_index.status_code('on_hold')
+        assert subscriptions_module.KNOWN_STATUSES == set(
+            homework.HOMEWORK_VERDICTS
+        )
+
+    def test_message_goes_to_matching_chats(self, subscriptions_module):
+        sender = Sender()
+        broadcaster = subscriptions_module.Broadcaster(
+            sender, subscriptions_module.parse_subscriptions(
+                '1,2:approved,3:rejected'
+            ),
+        )
+        delivered = []
+        assert broadcaster.send(
+            'ok', lambda: delivered.append(1), key='hw', status='approved'
+        )
+        assert sender.sent == [('1', 'ok'), ('2', 'ok')]
+        assert sender.keys == [('1', 'hw'), ('2', 'hw')]
+        assert delivered == [1], (
+            'Задержка доставки считается один раз, когда получили все чаты.'
+        )
+
+    def test_filtered_out_status_counts_as_delivered(
+            self, subscriptions_module):
+        sender = Sender()
+        broadcaster = subscriptions_module.Broadcaster(
+            sender, subscriptions_module.parse_subscriptions('1:approved')
+        )
+        assert broadcaster.send('on review', status='reviewing')
+        assert sender.sent == []
+
+    def test_retry_goes_only_to_failed_chats(self, subscriptions_module):
+        sender = Sender(failing={'2'})
+        broadcaster = subscriptions_module.Broadcaster(
+            sender, subscriptions_module.parse_subscriptions('1,2,3')
+        )
+        assert not broadcaster.send('ok', key='hw', status='approved')
+        sender.failing.clear()
+        assert broadcaster.send('ok', key='hw', status='approved')
+        assert [chat for chat, _ in sender.sent] == ['1', '3', '2']
+        assert not broadcaster.pending
+
+    def test_chats_are_sent_in_parallel(self, subscriptions_module):
+        # Каждая отправка ждёт остальных: последовательно они не пройдут.
+        barrier = threading.Barrier(3)
+        sender = Sender(barrier=barrier)
+        broadcaster = subscriptions_module.Broadcaster(
+            sender, subscriptions_module.parse_subscriptions('1,2,3'),
+            workers=3,
+        )
+        assert broadcaster.send('ok', status='approved')
+        assert not barrier.broken
+        assert sorted(sender.sent) == [('1', 'ok'), ('2', 'ok'), ('3', 'ok')]
+
+    def test_one_poll_fans_out(self, monkeypatch, subscriptions_module):
+        import homework
+        import poller
+        import tenants
+        tenant = tenants.Tenant(
+            'student', 'token', '1',
+            subscriptions_module.parse_subscriptions('1,2:rejected'),
+        )
+        requests = []
+
+        def request_api(current_timestamp, headers, *args, **kwargs):
+            requests.append(headers)
+            return {
+                'homeworks': [{'homework_name': 'hw', 'status': 'approved'}],
+                'current_date': 2000,
+            }
+
+        monkeypatch.setattr(homework, 'request_api', request_api)
+        sender = Sender()
+        worker = poller.Poller(sender)
+        assert worker.poll_tenant(tenant, 1000) == 2000
+        assert len(requests) == 1
+        assert [chat for chat, _ in sender.sent] == ['1']
+
+    def test_registry_subscriptions(self, tmp_path):
+        import tenants
+        path = tmp_path / 'tenants.json'
+        path.write_text(json.dumps([
+            {'tenant_id': 'alice', 'practicum_token': 'a', 'chat_id': 1},
+            {
+                'tenant_id': 'bob', 'practicum_token': 'b', 'chat_id': 2,
+                'subscriptions': [
+                    {'chat_id': 2},
+                    {'chat_id': 3, 'statuses': ['approved']},
+                ],
+            },
+        ]))
+        alice, bob = tenants.load_tenants(str(path))
+        assert [route.chat_id for route in alice.routes] == ['1']
+        assert [route.chat_id for route in bob.routes] == ['2', '3']
+        assert bob.routes[1].statuses == {'approved'}
+
+    @pytest.mark.parametrize('value', [['111'], '111', [{'chat_id': ''}]])
+    def test_invalid_registry_subscriptions(self, tmp_path, value):
+        import exceptions
+        import tenants
+        path = tmp_path / 'tenants.json'
+        path.write_text(json.dumps([{
+            'tenant_id': 'bob', 'practicum_token': 'b', 'chat_id': 2,
+            'subscriptions': value,
+        }]))
+        with pytest.raises(exceptions.TenantRegistryError):
+            tenants.load_tenants(str(path))
+
+    def test_open_broadcaster_is_opt_in(self, subscriptions_module):
+        assert subscriptions_module.open_broadcaster(Sender(), text='') is None
@@ -0,0 +1,121 @@
+import json
+import sqlite3
+import time
+
+import pytest
+import requests
+
+import utils
+
+
+TENANTS = [
+    {'tenant_id': 'alice', 'practicum_token': 'a-token', 'chat_id': 1},
+    {'tenant_id': 'bob', 'practicum_token': 'b-token', 'chat_id': 2},
+]
+
+
+class TestTenants:
+
+    def test_load_from_json(self, tmp_path, tenants_module):
+        path = tmp_path / 'tenants.json'
+        path.write_text(json.dumps(TENANTS))
+        registry = tenants_module.load_tenants(str(path))
+        assert [tenant.tenant_id for tenant in registry] == ['alice', 'bob']
+        assert registry[1].chat_id == '2'
+        assert registry[0].headers == {'Authorization': 'OAuth a-token'}
+
+    def test_load_from_sqlite(self, tmp_path, tenants_module):
+        path = tmp_path / 'tenants.db'
+        connection = sqlite3.connect(str(path))
+        connection.execute(
+            'CREATE TABLE tenants '
+            '(tenant_id TEXT PRIMARY KEY, practicum_token TEXT, chat_id TEXT)'
+        )
+        connection.executemany(
+            'INSERT INTO tenants VALUES (?, ?, ?)',
+            [tuple(t.values()) for t in TENANTS],
+        )
+        connection.commit()
+        connection.close()
+        registry = tenants_module.load_tenants(str(path))
+        assert [tenant.practicum_token for tenant in registry] == [
+            'a-token', 'b-token'
+        ]
+
+    @pytest.mark.parametrize('content', [
+        '{"tenant_id": "alice"}',
+        '[{"tenant_id": "alice"}]',
+        json.dumps(TENANTS + TENANTS[:1]),
+        'not json',
+    ])
+    def test_invalid_registry(self, tmp_path, content, tenants_module):
+        import exceptions
+        path = tmp_path / 'tenants.json'
+        path.write_text(content)
+        with pytest.raises(exceptions.TenantRegistryError):
+            tenants_module.load_tenants(str(path))
+
+    def test_poll_tenant_uses_tenant_token_and_chat(
+            self, monkeypatch, random_timestamp, poller_module,
+            tenants_module):
+        tenant = tenants_module.Tenant('bob', 'b-token', '2')
+        calls = []
+
+        def mock_get(*args, **kwargs):
+            calls.append(kwargs)
+            response = utils.MockResponseGET(
+                random_timestamp=random_timestamp
+            )
+            data = {
+                'homeworks': [{'homework_name': 'hw', 'status': 'approved'}],
+                'current_date': random_timestamp,
+            }
+            response.json = lambda: data
+            response.content = json.dumps(data).encode()
+            response.headers = {'Content-Length': len(response.content)}
+            return response
+
+        monkeypatch.setattr(requests, 'get', mock_get)
+        bot = utils.MockTelegramBot()
+        import send_queue
+        poller = poller_module.Poller(send_queue.DirectSender(bot))
+        result = poller.poll_tenant(tenant, 0)
+        assert result == random_timestamp
+        assert calls[0]['headers'] == {'Authorization': 'OAuth b-token'}
+        assert bot.chat_id == '2'
+        assert bot.text.startswith('Изменился статус проверки работы "hw"')
+
+    def test_run_polls_every_tenant_once_per_period(
+            self, monkeypatch, random_timestamp, homework_module,
+            poller_module, tenants_module):
+        registry = [
+            tenants_module.Tenant(*t.values()) for t in TENANTS
+        ]
+        clock = {'now': 1000.0}
+        polled = []
+
+        def mock_poll(tenant, current_timestamp):
+            polled.append((tenant.tenant_id, clock['now']))
+            return current_timestamp
+
+        def sleep(secs):
+            if len(polled) == 2 * len(registry):
+                raise utils.BreakInfiniteLoop('break')
+            clock['now'] += max(secs, 0.001)
+
+        poller = poller_module.Poller(sender=None)
+        monkeypatch.setattr(poller, 'poll_tenant', mock_poll)
+        monkeypatch.setattr(time, 'sleep', sleep)
+        monkeypatch.setattr(time, 'time', lambda: clock['now'])
+        with pytest.raises(utils.BreakInfiniteLoop):
+            poller.run(registry)
+        period = homework_module.RETRY_PERIOD
+        moments = {}
+        for tenant_id, moment in polled:
+            moments.setdefault(tenant_id, []).append(moment)
+        assert sorted(moments) == ['alice', 'bob']
+        for first, second in moments.values():
+            assert first < 1000 + period
+            assert second - first == pytest.approx(period, abs=1), (
+                'Между опросами тенанта должен проходить RETRY_PERIOD.'
+            )
@@ -0,0 +1,64 @@
+class TestTimingWheel:
+
+    def test_timers_fire_in_their_tick(self, timing_wheel_module):
+        wheel = timing_wheel_module.TimingWheel(slots=10, tick=1, now=0)
+        wheel.insert('a', 3.5)
+        wheel.insert('b', 7)
+        assert wheel.advance(2.9) == []
+        assert wheel.advance(3.1) == ['a']
+        assert wheel.advance(10) == ['b']
+        assert len(wheel) == 0
+
+    def test_timer_beyond_one_revolution(self, timing_wheel_module):
+        wheel = timing_wheel_module.TimingWheel(slots=10, tick=1, now=0)
+        wheel.insert('far', 25)
+        assert wheel.advance(9) == []
+        assert wheel.advance(19) == []
+        assert wheel.advance(25) == ['far'], (
+            'Таймер дальше одного оборота должен дождаться своего круга.'
+        )
+
+    def test_cancel_and_reschedule(self, timing_wheel_module):
+        wheel = timing_wheel_module.TimingWheel(slots=10, tick=1, now=0)
+        wheel.insert('a', 2)
+        wheel.insert('b', 2)
+        wheel.cancel('a')
+        wheel.cancel('missing')
+        wheel.reschedule('b', 5)
+        assert 'a' not in wheel
+        assert wheel.advance(4) == []
+        assert wheel.advance(5) == ['b']
+
+    def test_insert_replaces_scheduled_timer(self, timing_wheel_module):
+        wheel = timing_wheel_module.TimingWheel(slots=10, tick=1, now=0)
+        wheel.insert('a', 2)
+        wheel.insert('a', 5)
+        assert len(wheel) == 1
+        assert wheel.advance(4) == [], (
+            'Повторная вставка должна снимать прежний таймер.'
+        )
+        assert wheel.advance(5) == ['a']
+        assert wheel.advance(20) == []
+
+    def test_past_deadline_fires_on_next_tick(self, timing_wheel_module):
+        wheel = timing_wheel_module.TimingWheel(slots=10, tick=1, now=0)
+        wheel.advance(5)
+        wheel.insert('late', 1)
+        assert wheel.advance(6) == ['late']
+
+    def test_stable_offsets_are_spread(self, timing_wheel_module):
+        offset = timing_wheel_module.stable_offset
+        assert offset('alice', 600) == offset('alice', 600)
+        offsets = [offset(str(i), 600) for i in range(6000)]
+        buckets = [0] * 10
+        for value in offsets:
+            assert 0 <= value < 600
+            buckets[value // 60] += 1
+        assert max(buckets) < 2 * min(buckets), (
+            'Моменты опроса тенантов должны быть размазаны по периоду.'
+        )
+
+    def test_phase_deadline(self, timing_wheel_module):
+        phase = timing_wheel_module.phase_deadline
+        assert phase(1000, 30, 600) == 1230
+        assert phase(1230, 30, 600) == 1830
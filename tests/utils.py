@@ -1,4 +1,6 @@
 import logging
+import threading
+import time
 from collections import namedtuple
 from contextlib import contextmanager
 from http import HTTPStatus
@@ -101,5 +103,28 @@ class MockTelegramBot:
         self.text = text
 
 
+class RecordingBot:
+    def __init__(self, errors=()):
+        self.errors = list(errors)
+        self.sent = []
+        self.times = []
+        self.done = threading.Event()
+
+    def send_message(self, chat_id, text):
+        if self.errors:
+            raise self.errors.pop(0)
+        self.sent.append((chat_id, text))
+        self.times.append(time.monotonic())
+        self.done.set()
+
+
 class BreakInfiniteLoop(Exception):
     pass
+
+
+class Clock:
+    def __init__(self, now=0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
@@ -0,0 +1,91 @@
+"""Хешированное колесо таймеров для расписания опросов."""
+import hashlib
+import os
+
+WHEEL_TICK = float(os.getenv("WHEEL_TICK", 1))
+
+
+def stable_offset(key, period):
+    """Постоянный сдвиг тенанта внутри периода, одинаковый после рестарта."""
+    digest = hashlib.blake2b(str(key).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % int(period)
+
+
+def phase_deadline(now, offset, period):
+    """Ближайший момент после now со сдвигом offset внутри периода."""
+    return now + ((offset - now) % period or period)
+
+
+class TimingWheel:
+    """Колесо из slots ячеек по tick секунд.
+
+    Таймер кладётся в ячейку своего момента по модулю длины колеса, а
+    ячейка хранит словарь ключ -> момент, поэтому вставка, отмена
+    и перенос — O(1). За тик просматривается одна ячейка; таймеры,
+    до которых ещё целый оборот, остаются в ней до следующего прохода.
+    """
+
+    def __init__(self, slots, tick=WHEEL_TICK, now=0.0):
+        """Колесо, стрелка которого стоит на моменте now."""
+        self.tick = tick
+        self.slots = [{} for _ in range(int(slots))]
+        self.where = {}
+        self.current = int(now // tick)
+
+    def __len__(self):
+        """Число таймеров в колесе."""
+        return len(self.where)
+
+    def __contains__(self, key):
+        """Есть ли таймер с таким ключом."""
+        return key in self.where
+
+    @property
+    def next_tick_at(self):
+        """Момент, когда нужно снова повернуть колесо."""
+        return self.current * self.tick
+
+    def insert(self, key, deadline):
+        """Ставим таймер; прошедший момент сработает на ближайшем тике.
+
+        Прежний таймер с тем же ключом снимается: иначе он остался бы
+        в своей ячейке и ключ сработал бы дважды.
+        """
+        self.cancel(key)
+        slot = max(int(deadline // self.tick), self.current) % len(self.slots)
+        self.slots[slot][key] = deadline
+        self.where[key] = slot
+
+    def cancel(self, key):
+        """Снимаем таймер, если он есть."""
+        slot = self.where.pop(key, None)
+        if slot is not None:
+            del self.slots[slot][key]
+
+    def reschedule(self, key, deadline):
+        """Переносим таймер на новый момент."""
+        self.insert(key, deadline)
+
+    def advance(self, now):
+        """Поворачиваем колесо до now и возвращаем ключи сработавших.
+
+        Срабатывают все таймеры пройденных тиков, включая текущий, то есть
+        с точностью до tick.
+        """
+        target = int(now // self.tick)
+        if target < self.current:
+            return []
+        limit = (target + 1) * self.tick
+        expired = []
+        steps = min(target - self.current + 1, len(self.slots))
+        for step in range(steps):
+            slot = self.slots[(self.current + step) % len(self.slots)]
+            if not slot:
+                continue
+            due = [key for key, deadline in slot.items() if deadline < limit]
+            for key in due:
+                del slot[key]
+                del self.where[key]
+            expired.extend(due)
+        self.current = target + 1
+        return expired